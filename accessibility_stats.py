@@ -0,0 +1,163 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+import geomap_distance_to_HO
+import geomap_traveltime_to_HO
+from band_engine import distance_rings, land_mask, traveltime_rings
+from basemap_store import MUNICIPALITY_COLUMN, load_layer, region_layer
+from institution_loader import load_institutions
+from instrumentation import report_at_exit, stage
+from isochrone_store import load_isochrones
+
+# Share of land area (and population) per region, category and band, written by this script
+OUTPUT_PATH = os.path.join('Data', 'accessibility_stats.csv')
+
+
+# Function to load the regions as one land polygon per region, without water bodies: the municipalities by
+# default, or the regions of a column of the base map such as NAME_1 for the provinces
+def load_regions(region_column=MUNICIPALITY_COLUMN):
+    layer = region_layer(region_column)
+    regions = load_layer(layer, columns=(region_column,)).dissolve(by=region_column)
+    geometries = np.asarray(regions.geometry.values)
+    if layer == 'municipalities':
+        # Municipality boundaries include their lakes and coastal water, which the bands leave out
+        geometries = shapely.intersection(geometries, land_mask())
+    return pd.Series(geometries, index=regions.index.rename('region'))
+
+
+# Function to split band rings into their polygons, so the spatial index can skip the parts of a ring that
+# are far from a region. Returns the parts and the band of every part.
+def ring_parts(rings):
+    parts, ring_index = shapely.get_parts(rings.geometry.values, return_index=True)
+    return parts, rings['band'].to_numpy()[ring_index]
+
+
+# Function to compute the area of every region in every band. Candidate (region, part) pairs come from a
+# spatial index; parts inside a region and regions inside a part need no intersection, the remaining pairs
+# are intersected in one vectorized call. Returns an array of regions x bands in m².
+def band_areas(regions, rings):
+    parts, bands = ring_parts(rings)
+    shapely.prepare(regions)
+    shapely.prepare(parts)
+    region_index, part_index = shapely.STRtree(parts).query(regions, predicate='intersects')
+
+    areas = np.empty(len(region_index))
+    part_inside = shapely.contains_properly(regions[region_index], parts[part_index])
+    region_inside = ~part_inside & shapely.contains_properly(parts[part_index], regions[region_index])
+    overlap = ~part_inside & ~region_inside
+    areas[part_inside] = shapely.area(parts[part_index[part_inside]])
+    areas[region_inside] = shapely.area(regions[region_index[region_inside]])
+    areas[overlap] = shapely.area(shapely.intersection(regions[region_index[overlap]], parts[part_index[overlap]]))
+
+    n_bands = len(rings)
+    cells = np.bincount(region_index * n_bands + bands[part_index], weights=areas, minlength=len(regions) * n_bands)
+    return cells.reshape(len(regions), n_bands)
+
+
+# Function to add up the population of a point grid per region and band; points in water or outside every
+# region are left out. Returns an array of regions x bands.
+def band_population(regions, rings, points, population):
+    parts, bands = ring_parts(rings)
+    # The index is built over the points, so the polygons are the query geometries and get prepared
+    tree = shapely.STRtree(points)
+
+    # Region and band of every point, -1 if none; a point on a shared border keeps one of them
+    region_of_point = np.full(len(points), -1)
+    region_index, point_index = tree.query(regions, predicate='intersects')
+    region_of_point[point_index] = region_index
+    band_of_point = np.full(len(points), -1)
+    part_index, point_index = tree.query(parts, predicate='intersects')
+    band_of_point[point_index] = bands[part_index]
+
+    n_bands = len(rings)
+    counted = (region_of_point >= 0) & (band_of_point >= 0)
+    cells = np.bincount(region_of_point[counted] * n_bands + band_of_point[counted], weights=population[counted],
+                        minlength=len(regions) * n_bands)
+    return cells.reshape(len(regions), n_bands)
+
+
+# Function to read a population grid: a CSV with the cell centres and the number of inhabitants per cell,
+# for example the CBS 100 m grid. Returns the points in EPSG:28992 and the population.
+def load_population(path, x_column='x', y_column='y', population_column='population', crs=28992):
+    grid = pd.read_csv(path, usecols=[x_column, y_column, population_column])
+    grid = grid[grid[population_column] > 0]
+    x, y = grid[x_column].to_numpy(dtype=float), grid[y_column].to_numpy(dtype=float)
+    if crs != 28992:
+        x, y = Transformer.from_crs(crs, 28992, always_xy=True).transform(x, y)
+    return shapely.points(x, y), grid[population_column].to_numpy(dtype=float)
+
+
+# Function to build the tidy table: one row per region, category and band with the land area, its share of
+# the region and, with a population grid, the population and its share
+def accessibility_table(regions, rings_by_category, measure, population=None):
+    tables = []
+    for category, rings in rings_by_category.items():
+        areas = band_areas(regions.values, rings)
+        table = pd.DataFrame({
+            'region': np.repeat(regions.index.to_numpy(), len(rings)),
+            'measure': measure,
+            'SOORT HO': category,
+            'band': np.tile(rings['band'].to_numpy(), len(regions)),
+            'lower': np.tile(rings['lower'].to_numpy(), len(regions)),
+            'upper': np.tile(rings['upper'].to_numpy(), len(regions)),
+            'area_km2': areas.ravel() / 1e6,
+            'area_share': (areas / np.maximum(areas.sum(axis=1, keepdims=True), 1e-9)).ravel()
+        })
+        if population is not None:
+            people = band_population(regions.values, rings, *population)
+            table['population'] = people.ravel()
+            table['population_share'] = (people / np.maximum(people.sum(axis=1, keepdims=True), 1e-9)).ravel()
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+# Function to compute the statistics for the travel time and distance bands of the figures
+def accessibility_stats(region_column=MUNICIPALITY_COLUMN, population=None):
+    with stage('load'):
+        regions = load_regions(region_column)
+        institutions = load_institutions(('SOORT HO',))
+        isochrones = load_isochrones(tuple(geomap_traveltime_to_HO.desired_order),
+                                     tuple(geomap_traveltime_to_HO.travel_time_ranges))
+
+    with stage('bands'):
+        traveltime = {category: traveltime_rings(isochrones, category, geomap_traveltime_to_HO.travel_time_ranges)
+                      for category in geomap_traveltime_to_HO.desired_order}
+        distance = {category: distance_rings(institutions, category, geomap_distance_to_HO.buffer_distances)
+                    for category in geomap_distance_to_HO.desired_order}
+
+    with stage('aggregate'):
+        return pd.concat([accessibility_table(regions, traveltime, 'traveltime', population),
+                          accessibility_table(regions, distance, 'distance', population)], ignore_index=True)
+
+
+if __name__ == '__main__':
+    report_at_exit('accessibility_stats')
+
+    parser = argparse.ArgumentParser(description='Compute the share of land and population of every region '
+                                                 'in each travel time and distance band.')
+    parser.add_argument('--region-column', default=MUNICIPALITY_COLUMN,
+                        help='Column that names the regions: the municipalities by default, or a column of the base '
+                             'map such as NAME_1 for the provinces')
+    parser.add_argument('--population', help='CSV with a population grid')
+    parser.add_argument('--x-column', default='x')
+    parser.add_argument('--y-column', default='y')
+    parser.add_argument('--population-column', default='population')
+    parser.add_argument('--population-crs', type=int, default=28992, help='EPSG code of the grid coordinates')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    population = None
+    if args.population:
+        with stage('population'):
+            population = load_population(args.population, args.x_column, args.y_column, args.population_column,
+                                         args.population_crs)
+
+    table = accessibility_stats(args.region_column, population)
+    with stage('save'):
+        table.to_csv(args.output, index=False)
+    print(f"{len(table)} rows for {table['region'].nunique()} regions written to {args.output}")
@@ -0,0 +1,260 @@
+import argparse
+import io
+import os
+import subprocess
+
+import matplotlib
+matplotlib.use('Agg')  # Frames are drawn off screen; must be selected before pyplot is imported
+import matplotlib.pyplot as plt
+import numpy as np
+import shapely
+from matplotlib import animation
+from matplotlib.transforms import Bbox
+from PIL import Image
+from shapely.plotting import patch_from_polygon
+
+import geomap_distance_to_HO
+import geomap_traveltime_to_HO
+from band_engine import distance_rings, polygonal_parts, traveltime_rings
+from basemap_store import load_layer
+from institution_loader import load_institutions
+from instrumentation import report_at_exit, stage
+from isochrone_store import load_isochrones
+
+# Colors from the first to the last threshold
+COLORMAP = 'RdYlGn_r'
+
+
+# Output formats and whether they can be written here: MP4 needs ffmpeg, GIF is written with Pillow
+def output_formats():
+    return {'.mp4': animation.writers.is_available('ffmpeg'), '.gif': True}
+
+
+# Function to check that the extension of an output path is a format that can be written here
+def check_output(path):
+    extension = os.path.splitext(path)[1].lower()
+    formats = output_formats()
+    if extension not in formats:
+        raise ValueError(f"Cannot write an animation to {path}; use one of {', '.join(formats)}")
+    if not formats[extension]:
+        raise ValueError(f"Writing {extension} needs ffmpeg, which was not found; install it or write a .gif")
+
+
+# Writes a GIF one frame at a time, so no more than one frame is in memory. Every frame is encoded as a
+# single-frame GIF with its own color table; the first one is written with its file header, the others
+# without their header and global color table, and the file is closed with the GIF trailer.
+class GifWriter:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.frames = 0
+
+    def write(self, image, duration):
+        buffer = io.BytesIO()
+        options = {'duration': duration, 'include_color_table': True, 'optimize': False}
+        if not self.frames:
+            options['loop'] = 0
+        image.save(buffer, format='GIF', **options)
+        data = buffer.getvalue()[:-1]  # Without the trailer
+        if self.frames:
+            # Header and logical screen descriptor, followed by the global color table if there is one
+            flags = data[10]
+            data = data[13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 13):]
+        self.file.write(data)
+        self.frames += 1
+
+    def close(self):
+        self.file.write(b';')
+        self.file.close()
+
+
+# Streams RGB frames to ffmpeg (.mp4) or to a GIF as they are drawn, so frames are never collected in memory
+class FrameSink:
+    def __init__(self, path, width, height, fps):
+        check_output(path)
+        self.path = path
+        self.fps = fps
+        self.process = None
+        self.gif = None
+        if path.lower().endswith('.mp4'):
+            self.process = subprocess.Popen(
+                [matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error', '-f', 'rawvideo',
+                 '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:',
+                 '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', path], stdin=subprocess.PIPE)
+        else:
+            self.gif = GifWriter(path)
+
+    # Function to write a frame that is shown for repeat frames
+    def write(self, frame, repeat=1):
+        if self.process is not None:
+            data = frame.tobytes()
+            for _ in range(repeat):
+                self.process.stdin.write(data)
+        else:
+            image = Image.fromarray(frame).quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            self.gif.write(image, int(1000 * repeat / self.fps))
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed to write {self.path}")
+        else:
+            self.gif.close()
+
+
+# Function to compute the nested rings of every category once: ring i is the area first reached within
+# thresholds[i], so frame i only has to add that ring
+def animation_rings(measure, thresholds, categories):
+    if measure == 'traveltime':
+        isochrones = load_isochrones(tuple(categories), tuple(thresholds))
+        # A range without isochrones would silently give empty frames
+        for category in categories:
+            ranges = isochrones.loc[isochrones['SOORT HO'] == category, 'range'].unique()
+            missing = [value for value in thresholds if value not in ranges]
+            if missing:
+                raise ValueError(f"The isochrone store has no {category} isochrones for the travel times "
+                                 f"{', '.join(f'{value:g}' for value in missing)} s; request them first or pick "
+                                 f"other steps")
+        return {category: traveltime_rings(isochrones, category, thresholds) for category in categories}
+    institutions = load_institutions(('SOORT HO',))
+    return {category: distance_rings(institutions, category, thresholds) for category in categories}
+
+
+# Function to set up the panels with fixed limits, so the base map and the overlay line up pixel for pixel
+def panels(figsize, dpi, bounds, count):
+    fig, axes = plt.subplots(1, count, figsize=figsize, dpi=dpi)
+    for ax in np.atleast_1d(axes):
+        ax.set_xlim(bounds[0], bounds[2])
+        ax.set_ylim(bounds[1], bounds[3])
+        ax.set_aspect('equal')
+        ax.set_axis_off()
+    fig.subplots_adjust(left=0.01, right=0.99, bottom=0.01, top=0.92, wspace=0.02)
+    return fig, np.atleast_1d(axes)
+
+
+# Function to write the animation. The land is drawn once; every frame only draws the new ring of each
+# panel onto the same canvas and the threshold label, and the outlines and institutions, rendered once
+# as a transparent overlay, are blended over a copy of the canvas before the frame is streamed out.
+def export_animation(measure, thresholds, output_path, categories=('wo', 'hbo'), dpi=100, fps=10,
+                     frames_per_step=2, language='english'):
+    module = geomap_traveltime_to_HO if measure == 'traveltime' else geomap_distance_to_HO
+    legend_names = module.get_language_dict(language)['legend_names']
+    with stage('load'):
+        mapdf = load_layer('map')
+        other_areas = load_layer('land')
+        institutions = load_institutions(('SOORT HO',))
+    with stage('bands'):
+        rings = animation_rings(measure, thresholds, categories)
+
+    with stage('plot'):
+        bounds = mapdf.total_bounds
+        figsize = (6 * len(categories), 6 * (bounds[3] - bounds[1]) / (bounds[2] - bounds[0]) / 0.9)
+
+        # Overlay: outlines and institutions on a transparent background
+        fig, axes = panels(figsize, dpi, bounds, len(categories))
+        fig.patch.set_alpha(0)
+        for ax, category in zip(axes, categories):
+            mapdf.plot(ax=ax, color="#FF000000", edgecolor="black", linewidth=0.5)
+            institutions[institutions['SOORT HO'] == category].plot(ax=ax, marker='o', markersize=12,
+                                                                    color='black', zorder=3)
+        fig.canvas.draw()
+        overlay = np.asarray(fig.canvas.buffer_rgba()).copy()
+        plt.close(fig)
+        covered = overlay[..., 3] > 0
+        alpha = overlay[covered, 3:4] / 255.0
+        overlay_rgb = overlay[covered, :3] * alpha
+
+        # Canvas: the land, drawn once, and the panel titles
+        fig, axes = panels(figsize, dpi, bounds, len(categories))
+        for ax, category in zip(axes, categories):
+            other_areas.plot(ax=ax, color="white", edgecolor="none")
+            ax.set_title(legend_names.get(category, category))
+        label = fig.text(0.5, 0.955, '', ha='center', va='center', fontsize=14, animated=True)
+        fig.canvas.draw()
+        label_background = fig.canvas.copy_from_bbox(
+            Bbox.from_extents(0, 0.93, 1, 0.98).transformed(fig.transFigure))
+
+        # One patch per ring and panel, created up front but only drawn in its frame. The patches are
+        # added directly: GeoDataFrame.plot redraws the whole figure on every call.
+        colors = plt.get_cmap(COLORMAP)(np.linspace(0, 1, len(thresholds)))
+        ring_artists = []
+        for ax, category in zip(axes, categories):
+            artists = []
+            # Only polygons can become patches; overlays can leave rings as collections with lines or points
+            for index, ring in enumerate(polygonal_parts(rings[category].geometry.values[:len(thresholds)])):
+                patch = None
+                if not shapely.is_empty(ring):
+                    patch = ax.add_patch(patch_from_polygon(ring, facecolor=colors[index], edgecolor='none',
+                                                            animated=True))
+                artists.append(patch)
+            ring_artists.append(artists)
+
+    with stage('frames'):
+        width, height = fig.canvas.get_width_height()
+        sink = FrameSink(output_path, width, height, fps)
+        unit, scale = ('min', 60) if measure == 'traveltime' else ('km', 1000)
+        try:
+            for index, threshold in enumerate(thresholds):
+                for artists in ring_artists:
+                    if artists[index] is not None:
+                        artists[index].axes.draw_artist(artists[index])
+                fig.canvas.restore_region(label_background)
+                label.set_text(f'≤ {threshold / scale:g} {unit}')
+                fig.draw_artist(label)
+
+                frame = np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+                frame[covered] = (frame[covered] * (1 - alpha) + overlay_rgb).astype(np.uint8)
+                sink.write(frame, frames_per_step)
+        finally:
+            sink.close()
+            plt.close(fig)
+    return len(thresholds) * frames_per_step
+
+
+if __name__ == '__main__':
+    report_at_exit('band_animation')
+
+    parser = argparse.ArgumentParser(description='Animate the travel time or distance bands threshold by threshold.')
+    parser.add_argument('--measure', choices=['traveltime', 'distance'], default='traveltime')
+    parser.add_argument('--step', type=float,
+                        help='Threshold step (travel time: minutes, distance: km). Every travel time step up to '
+                             '--maximum must be a range of the isochrone store, but geodata_traveltime_preparation.py '
+                             'only requests 10, 15, 20, 25, 30 and 45 minutes: add the ranges there and request the '
+                             'isochrones again first. Without a step every range in the store is used.')
+    parser.add_argument('--maximum', type=float, default=45, help='Last threshold (minutes or km)')
+    parser.add_argument('--output', help='Output file: .mp4 (needs ffmpeg) or .gif; by default .mp4 when ffmpeg '
+                                         'is available')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--frames-per-step', type=int, default=2)
+    parser.add_argument('--language', default='english')
+    args = parser.parse_args()
+
+    if args.measure == 'traveltime':
+        maximum = args.maximum * 60
+        # Every range for which the store has isochrones
+        ranges = np.sort(load_isochrones(columns=('range',))['range'].unique())
+        if args.step:
+            thresholds = np.arange(args.step * 60, maximum + 1, args.step * 60)
+            missing = np.setdiff1d(thresholds, ranges)
+            if len(missing):
+                parser.error(f"--step {args.step:g} needs isochrones every {args.step:g} minutes, but the isochrone "
+                             f"store only has {', '.join(f'{value / 60:g}' for value in ranges)} minutes; add the "
+                             f"ranges to geodata_traveltime_preparation.py and run it again, or pick another step")
+        else:
+            thresholds = ranges[ranges <= maximum]
+    else:
+        maximum = args.maximum * 1000
+        thresholds = np.arange((args.step or 1) * 1000, maximum + 1, (args.step or 1) * 1000)
+    thresholds = [float(value) for value in thresholds]
+
+    extension = '.mp4' if output_formats()['.mp4'] else '.gif'
+    output = args.output or os.path.join('Visuals', f'animation_{args.measure}{extension}')
+    try:
+        check_output(output)
+    except ValueError as e:
+        parser.error(str(e))
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    frames = export_animation(args.measure, thresholds, output, dpi=args.dpi, fps=args.fps,
+                              frames_per_step=args.frames_per_step, language=args.language)
+    print(f"{frames} frames written to {output}")
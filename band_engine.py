@@ -0,0 +1,138 @@
+import hashlib
+import os
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from basemap_store import layer_digest, load_layer
+from instrumentation import count, stage
+
+# Directory for band rings cached between runs
+CACHE_DIR = os.path.join('Data', 'cache', 'bands')
+
+# Band rings already computed in this process, keyed like the files in CACHE_DIR
+_ring_cache = {}
+
+
+# Base map layers the land mask is built from
+MASK_LAYERS = ('land_union', 'water')
+
+
+# Function to build the land mask once: all land without water, dissolved and prepared
+@lru_cache(maxsize=None)
+def land_mask():
+    land, water = MASK_LAYERS
+    mask = shapely.difference(load_layer(land).geometry.iloc[0], load_layer(water).union_all())
+    shapely.prepare(mask)
+    return mask
+
+
+# Function to clip geometries to the mask; geometries that lie fully inside are kept as they are
+def clip_to_mask(geometries, mask):
+    geometries = np.asarray(geometries)
+    with stage('clip'):
+        inside = shapely.contains_properly(mask, geometries)
+        clipped = shapely.intersection(geometries[~inside], mask)
+    with stage('union'):
+        return shapely.union_all(np.concatenate([geometries[inside], clipped]))
+
+
+# Function to turn nested geometries into rings: one ring per threshold plus the area beyond the last one.
+# geometries[i] holds the geometries reached within thresholds[i]; every union builds on the previous one.
+def compute_rings(geometries, thresholds, mask=None, crs='EPSG:28992'):
+    mask = land_mask() if mask is None else mask
+    rings = []
+    previous = shapely.Polygon()
+    for current in geometries:
+        current = clip_to_mask(current, mask)
+        with stage('overlay'):
+            # The same as subtracting from the union, but without overlaying the edges both share
+            rings.append(shapely.difference(current, previous))
+            previous = shapely.union(previous, current)
+    with stage('overlay'):
+        rings.append(shapely.difference(mask, previous))
+    return ring_frame(rings, thresholds, crs)
+
+
+# Function to keep only the polygons of every geometry, dropping the lines and points that an intersection
+# leaves where a ring touches a border. Geometries without any polygon become an empty MultiPolygon.
+def polygonal_parts(geometries):
+    parts, index = shapely.get_parts(geometries, return_index=True)
+    keep = shapely.get_type_id(parts) == shapely.GeometryType.POLYGON
+    return shapely.multipolygons(parts[keep], indices=index[keep],
+                                 out=np.full(len(geometries), shapely.MultiPolygon(), dtype=object))
+
+
+# Function to label rings with their band and the thresholds that bound them
+def ring_frame(rings, thresholds, crs='EPSG:28992'):
+    return gpd.GeoDataFrame({
+        'band': np.arange(len(rings)),
+        'lower': [0] + list(thresholds),
+        'upper': list(thresholds) + [np.inf]
+    }, geometry=list(rings), crs=crs)
+
+
+# Function to fingerprint the input of a band computation
+def fingerprint(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, gpd.GeoDataFrame):
+            digest.update(b''.join(shapely.to_wkb(part.geometry.values)))
+            digest.update(part.drop(columns=part.geometry.name).to_csv(index=False).encode('utf-8'))
+        else:
+            digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+# Function to name the rings of one category in the cache by what they are computed from: the thresholds,
+# the subset and the version of the base map layers the rings are clipped to
+def ring_key(name, category, thresholds, subset):
+    return f'{name}_{category}_{fingerprint(list(thresholds), subset, layer_digest(MASK_LAYERS))}'
+
+
+# Function to keep rings computed elsewhere (for example per partition) in memory and on disk
+def store_rings(key, rings, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    rings.to_parquet(os.path.join(cache_dir, key + '.parquet'))
+    _ring_cache[key] = rings
+
+
+# Function to return the rings for one category from memory or disk, computing them only when needed.
+# Every caller gets its own copy, so changing it leaves the cached rings intact.
+def cached_rings(name, category, thresholds, subset, build, cache_dir=CACHE_DIR):
+    key = ring_key(name, category, thresholds, subset)
+    if key in _ring_cache:
+        count('band_cache_hits')
+    else:
+        path = os.path.join(cache_dir, key + '.parquet')
+        if os.path.exists(path):
+            count('band_cache_hits')
+            _ring_cache[key] = gpd.read_parquet(path)
+        else:
+            count('band_cache_misses')
+            store_rings(key, compute_rings(build(subset), thresholds, crs=subset.crs), cache_dir)
+    return _ring_cache[key].copy()
+
+
+# Function to select what the distance rings of one category are computed from
+def distance_subset(points, category):
+    return points.loc[points['SOORT HO'] == category, [points.geometry.name]]
+
+
+# Function to select what the travel time rings of one category are computed from
+def traveltime_subset(isochrones, category):
+    return isochrones.loc[isochrones['SOORT HO'] == category, ['range', isochrones.geometry.name]]
+
+
+# Distance rings around the projected institution points of one category
+def distance_rings(points, category, distances):
+    return cached_rings('distance', category, distances, distance_subset(points, category),
+                        lambda subset: [subset.buffer(distance).values for distance in distances])
+
+
+# Travel time rings from the projected isochrones of one category
+def traveltime_rings(isochrones, category, ranges):
+    return cached_rings('traveltime', category, ranges, traveltime_subset(isochrones, category),
+                        lambda subset: [subset.geometry[subset['range'] == value].values for value in ranges])
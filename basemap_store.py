@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import os
+from functools import lru_cache
+
+import geopandas as gpd
+
+# Source of the Netherlands base map
+BASEMAP_URL = "https://stacks.stanford.edu/file/druid:st293bj4601/data.zip"
+
+# Source of the municipality boundaries: the generalized municipalities of Statistics Netherlands (CBS),
+# published by PDOK. The base map itself only has the provinces.
+MUNICIPALITIES_URL = ("https://service.pdok.nl/cbs/gebiedsindelingen/2023/wfs/v1_0?request=GetFeature&service=WFS"
+                      "&version=2.0.0&typeName=gemeente_gegeneraliseerd&outputFormat=json")
+
+# Column of the municipalities layer with the municipality name, and the one with its CBS code (e.g. GM0363)
+MUNICIPALITY_COLUMN = 'GEMEENTENAAM'
+MUNICIPALITY_CODE_COLUMN = 'GEMEENTECODE'
+
+# Local store with the base map layers as GeoParquet, already projected to EPSG:28992
+STORE_DIR = os.path.join('Data', 'basemap')
+
+# Layers in the store:
+#   map        - the full base map
+#   land       - every area that is not a water body
+#   water      - the water bodies
+#   land_union - all land dissolved into a single geometry
+#   municipalities - the municipality boundaries, imported separately from MUNICIPALITIES_URL
+LAYERS = ['map', 'land', 'water', 'land_union', 'municipalities']
+
+# Value of TYPE_1 that marks the water bodies of the base map
+WATER_TYPE = 'Water body'
+
+
+def layer_path(name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, name + '.parquet')
+
+
+# One-time import: download (or read a local copy of) the base map, project it and write every layer
+def import_basemap(source=BASEMAP_URL, store_dir=STORE_DIR):
+    mapdf = gpd.read_file(source).to_crs(epsg=28992)
+
+    # Separate water bodies from other areas
+    water_bodies = mapdf[mapdf['TYPE_1'] == WATER_TYPE]
+    other_areas = mapdf[mapdf['TYPE_1'] != WATER_TYPE]
+    land_union = gpd.GeoDataFrame(geometry=[other_areas.union_all()], crs=mapdf.crs)
+
+    os.makedirs(store_dir, exist_ok=True)
+    layers = {'map': mapdf, 'land': other_areas, 'water': water_bodies, 'land_union': land_union}
+    for name, layer in layers.items():
+        layer.reset_index(drop=True).to_parquet(layer_path(name, store_dir))
+    cached_layer.cache_clear()
+
+
+# One-time import of the municipality boundaries, projected and with the CBS names and codes
+def import_municipalities(source=MUNICIPALITIES_URL, store_dir=STORE_DIR):
+    municipalities = gpd.read_file(source).to_crs(epsg=28992)
+    municipalities = municipalities.rename(columns={'statnaam': MUNICIPALITY_COLUMN,
+                                                    'statcode': MUNICIPALITY_CODE_COLUMN})
+    municipalities = municipalities[[MUNICIPALITY_COLUMN, MUNICIPALITY_CODE_COLUMN, 'geometry']]
+
+    os.makedirs(store_dir, exist_ok=True)
+    municipalities.reset_index(drop=True).to_parquet(layer_path('municipalities', store_dir))
+    cached_layer.cache_clear()
+
+
+# Function to import the layer a missing file belongs to
+def import_layer(name, store_dir=STORE_DIR):
+    if name == 'municipalities':
+        import_municipalities(store_dir=store_dir)
+    else:
+        import_basemap(store_dir=store_dir)
+
+
+# Function to fingerprint the current version of layers by the size and modification time of their files,
+# so results derived from them can be cached until the base map is imported again
+def layer_digest(names, store_dir=STORE_DIR):
+    digest = hashlib.sha256()
+    for name in names:
+        path = layer_path(name, store_dir)
+        if not os.path.exists(path):
+            import_layer(name, store_dir)
+        status = os.stat(path)
+        digest.update(f'{name}|{status.st_size}|{status.st_mtime_ns}|'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+# Function to pick the layer with the regions of a column: the municipalities layer for the municipality
+# columns, the land of the base map (e.g. NAME_1 for the provinces) for any other
+def region_layer(region_column):
+    return 'municipalities' if region_column in (MUNICIPALITY_COLUMN, MUNICIPALITY_CODE_COLUMN) else 'land'
+
+
+# Function to load a single layer, reading only the requested columns and importing the store on first use.
+# Every caller gets its own copy, so changing it leaves the cached layer intact.
+def load_layer(name, columns=None, store_dir=STORE_DIR):
+    return cached_layer(name, columns, store_dir).copy()
+
+
+# Function to load a layer once per process; the frame is shared, use load_layer instead
+@lru_cache(maxsize=None)
+def cached_layer(name, columns, store_dir):
+    if name not in LAYERS:
+        raise ValueError(f"Unknown base map layer '{name}', expected one of {LAYERS}")
+    path = layer_path(name, store_dir)
+    if not os.path.exists(path):
+        import_layer(name, store_dir)
+    if columns is not None:
+        columns = list(columns) + ['geometry']
+    return gpd.read_parquet(path, columns=columns, memory_map=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import the base map layers into the local store.')
+    parser.add_argument('source', nargs='?', default=BASEMAP_URL,
+                        help='Base map URL or a local copy of it')
+    parser.add_argument('--municipalities', default=MUNICIPALITIES_URL,
+                        help='Municipality boundaries URL or a local copy of them (GeoJSON with statnaam and statcode)')
+    args = parser.parse_args()
+
+    import_basemap(args.source)
+    import_municipalities(args.municipalities)
+    print(f"Base map layers written to {STORE_DIR}")
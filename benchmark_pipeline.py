@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import matplotlib
+matplotlib.use('Agg')  # Render headless; must be selected before pyplot is imported
+import matplotlib.pyplot as plt
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from geopy.extra.rate_limiter import RateLimiter
+from geopy.geocoders import Nominatim
+
+import geomap_distance_to_HO
+import geomap_traveltime_to_HO
+import stub_nominatim_server
+import stub_ors_server
+from band_engine import compute_rings
+from geocode_cache import address_key, location_to_entry
+from geometry_lod import LevelOfDetail
+from isochrone_fetcher import IsochroneFetcher
+
+# Dataset sizes to benchmark, matching today's 54 institutions up to every school in the country
+SIZES = [54, 500, 5000, 50000]
+
+# Approximate extent of the Netherlands in EPSG:28992
+EXTENT = (13000, 306000, 278000, 620000)
+
+
+# Function to build a synthetic base map shaped like the real one: a grid of regions plus a water body
+def synthetic_basemap():
+    minx, miny, maxx, maxy = EXTENT
+    xs = np.linspace(minx, maxx, 4)
+    ys = np.linspace(miny, maxy, 5)
+    water = shapely.box(120000, 500000, 170000, 560000)
+    regions = [shapely.box(xs[i], ys[j], xs[i + 1], ys[j + 1]).difference(water)
+               for i in range(3) for j in range(4)]
+    return gpd.GeoDataFrame({
+        'NAME_1': [f'Region {i}' for i in range(len(regions))] + ['Water'],
+        'TYPE_1': ['Provincie'] * len(regions) + ['Water body']
+    }, geometry=regions + [water], crs='EPSG:28992')
+
+
+# Function to generate n institutions with the columns of Geodata_prepared.csv that the pipeline uses
+def synthetic_institutions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = EXTENT
+    points = gpd.GeoSeries(gpd.points_from_xy(rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n)),
+                           crs='EPSG:28992').to_crs(epsg=4326)
+    df = pd.DataFrame({
+        'SOORT HO': rng.choice(['hbo', 'wo'], size=n, p=[0.7, 0.3]),
+        'PROVINCIE': rng.choice(['Groningen', 'Utrecht', 'Zeeland', 'Limburg'], size=n),
+        'INSTELLINGSCODE': [f'{i:05d}' for i in range(n)],
+        'INSTELLINGSNAAM': [f'Instelling {i}' for i in range(n)],
+        'STRAATNAAM': [f'Straat {i % 997}' for i in range(n)],
+        'POSTCODE': [f'{1000 + i % 9000} {chr(65 + i % 26)}{chr(65 + i // 26 % 26)}' for i in range(n)],
+        'PLAATSNAAM': [f'PLAATS {i % 389}' for i in range(n)],
+        'latitude': points.y.to_numpy(),
+        'longitude': points.x.to_numpy()
+    })
+    df['address'] = [{'street': street, 'postalcode': postcode, 'city': city, 'country': 'Netherlands'}
+                     for street, postcode, city in zip(df['STRAATNAAM'], df['POSTCODE'], df['PLAATSNAAM'])]
+    return df
+
+
+# Function to generate nested, irregular isochrones shaped like all_isochrones.geojson
+def synthetic_isochrones(institutions, ranges, speed=15.0, vertices=48, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(institutions)
+    points = gpd.GeoSeries(gpd.points_from_xy(institutions['longitude'], institutions['latitude']),
+                           crs='EPSG:4326').to_crs(epsg=28992)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+
+    # One random shape per institution, scaled up for every range so the isochrones stay nested
+    shape = rng.uniform(0.6, 1.0, size=(n, vertices))
+    frames = []
+    for value in ranges:
+        radius = value * speed * shape
+        x = points.x.to_numpy()[:, None] + radius * np.cos(angles)
+        y = points.y.to_numpy()[:, None] + radius * np.sin(angles)
+        rings = np.stack([x, y], axis=2)
+        rings = np.concatenate([rings, rings[:, :1]], axis=1)
+        frames.append(gpd.GeoDataFrame({
+            'latitude': institutions['latitude'],
+            'longitude': institutions['longitude'],
+            'INSTELLINGSNAAM': institutions['INSTELLINGSNAAM'],
+            'SOORT HO': institutions['SOORT HO'],
+            'range': float(value)
+        }, geometry=shapely.polygons(rings), crs='EPSG:28992'))
+    return pd.concat(frames, ignore_index=True).to_crs(epsg=4326)
+
+
+# Function to time a stage: wall time, CPU time and the number of items processed
+def timed(stage, size, function):
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    items = function()
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    print(f"{stage:<20} n={size:<6} items={items:<7} {wall:8.3f}s wall {cpu:8.3f}s cpu")
+    return {'stage': stage, 'size': size, 'items': items, 'wall_seconds': wall, 'cpu_seconds': cpu}
+
+
+# Function to start a stub server in a background thread
+def start_stub(module):
+    server = module.make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Function to run every stage for one dataset size
+def benchmark_size(size, network_limit, dpi, nominatim, ors):
+    institutions = synthetic_institutions(size)
+    network_rows = institutions.head(network_limit)
+    results = []
+
+    # Geocoding through the stub Nominatim server without a rate limit, then again from the cache
+    geolocator = Nominatim(user_agent='benchmark', domain=f'127.0.0.1:{nominatim.server_port}', scheme='http')
+    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=0, swallow_exceptions=False)
+    cache = {}
+
+    def geocode_cold():
+        for address in network_rows['address']:
+            cache[address_key(address)] = location_to_entry(geocode(address))
+        return len(network_rows)
+
+    def geocode_cached():
+        return sum(address_key(address) in cache for address in network_rows['address'])
+
+    results.append(timed('geocode', size, geocode_cold))
+    results.append(timed('geocode_cached', size, geocode_cached))
+
+    # Isochrone fetching through the stub OpenRouteService server with an unlimited request budget
+    ranges = geomap_traveltime_to_HO.travel_time_ranges
+    fetcher = IsochroneFetcher(None, base_url=f'http://127.0.0.1:{ors.server_port}',
+                               requests_per_minute=10 ** 9, max_workers=8)
+    jobs = [{'locations': [(lon, lat)], 'profile': 'driving-car', 'range_type': 'time', 'range': ranges,
+             'smoothing': 10} for lon, lat in zip(network_rows['longitude'], network_rows['latitude'])]
+    results.append(timed('isochrones', size, lambda: sum(r is not None for _, r in fetcher.fetch_all(jobs))))
+
+    # Band rings over a synthetic land mask, as computed by the distance and travel time figures
+    basemap = synthetic_basemap()
+    land = basemap[basemap['TYPE_1'] != 'Water body']
+    mask = shapely.difference(land.union_all(), basemap[basemap['TYPE_1'] == 'Water body'].union_all())
+    shapely.prepare(mask)
+    points = gpd.GeoDataFrame(institutions[['SOORT HO']], crs='EPSG:4326',
+                              geometry=gpd.points_from_xy(institutions['longitude'], institutions['latitude'])
+                              ).to_crs(epsg=28992)
+    isochrones = synthetic_isochrones(institutions, ranges).to_crs(epsg=28992)
+    distances = geomap_distance_to_HO.buffer_distances
+    distance_rings, traveltime_rings = {}, {}
+
+    def bands_distance():
+        for category in ['wo', 'hbo']:
+            subset = points[points['SOORT HO'] == category]
+            distance_rings[category] = compute_rings([subset.buffer(d).values for d in distances], distances, mask)
+        return len(points)
+
+    def bands_traveltime():
+        for category in ['wo', 'hbo']:
+            subset = isochrones[isochrones['SOORT HO'] == category]
+            traveltime_rings[category] = compute_rings(
+                [subset.geometry[subset['range'] == value].values for value in ranges], ranges, mask)
+        return len(isochrones)
+
+    results.append(timed('bands_distance', size, bands_distance))
+    results.append(timed('bands_traveltime', size, bands_traveltime))
+
+    # Rendering the travel time figure through the same code path as the plotting script
+    data = {}
+
+    def level_of_detail():
+        mapdf = LevelOfDetail(basemap)
+        data.update({
+            'mapdf': mapdf,
+            'other_areas': LevelOfDetail(land),
+            'gdf': points,
+            'rings': {category: LevelOfDetail(rings, clip_to=mapdf) for category, rings in traveltime_rings.items()}
+        })
+        return len(traveltime_rings)
+
+    def render():
+        with tempfile.TemporaryDirectory() as output_dir:
+            fig = geomap_traveltime_to_HO.render('english', data, output_dir=output_dir, dpi=dpi)
+            plt.close(fig)
+        return 1
+
+    results.append(timed('level_of_detail', size, level_of_detail))
+    results.append(timed('render', size, render))
+    return results
+
+
+# Function to describe the machine and code version, so results from different runs can be compared
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': {module.__name__: module.__version__ for module in [np, pd, gpd, shapely, matplotlib]}
+    }
+
+
+# Function to print the change per stage and size against an earlier results file
+def compare(results, previous_path):
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {(r['stage'], r['size']): r for r in json.load(f)['results']}
+    print(f"\nComparison with {previous_path}:")
+    for result in results:
+        old = previous.get((result['stage'], result['size']))
+        if old and old['wall_seconds'] > 0:
+            ratio = result['wall_seconds'] / old['wall_seconds']
+            print(f"{result['stage']:<20} n={result['size']:<6} {ratio:6.2f}x {'(slower)' if ratio > 1.1 else ''}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic datasets.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--network-limit', type=int, default=5000,
+                        help='Maximum number of rows sent through the stub servers per size')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    nominatim = start_stub(stub_nominatim_server)
+    ors = start_stub(stub_ors_server)
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark_size(size, args.network_limit, args.dpi, nominatim, ors))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
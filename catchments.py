@@ -0,0 +1,162 @@
+import argparse
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from band_engine import land_mask
+from distance_surface import LandGrid
+from institution_loader import load_institutions
+from instrumentation import report_at_exit, stage
+from isochrone_store import load_isochrones
+from offline_isochrones import dissolve_cells
+
+# Catchments written by this script, one GeoParquet file per method
+OUTPUT_DIR = os.path.join('Data', 'catchments')
+
+INSTITUTION_COLUMNS = ('INSTELLINGSCODE', 'INSTELLINGSNAAM', 'SOORT HO', 'latitude', 'longitude')
+
+# Decimals of the coordinates on which isochrones are matched to institutions, about 0.1 m
+COORDINATE_DECIMALS = 6
+
+
+# Function to clip polygons to the land mask; polygons that lie fully inside are kept as they are
+def clip(geometries, mask):
+    geometries = np.array(geometries, dtype=object)
+    inside = shapely.contains_properly(mask, geometries)
+    geometries[~inside] = shapely.intersection(geometries[~inside], mask)
+    return geometries
+
+
+# Function to build the result: one row per institution, indexed by INSTELLINGSCODE
+def catchment_frame(institutions, geometries, method):
+    frame = institutions[['INSTELLINGSCODE', 'INSTELLINGSNAAM', 'SOORT HO']].reset_index(drop=True)
+    frame['SOORT HO'] = frame['SOORT HO'].astype(str)
+    frame['method'] = method
+    catchments = gpd.GeoDataFrame(frame, geometry=list(geometries), crs='EPSG:28992')
+    catchments['area_km2'] = catchments.area / 1e6
+    return catchments.set_index('INSTELLINGSCODE')
+
+
+# Function to split the land into the areas closest (as the crow flies) to every institution of a category,
+# with one Voronoi diagram per category. Institutions at the same location share their area.
+def voronoi_catchments(institutions, mask=None):
+    mask = land_mask() if mask is None else mask
+    institutions = institutions.to_crs(epsg=28992)
+    frames = []
+    for category, members in institutions.groupby('SOORT HO', observed=True):
+        coordinates = shapely.get_coordinates(members.geometry.values)
+        locations, inverse = np.unique(coordinates, axis=0, return_inverse=True)
+        if len(locations) == 1:
+            cells = np.array([mask], dtype=object)
+        else:
+            # Ordered, so the cells line up with the locations
+            cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(locations), extend_to=mask,
+                                                               ordered=True))
+        frames.append(catchment_frame(members, clip(cells, mask)[inverse.ravel()], 'voronoi'))
+    return pd.concat(frames)
+
+
+# Function to assign grid cells to the polygons that contain them. Every polygon only tests the land cells
+# inside its bounding box, found by index arithmetic on the grid, against the prepared polygon; polygons are
+# visited by increasing range, so cells already reached within a smaller range are skipped without a test.
+# Per cell the polygon with the smallest range wins, ties go to the closest institution. Returns per cell the position
+# of the winning institution among the points (-1 if no polygon contains the cell) and its range.
+def assign_cells(grid, polygons, ranges, polygon_points, points):
+    cell_id = np.full(grid.on_land.shape, -1)
+    cell_id[grid.on_land] = np.arange(len(grid.coordinates))
+    x0, y0, resolution = grid.xs[0], grid.ys[0], grid.resolution
+
+    best_range = np.full(len(grid.coordinates), np.inf)
+    best_distance = np.full(len(grid.coordinates), np.inf)
+    best_point = np.full(len(grid.coordinates), -1)
+    shapely.prepare(polygons)
+    order = np.argsort(ranges, kind='stable')
+    for polygon, value, point, bounds in zip(polygons[order], ranges[order], polygon_points[order],
+                                             shapely.bounds(polygons[order])):
+        if point < 0 or not np.isfinite(bounds).all():
+            continue
+        col0, col1 = max(int(np.ceil((bounds[0] - x0) / resolution)), 0), int((bounds[2] - x0) // resolution) + 1
+        row0, row1 = max(int(np.ceil((y0 - bounds[3]) / resolution)), 0), int((y0 - bounds[1]) // resolution) + 1
+        cells = cell_id[row0:row1, col0:col1]
+        cells = cells[cells >= 0]
+        cells = cells[best_range[cells] >= value]
+        cells = cells[shapely.contains_xy(polygon, grid.coordinates[cells, 0], grid.coordinates[cells, 1])]
+
+        distance = ((grid.coordinates[cells] - points[point]) ** 2).sum(axis=1)
+        better = (value < best_range[cells]) | ((value == best_range[cells]) & (distance < best_distance[cells]))
+        cells = cells[better]
+        best_range[cells], best_distance[cells], best_point[cells] = value, distance[better], point
+    return best_point, best_range
+
+
+# Function to key rows by their WGS 84 coordinates, rounded to absorb the float noise of writing and reading them
+def location_keys(frame):
+    return pd.MultiIndex.from_arrays([frame['longitude'].to_numpy(dtype=float).round(COORDINATE_DECIMALS),
+                                      frame['latitude'].to_numpy(dtype=float).round(COORDINATE_DECIMALS)])
+
+
+# Function to split the land by travel time: every grid cell goes to the institution of each category whose
+# isochrone reaches it with the smallest range (ties go to the closest institution), and the cells of every
+# institution are dissolved into one polygon. Cells that no isochrone reaches belong to no institution.
+def traveltime_catchments(institutions, isochrones, resolution=250, mask=None):
+    mask = land_mask() if mask is None else mask
+    institutions = institutions.to_crs(epsg=28992)
+    isochrones = isochrones.to_crs(epsg=28992)
+    grid = LandGrid(resolution, mask)
+
+    # Cell position of every land cell, with rows counted from the bottom as dissolve_cells expects
+    row, col = np.nonzero(grid.on_land)
+    row = len(grid.ys) - 1 - row
+    edges_x = grid.xs[0] - resolution / 2 + resolution * np.arange(len(grid.xs) + 1)
+    edges_y = grid.ys[-1] - resolution / 2 + resolution * np.arange(len(grid.ys) + 1)
+
+    frames = []
+    for category, members in institutions.groupby('SOORT HO', observed=True):
+        # Location of every isochrone of the category, found by the coordinates it was requested for, so every
+        # campus of an institution gets its own isochrones; institutions at the same location share their area,
+        # as in the Voronoi catchments
+        locations, inverse = np.unique(shapely.get_coordinates(members.geometry.values), axis=0, return_inverse=True)
+        polygons = isochrones[isochrones['SOORT HO'].astype(str) == str(category)]
+        lookup = pd.Series(inverse.ravel(), index=location_keys(members))
+        lookup = lookup[~lookup.index.duplicated()]
+        polygon_locations = lookup.reindex(location_keys(polygons)).fillna(-1).to_numpy(dtype=int)
+        cell_location, _ = assign_cells(grid, polygons.geometry.values, polygons['range'].to_numpy(dtype=float),
+                                        polygon_locations, locations)
+
+        # Group the cells by location, in row-major order within a group
+        order = np.lexsort((col, row, cell_location))
+        cell_location, cell_col, cell_row = cell_location[order], col[order], row[order]
+        starts = np.searchsorted(cell_location, np.arange(len(locations)))
+        ends = np.searchsorted(cell_location, np.arange(len(locations)), side='right')
+        geometries = np.array([dissolve_cells(cell_col[start:end], cell_row[start:end], edges_x, edges_y)
+                               if end > start else shapely.Polygon() for start, end in zip(starts, ends)],
+                              dtype=object)
+        frames.append(catchment_frame(members, clip(geometries, mask)[inverse.ravel()], 'traveltime'))
+    return pd.concat(frames)
+
+
+if __name__ == '__main__':
+    report_at_exit('catchments')
+
+    parser = argparse.ArgumentParser(description='Split the land into the service area of every institution.')
+    parser.add_argument('--method', nargs='+', choices=['voronoi', 'traveltime'], default=['voronoi', 'traveltime'])
+    parser.add_argument('--resolution', type=int, default=250, help='Grid cell size in meters for travel times')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    with stage('load'):
+        institutions = load_institutions(INSTITUTION_COLUMNS)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for method in args.method:
+        with stage(method):
+            if method == 'voronoi':
+                catchments = voronoi_catchments(institutions)
+            else:
+                isochrones = load_isochrones(columns=('SOORT HO', 'range', 'latitude', 'longitude'))
+                catchments = traveltime_catchments(institutions, isochrones, args.resolution)
+        path = os.path.join(args.output_dir, f'catchments_{method}.parquet')
+        catchments.to_parquet(path)
+        print(f"{len(catchments)} {method} catchments written to {path}")
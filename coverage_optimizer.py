@@ -0,0 +1,164 @@
+import argparse
+import heapq
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+import geomap_distance_to_HO
+import geomap_traveltime_to_HO
+from accessibility_stats import load_population
+from band_engine import distance_rings, traveltime_rings
+from distance_surface import LandGrid
+from institution_loader import load_institutions
+from instrumentation import report_at_exit, stage
+from isochrone_store import load_isochrones
+
+# Selected sites in order of selection, written by this script
+OUTPUT_PATH = os.path.join('Data', 'coverage_sites.csv')
+
+
+# Function to find the coverage gap: the land that no institution of the category reaches within the
+# threshold, as points with a weight. Without a population grid the points are the centres of grid cells
+# weighted by their area in km², otherwise the populated grid points weighted by their population.
+# The threshold must be one of the band thresholds of the rings.
+def gap_points(rings, threshold, resolution=250, population=None):
+    thresholds = rings['upper'].to_numpy()[:-1]
+    if threshold not in thresholds:
+        raise ValueError(f"Threshold {threshold:g} is not one of the band thresholds "
+                         f"({', '.join(f'{value:g}' for value in thresholds)})")
+    gap = shapely.union_all(rings.geometry.values[rings['lower'].to_numpy() >= threshold])
+    shapely.prepare(gap)
+    if population is None:
+        coordinates = LandGrid(resolution).coordinates
+        weights = np.full(len(coordinates), resolution ** 2 / 1e6)
+    else:
+        points, weights = population
+        coordinates = shapely.get_coordinates(points)
+    inside = shapely.contains_xy(gap, coordinates[:, 0], coordinates[:, 1])
+    return coordinates[inside], weights[inside]
+
+
+# Function to list the gap points every candidate covers when covering means being within a distance
+def distance_coverage(candidates, coordinates, distance):
+    neighbours = cKDTree(coordinates).query_ball_point(shapely.get_coordinates(candidates.geometry.values),
+                                                       r=distance, workers=-1)
+    return [np.asarray(points, dtype=int) for points in neighbours]
+
+
+# Function to list the gap points every candidate covers when covering means lying inside its isochrone.
+# isochrones has one polygon per candidate, in the order of the candidates.
+def isochrone_coverage(isochrones, coordinates):
+    polygons = isochrones.geometry.values
+    shapely.prepare(polygons)
+    polygon_index, point_index = shapely.STRtree(shapely.points(coordinates)).query(polygons, predicate='contains')
+    order = np.argsort(polygon_index, kind='stable')
+    polygon_index, point_index = polygon_index[order], point_index[order]
+    starts = np.searchsorted(polygon_index, np.arange(len(polygons)))
+    ends = np.searchsorted(polygon_index, np.arange(len(polygons)), side='right')
+    return [point_index[start:end] for start, end in zip(starts, ends)]
+
+
+# Function to pick k candidates greedily, each time the one that covers the most weight not covered yet.
+# Gains only shrink as more is covered, so a candidate's last computed gain is an upper bound: candidates
+# are kept in a heap by that bound and only the top one is re-evaluated, against a mask of covered points.
+def lazy_greedy(coverage, weights, k):
+    covered = np.zeros(len(weights), dtype=bool)
+    heap = [(-weights[points].sum(), index) for index, points in enumerate(coverage)]
+    heapq.heapify(heap)
+    selected, gains, evaluations = [], [], len(heap)
+    while heap and len(selected) < k:
+        _, index = heapq.heappop(heap)
+        gain = weights[coverage[index][~covered[coverage[index]]]].sum()
+        evaluations += 1
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, index))
+            continue
+        if gain <= 0:
+            break
+        selected.append(index)
+        gains.append(gain)
+        covered[coverage[index]] = True
+    return selected, gains, evaluations
+
+
+# Function to read the candidate sites: a CSV with an id and WGS 84 coordinates
+def load_candidates(path, id_column='id', lon_column='longitude', lat_column='latitude'):
+    candidates = pd.read_csv(path).dropna(subset=[lon_column, lat_column])
+    geometry = gpd.points_from_xy(candidates[lon_column], candidates[lat_column], crs='EPSG:4326')
+    return gpd.GeoDataFrame(candidates[[id_column]].rename(columns={id_column: 'id'}),
+                            geometry=geometry).to_crs(epsg=28992).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    report_at_exit('coverage_optimizer')
+
+    parser = argparse.ArgumentParser(description='Pick the candidate sites that most reduce the area (or population) '
+                                                 'beyond a travel time or distance band.')
+    parser.add_argument('candidates', help='CSV with candidate sites')
+    parser.add_argument('--category', default='hbo', choices=['hbo', 'wo'])
+    parser.add_argument('--measure', default='traveltime', choices=['traveltime', 'distance'])
+    parser.add_argument('--threshold', type=float,
+                        help='Travel time (s) or distance (m) to cover; default is the largest band of the figure')
+    parser.add_argument('--candidate-isochrones',
+                        help='Isochrones of the candidates (required for travel time), with the id column and range')
+    parser.add_argument('-k', type=int, default=5, help='Number of sites to pick')
+    parser.add_argument('--id-column', default='id')
+    parser.add_argument('--lon-column', default='longitude')
+    parser.add_argument('--lat-column', default='latitude')
+    parser.add_argument('--resolution', type=int, default=250, help='Grid cell size in meters for the land area')
+    parser.add_argument('--population', help='CSV with a population grid, to maximize population instead of area')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+    if args.measure == 'traveltime' and not args.candidate_isochrones:
+        parser.error('--candidate-isochrones is required for travel time')
+
+    # The gap is the union of the bands beyond the threshold, so only band thresholds can be used
+    ranges = geomap_traveltime_to_HO.travel_time_ranges if args.measure == 'traveltime' \
+        else geomap_distance_to_HO.buffer_distances
+    threshold = ranges[-1] if args.threshold is None else args.threshold
+    if threshold not in ranges:
+        parser.error(f"--threshold must be one of the band thresholds for {args.measure}: "
+                     f"{', '.join(f'{value:g}' for value in ranges)}")
+
+    with stage('load'):
+        candidates = load_candidates(args.candidates, args.id_column, args.lon_column, args.lat_column)
+        population = load_population(args.population) if args.population else None
+        institutions = load_institutions(('SOORT HO',))
+
+    with stage('gap'):
+        if args.measure == 'traveltime':
+            isochrones = load_isochrones((args.category,), tuple(ranges))
+            rings = traveltime_rings(isochrones, args.category, ranges)
+        else:
+            rings = distance_rings(institutions, args.category, ranges)
+        coordinates, weights = gap_points(rings, threshold, args.resolution, population)
+
+    with stage('coverage'):
+        if args.measure == 'traveltime':
+            polygons = gpd.read_file(args.candidate_isochrones).to_crs(epsg=28992)
+            polygons = polygons[polygons['range'].astype(float) == threshold]
+            polygons = polygons.drop_duplicates(args.id_column).set_index(args.id_column).reindex(candidates['id'])
+            # Without a single matching isochrone nothing could be covered
+            if polygons.geometry.isna().all():
+                parser.error(f"{args.candidate_isochrones} has no isochrones with range {threshold:g} for the "
+                             f"candidates in {args.candidates}")
+            polygons = polygons.set_geometry(polygons.geometry.fillna(shapely.Polygon()))
+            coverage = isochrone_coverage(polygons, coordinates)
+        else:
+            coverage = distance_coverage(candidates, coordinates, threshold)
+
+    with stage('optimize'):
+        selected, gains, evaluations = lazy_greedy(coverage, weights, args.k)
+
+    unit = 'inhabitants' if population is not None else 'km2'
+    result = candidates.loc[selected, ['id']].assign(gain=gains)
+    result['cumulative'] = result['gain'].cumsum()
+    result['remaining_gap'] = weights.sum() - result['cumulative']
+    result.to_csv(args.output, index=False)
+    print(f"Gap beyond {threshold:g}: {weights.sum():,.0f} {unit}; {len(candidates)} candidates, "
+          f"{evaluations} gain evaluations")
+    print(result.to_string(index=False))
@@ -0,0 +1,40 @@
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+from band_engine import land_mask
+
+
+# Regular EPSG:28992 grid of cell centres over the land mask, ordered top row first as imshow expects
+class LandGrid:
+    def __init__(self, resolution=250, mask=None):
+        mask = land_mask() if mask is None else mask
+        minx, miny, maxx, maxy = mask.bounds
+        self.resolution = resolution
+        self.xs = np.arange(minx + resolution / 2, maxx, resolution)
+        self.ys = np.arange(maxy - resolution / 2, miny, -resolution)
+        xx, yy = np.meshgrid(self.xs, self.ys)
+        self.on_land = shapely.contains_xy(mask, xx, yy)
+        self.coordinates = np.column_stack([xx[self.on_land], yy[self.on_land]])
+        self.extent = [self.xs[0] - resolution / 2, self.xs[-1] + resolution / 2,
+                       self.ys[-1] - resolution / 2, self.ys[0] + resolution / 2]
+
+
+# Function to compute the distance (in meters) from every land cell to the nearest point; NaN off land
+def distance_raster(points, grid):
+    tree = cKDTree(np.column_stack([points.geometry.x, points.geometry.y]))
+    distances = np.full(grid.on_land.shape, np.nan)
+    distances[grid.on_land], _ = tree.query(grid.coordinates, workers=-1)
+    return distances
+
+
+# Function to compute one distance raster per category of the projected institution points
+def category_distance_rasters(points, categories, grid):
+    return {category: distance_raster(points[points['SOORT HO'] == category], grid) for category in categories}
+
+
+# Function to turn a distance raster into band indices: 0 below the first threshold, len(thresholds)
+# beyond the last one, and a masked cell off land
+def distance_bands(distances, thresholds):
+    bands = np.digitize(np.nan_to_num(distances, nan=np.inf), thresholds)
+    return np.ma.masked_where(np.isnan(distances), bands)
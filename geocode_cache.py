@@ -0,0 +1,98 @@
+import ast
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+# Default location of the persistent geocode cache
+CACHE_PATH = os.path.join('Data', 'cache', 'geocode_cache.json')
+
+# Addresses Nominatim did not find are asked again once their entry is older than this (seconds), so a
+# temporary miss is not remembered forever
+MISS_RETRY_SECONDS = 7 * 24 * 3600
+
+# Address fields that make up the cache key, in a fixed order
+ADDRESS_FIELDS = ['street', 'postalcode', 'city', 'country']
+
+
+# Function to build a normalized cache key from an address dictionary
+def address_key(address):
+    parts = []
+    for field in ADDRESS_FIELDS:
+        value = address.get(field)
+        value = '' if pd.isna(value) else str(value)
+        value = re.sub(r'\s+', ' ', value).strip().lower()
+        if field == 'postalcode':
+            value = value.replace(' ', '')
+        parts.append(value)
+    return '|'.join(parts)
+
+
+# Function to convert a geopy location into a cache entry. A location that was not found is stored with
+# empty coordinates and the time of the request.
+def location_to_entry(location, now=None):
+    if location is None:
+        return {'location': None, 'latitude': None, 'longitude': None,
+                'missed_at': time.time() if now is None else now}
+    return {
+        'location': location.address,
+        'latitude': location.latitude,
+        'longitude': location.longitude
+    }
+
+
+# Function to tell whether an entry holds coordinates
+def is_found(entry):
+    return entry is not None and entry.get('latitude') is not None
+
+
+# Function to tell whether a cache entry can be used: found locations always, misses only while they are
+# recent. Misses of older caches were stored as None without a time and are always asked again.
+def is_fresh(entry, now=None, retry_seconds=MISS_RETRY_SECONDS):
+    if is_found(entry):
+        return True
+    if entry is None or entry.get('missed_at') is None:
+        return False
+    return (time.time() if now is None else now) - entry['missed_at'] < retry_seconds
+
+
+# Function to load the cache from disk, returning an empty cache if there is none yet
+def load_cache(path=CACHE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Function to write the cache atomically, so an interrupted run never corrupts it. The entries are merged
+# into the cache on disk, so addresses that were not part of this run keep their results.
+def save_cache(cache, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    merged = load_cache(path)
+    merged.update(cache)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# Function to seed the cache from a previously prepared CSV, so existing results are not paid for again
+def seed_from_prepared(cache, prepared_path):
+    if not os.path.exists(prepared_path):
+        return 0
+    prepared = pd.read_csv(prepared_path, usecols=['address', 'location', 'latitude', 'longitude'])
+    added = 0
+    for row in prepared.itertuples(index=False):
+        if pd.isna(row.latitude) or pd.isna(row.longitude):
+            continue
+        key = address_key(ast.literal_eval(row.address))
+        if key not in cache:
+            cache[key] = {
+                'location': None if pd.isna(row.location) else row.location,
+                'latitude': row.latitude,
+                'longitude': row.longitude
+            }
+            added += 1
+    return added
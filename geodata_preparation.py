@@ -1,12 +1,28 @@
+import numpy as np
 import pandas as pd
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
+from geocode_cache import address_key, is_found, is_fresh, location_to_entry, load_cache, save_cache, seed_from_prepared
+from instrumentation import count, report_at_exit, stage
+from postcode_geocoder import PostcodeIndex
+
+# Write a timing report (stages, API calls and cache hits) to Data/reports when the script exits
+report_at_exit('geodata_preparation')
+
+# Incremental mode: only new or changed addresses are sent to the geocoder, the rest comes from the cache
+incremental = True  # Change to False to re-geocode every address
+
+# Resolve addresses with the local postcode + house number index first (built with postcode_geocoder.py);
+# only the rows it cannot resolve are sent to Nominatim
+use_postcode_index = PostcodeIndex.exists()
+postcode_fallback = True  # Use the centre of the postcode when the house number is not in the index
 
 # Initialize Nominatim API with a user agent and increased timeout
 geolocator = Nominatim(user_agent="myGeocoder", timeout=10)
 
 # Read the CSV file
-df = pd.read_csv(r"Data\Locaties hoger onderwijs.csv", sep=',')
+with stage('load'):
+    df = pd.read_csv(r"Data\Locaties hoger onderwijs.csv", sep=',')
 
 # Create address dictionary for each row
 df['address'] = df.apply(lambda row: {
@@ -16,26 +32,70 @@ df['address'] = df.apply(lambda row: {
     'country': 'Netherlands'
 }, axis=1)
 
-# Apply rate limiter to the geocode function
-geocode = RateLimiter(geolocator.geocode, min_delay_seconds=2, max_retries=3, error_wait_seconds=10)
+# Apply rate limiter to the geocode function; errors are raised so they are logged and never cached
+geocode = RateLimiter(geolocator.geocode, min_delay_seconds=2, max_retries=3, error_wait_seconds=10,
+                      swallow_exceptions=False)
+
+# Load the geocode cache and seed it from the previous output, so unchanged rows are never geocoded again.
+# Without incremental mode every address is geocoded again; the results are still merged into the cache.
+with stage('load_cache'):
+    cache = load_cache() if incremental else {}
+    if incremental:
+        seed_from_prepared(cache, r"Data\Geodata_prepared.csv")
 
-# Function to handle geocoding with retries and logging
+# Function to handle geocoding with caching, retries and logging
 def geocode_with_logging(address):
-    try:
-        return geocode(address)
-    except Exception as e:
-        print(f"Error geocoding {address}: {e}")
-        return None
+    key = address_key(address)
+    if is_fresh(cache.get(key)):
+        count('geocode_cache_hits')
+    else:
+        count('geocode_api_calls')
+        try:
+            cache[key] = location_to_entry(geocode(address))
+        except Exception as e:
+            print(f"Error geocoding {address}: {e}")
+            return None
+    return cache[key]
+
+# Look up all rows at once in the local postcode index
+with stage('geocode_local'):
+    if use_postcode_index:
+        local = PostcodeIndex().lookup(df['POSTCODE'], df['HUISNUMMER-TOEVOEGING'], fallback=postcode_fallback)
+    else:
+        local = pd.DataFrame({'longitude': np.nan, 'latitude': np.nan, 'precision': None}, index=df.index)
+    local.index = df.index
+    resolved = local['precision'].notna()
+count('geocode_local_hits', int(resolved.sum()))
+
+# Apply the geocoding function to the remaining addresses, writing the cache even if the run is interrupted
+try:
+    with stage('geocode'):
+        entries = df.loc[~resolved, 'address'].apply(geocode_with_logging)
+finally:
+    with stage('save_cache'):
+        save_cache(cache)
+
+# Extract the location description, latitude and longitude from the cache entries
+df['location'] = entries.apply(lambda entry: entry['location'] if is_found(entry) else None)
+df['latitude'] = entries.apply(lambda entry: entry['latitude'] if is_found(entry) else None)
+df['longitude'] = entries.apply(lambda entry: entry['longitude'] if is_found(entry) else None)
+df['geocoder'] = entries.apply(lambda entry: 'nominatim' if is_found(entry) else None)
 
-# Apply the geocoding function to the address column
-df['location'] = df['address'].apply(geocode_with_logging)
+# Fill in the rows resolved by the postcode index
+df.loc[resolved, 'location'] = (df['STRAATNAAM'] + ' ' + df['HUISNUMMER-TOEVOEGING'].astype(str) + ', '
+                                + df['POSTCODE'] + ' ' + df['PLAATSNAAM'])[resolved]
+df.loc[resolved, ['latitude', 'longitude']] = local.loc[resolved, ['latitude', 'longitude']]
+df.loc[resolved, 'geocoder'] = 'postcode index (' + local.loc[resolved, 'precision'] + ')'
 
-# Extract latitude and longitude from the location
-df['latitude'] = df['location'].apply(lambda loc: loc.latitude if loc else None)
-df['longitude'] = df['location'].apply(lambda loc: loc.longitude if loc else None)
+# Report the rows that could not be geocoded instead of silently leaving them empty
+unresolved = df['latitude'].isna()
+if unresolved.any():
+    print(f"Could not geocode {unresolved.sum()} of {len(df)} addresses:")
+    print(df.loc[unresolved, ['INSTELLINGSNAAM', 'STRAATNAAM', 'HUISNUMMER-TOEVOEGING', 'POSTCODE', 'PLAATSNAAM']])
 
 # Save the resulting dataframe to a CSV file
-df.to_csv(r"Data\Geodata_prepared.csv", index=False)
+with stage('save'):
+    df.to_csv(r"Data\Geodata_prepared.csv", index=False)
 
 # Print the dataframe to verify the results
 print(df)
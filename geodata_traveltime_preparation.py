@@ -1,64 +1,94 @@
-import geopandas as gpd
-import pandas as pd
-from shapely.geometry import Point
-import openrouteservice
-from shapely.geometry import shape
-import time
 import os
+import sys
+
+import pandas as pd
 
-# Load the point data
-df = pd.read_csv(r'Data\Geodata_prepared.csv')
+from isochrone_fetcher import IsochroneFetcher, DEFAULT_BASE_URL, is_retriable
+from isochrone_cache import IsochroneCache
+from institution_loader import load_institutions
+from isochrone_store import ISOCHRONES_PATH, StoreWriter
+from isochrone_writer import IsochroneWriter, institution_key
+from instrumentation import count, report_at_exit, stage
 
-# Create a 'geometry' column from 'latitude' and 'longitude'
-df['geometry'] = df.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
+# Write a timing report (stages, API calls and cache hits) to Data/reports when the script exits
+report_at_exit('geodata_traveltime_preparation')
 
-# Convert the DataFrame to a GeoDataFrame
-gdf = gpd.GeoDataFrame(df, geometry='geometry')
+# Load the point data in WGS 84, the CRS expected by OpenRouteService
+with stage('load'):
+    gdf = load_institutions(('SOORT HO', 'INSTELLINGSNAAM', 'latitude', 'longitude'), crs=4326)
 
 # Replace with your OpenRouteService API key
 api_key = os.getenv("OPENROUTE_API_KEY")
 
-# Initialize the OpenRouteService client
-client = openrouteservice.Client(key=api_key)
+# OpenRouteService endpoint; set OPENROUTE_BASE_URL to a stub_ors_server.py address to run offline
+base_url = os.getenv("OPENROUTE_BASE_URL", DEFAULT_BASE_URL)
 profile = 'driving-car'  # Mode of transport
 range_type = 'time'  # 'time' or 'distance'
 range = [600, 900, 1200, 1500, 1800, 2700]  # Time in seconds (10, 20, and 30 minutes)
 
-# Initialize an empty list to collect isochrone data
-iso_data_list = []
+# Institutions whose isochrones could not be fetched in the last run, with the error
+FAILURES_PATH = os.path.join('Data', 'isochrone_failures.csv')
+
+# Request budget and number of requests kept in flight
+requests_per_minute = 20
+max_workers = 4
 
-for index, row in gdf[gdf['longitude'].notna()].iterrows():
-    location = (row['longitude'], row['latitude'])
-    print(row['INSTELLINGSNAAM'])
-    # Request isochrones from the OpenRouteService API
-    isochrones = client.isochrones(
-        locations=[location],
-        profile=profile,
-        range_type=range_type,
-        range=range,
-        smoothing=10
-    )
+# Responses are cached on disk, so reruns only request locations or parameters that changed
+cache = IsochroneCache()
 
-    # Convert isochrones to GeoDataFrame
-    features = isochrones['features']
-    geometries = [shape(feature['geometry']) for feature in features]
-    isochrone_gdf = gpd.GeoDataFrame(geometry=geometries)
+# Initialize the concurrent isochrone fetcher
+fetcher = IsochroneFetcher(api_key, base_url=base_url, requests_per_minute=requests_per_minute,
+                           max_workers=max_workers, cache=cache)
 
-    # Add additional information to the GeoDataFrame
-    isochrone_gdf['latitude'] = row['latitude']
-    isochrone_gdf['longitude'] = row['longitude']
-    isochrone_gdf['INSTELLINGSNAAM'] = row['INSTELLINGSNAAM']
-    isochrone_gdf['SOORT HO'] = row['SOORT HO']
+# Isochrones are committed to disk per institution as they arrive; an interrupted run resumes after the
+# last institution it committed
+writer = IsochroneWriter({'profile': profile, 'range_type': range_type, 'range': range, 'smoothing': 10})
+keys = [institution_key(row) for _, row in gdf.iterrows()]
+pending = [job_index for job_index, key in enumerate(keys) if key not in writer.done]
+if len(pending) < len(keys):
+    print(f"Resuming: {len(keys) - len(pending)} institutions already written")
 
-    # Add the range information
-    isochrone_gdf['range'] = [feature['properties']['value'] for feature in features]
+# Build one isochrone request per institution with known coordinates
+jobs = [{
+    'locations': [(gdf.iloc[job_index]['longitude'], gdf.iloc[job_index]['latitude'])],
+    'profile': profile,
+    'range_type': range_type,
+    'range': range,
+    'smoothing': 10
+} for job_index in pending]
 
-    # Append the data to the list
-    iso_data_list.append(isochrone_gdf)
-    time.sleep(3)
+# Request the isochrones from the OpenRouteService API and write every response as soon as it arrives
+failures = []
+with stage('fetch'):
+    try:
+        for index, isochrones in fetcher.fetch_all(jobs):
+            row = gdf.iloc[pending[index]]
+            print(row['INSTELLINGSNAAM'])
+            if isochrones is None:
+                error = fetcher.errors[index]
+                failures.append({**row[['INSTELLINGSNAAM', 'SOORT HO', 'latitude', 'longitude']].to_dict(),
+                                 'error': str(error), 'retriable': is_retriable(error)})
+                continue
+            writer.append(keys[pending[index]], row, isochrones)
+    finally:
+        writer.close()
+print(f"Isochrone requests: {fetcher.request_count}, cache hits: {cache.hits}")
+count('isochrone_api_calls', fetcher.request_count)
+count('isochrone_cache_hits', cache.hits)
+count('isochrone_cache_misses', cache.misses)
+count('isochrone_failures', len(failures))
 
-# Concatenate all isochrone GeoDataFrames into a single DataFrame
-all_isochrones_gdf = pd.concat(iso_data_list, ignore_index=True)
+with stage('save'):
+    # Write the committed isochrones to a single GeoJSON file and the columnar isochrone store, from which
+    # the figures load only the rows they need, streaming one institution at a time. Institutions that
+    # failed are left out; the partial file and its manifest are then kept, so a rerun requests only those.
+    writer.finalize(ISOCHRONES_PATH, StoreWriter(profile), keep_partial=bool(failures))
 
-# Optionally, save the combined DataFrame to a file
-all_isochrones_gdf.to_file('Data\\all_isochrones.geojson', driver='GeoJSON')
+if failures:
+    pd.DataFrame(failures).to_csv(FAILURES_PATH, index=False)
+    permanent = sum(not failure['retriable'] for failure in failures)
+    print(f"{len(failures)} institutions failed ({permanent} with errors a retry will not fix) and are missing "
+          f"from the isochrones; see {FAILURES_PATH} and rerun to request them again")
+    sys.exit(1)
+elif os.path.exists(FAILURES_PATH):
+    os.remove(FAILURES_PATH)
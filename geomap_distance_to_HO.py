@@ -1,22 +1,15 @@
 import matplotlib.pyplot as plt
-import geopandas as gpd
-from shapely.geometry import Point
-import pandas as pd
 from matplotlib.patches import Patch
 from matplotlib.lines import Line2D
 import os
-
-# Read the shapefile of the Netherlands map
-mapdf = gpd.read_file("https://stacks.stanford.edu/file/druid:st293bj4601/data.zip")
-
-# Read the CSV file with geospatial data
-df = pd.read_csv(r'Data/Geodata_prepared.csv')
-
-# Create a 'geometry' column from 'latitude' and 'longitude'
-df['geometry'] = df.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
-
-# Convert the DataFrame to a GeoDataFrame
-gdf = gpd.GeoDataFrame(df, geometry='geometry')
+from basemap_store import load_layer
+from institution_loader import load_institutions
+from band_engine import distance_rings
+from distance_surface import LandGrid, distance_raster, distance_bands
+from matplotlib.colors import ListedColormap
+from geometry_lod import LevelOfDetail, pixel_size
+from instrumentation import report_at_exit, stage
+from render_cache import composite, map_raster
 
 # Specify the order of categories
 desired_order = ['wo', 'hbo']  # Replace with your actual category names
@@ -45,114 +38,143 @@ language_dicts = {
 def get_language_dict(language):
     return language_dicts.get(language.lower(), language_dicts['english'])
 
-# Example: Select English language
-selected_language = 'english'  # Change to 'dutch' for Dutch
-language_dict = get_language_dict(selected_language)
-
 # Specify category colors
 category_colors = {
     'hbo': {'edgecolor': '#D41159', 'facecolor': '#FF000000'},
     'wo': {'edgecolor': '#1AFF1A', 'facecolor': '#1AFF1A'}
 }
 
-# Ensure the CRS is set to WGS 84 (EPSG:4326) as this is typical for lat/long data
-gdf.set_crs(epsg=4326, inplace=True)
-
-# Transform to the same CRS
-mapdf = mapdf.to_crs(epsg=28992)
-gdf = gdf.to_crs(epsg=28992)
-
 # Define buffer distances
 buffer_distances = [10000, 15000, 20000]  # distances in meters
 colors = ['#2cba00', '#a3ff00', '#fff400', '#ffa700']  # sharp green, light green, yellow, red
 
-# Separate water bodies from other areas
-water_bodies = mapdf[mapdf['TYPE_1'] == 'Water body']
-other_areas = mapdf[mapdf['TYPE_1'] != 'Water body']
-
-# Calculate the aspect ratio of the Netherlands map
-bounds = mapdf.total_bounds  # [minx, miny, maxx, maxy]
-aspect_ratio = (bounds[3] - bounds[1]) / (bounds[2] - bounds[0])
-
-# Create a figure with two subplots side by side
-fig, axs = plt.subplots(1, 2, figsize=(12, 6 * aspect_ratio), sharey=True)
-
-for ax in axs:
-    ax.set_aspect('equal')
-    ax.set_axis_off()
-
-# Plot buffers and maps in each subplot for each category
-for ax, category in zip(axs, desired_order):
-    # Get subset of data for the category
-    subset = gdf[gdf['SOORT HO'] == category]
-
-    # Plot buffers with decreasing distance, clipping them to the map and excluding water bodies
-    previous_buffer = None
-    for i, distance in enumerate(buffer_distances):
-        current_buffer = subset.buffer(distance)
-        current_buffer_clipped = gpd.clip(gpd.GeoDataFrame(geometry=current_buffer, crs=gdf.crs), other_areas)
-        current_buffer_gdf = gpd.GeoDataFrame(geometry=[current_buffer_clipped.unary_union], crs=gdf.crs)
-        
-        if previous_buffer is not None:
-            current_ring = gpd.overlay(current_buffer_gdf, previous_buffer, how='difference')
-            current_ring = gpd.overlay(current_ring, water_bodies, how='difference')  # Exclude the water bodies
-            current_ring.plot(ax=ax, color=colors[i], alpha=1)
+# Band engine: 'buffer' for exact buffer rings, 'grid' for a nearest-institution distance surface
+distance_engine = 'buffer'
+grid_resolution = 250  # grid cell size in meters when using the 'grid' engine
+
+
+# Function to load the data and compute the distance bands once, so they can be reused for every language
+def load_data():
+    with stage('load'):
+        # Read the Netherlands map from the local base map store (already in EPSG:28992)
+        mapdf = load_layer('map')
+
+        # Load the institutions as projected points (EPSG:28992)
+        gdf = load_institutions(('SOORT HO',))
+
+    with stage('level_of_detail'):
+        data = {'mapdf': LevelOfDetail(mapdf), 'gdf': gdf}
+
+    with stage('bands'):
+        if distance_engine == 'grid':
+            # Distance bands derived from the nearest-institution distance surface
+            grid = LandGrid(grid_resolution)
+            data['grid_extent'] = grid.extent
+            data['bands'] = {category: distance_bands(distance_raster(gdf[gdf['SOORT HO'] == category], grid),
+                                                      buffer_distances)
+                             for category in desired_order}
         else:
-            current_buffer_gdf = gpd.overlay(current_buffer_gdf, water_bodies, how='difference')  # Exclude the water bodies
-            current_buffer_gdf.plot(ax=ax, color=colors[i], alpha=1)
-        
-        previous_buffer = current_buffer_gdf
-
-    # Plot areas outside the largest buffer
-    largest_buffer = subset.buffer(buffer_distances[-1])
-    largest_buffer_clipped = gpd.clip(gpd.GeoDataFrame(geometry=largest_buffer, crs=gdf.crs), other_areas)
-    largest_buffer_gdf = gpd.GeoDataFrame(geometry=[largest_buffer_clipped.unary_union], crs=gdf.crs)
-    outside_largest_buffer = gpd.overlay(other_areas, largest_buffer_gdf, how='difference')
-    outside_largest_buffer = gpd.overlay(outside_largest_buffer, water_bodies, how='difference')
-    outside_largest_buffer.plot(ax=ax, color=colors[-1], alpha=1)
-
-    # Plot the base map
-    mapdf.plot(ax=ax, color="#FF000000", edgecolor="black", linewidth=0.5)
-
-    # Plot points for the category
-    subset.plot(ax=ax, marker='o', label=category, markersize=30, 
-                edgecolor=category_colors[category]['edgecolor'], 
-                facecolor=category_colors[category]['facecolor'], zorder=3)
-
-# Create custom legend entries
-legend_elements = [
-    Patch(facecolor='#2cba00', edgecolor='#2cba00', label='<10 km', alpha=1),
-    Patch(facecolor='#a3ff00', edgecolor='#a3ff00', label='10-15 km', alpha=1),
-    Patch(facecolor='#fff400', edgecolor='#fff400', label='15-20 km', alpha=1),
-    Patch(facecolor='#ffa700', edgecolor='#ffa700', label='>20 km', alpha=1)
-]
-
-point_legend_elements = [
-    Line2D([0], [0], marker='o', color='w', label=language_dict['legend_names']['hbo'],
-           markerfacecolor=category_colors['hbo']['edgecolor'], markersize=10, markeredgewidth=1.8, markeredgecolor=category_colors['hbo']['edgecolor']),
-    Line2D([0], [0], marker='o', color='w', label=language_dict['legend_names']['wo'],
-           markerfacecolor='none', markersize=10, markeredgewidth=1.8, markeredgecolor=category_colors['wo']['edgecolor'])
-]
-
-# Add the custom legend to the first plot
-axs[0].legend(handles=legend_elements + point_legend_elements, loc='upper left', title=None)
-
-# Add watermark
-fig.text(0.98, 0.02, language_dict['watermark'], fontsize=8, color='gray',
-         ha='right', va='bottom', alpha=0.7)
-
-# Add a black edge to the entire figure
-fig.patch.set_edgecolor('black')
-fig.patch.set_linewidth(1)
-
-fig.tight_layout()
-
-# Ensure the output directory exists
-output_dir = 'Visuals'
-os.makedirs(output_dir, exist_ok=True)
-
-# Save the figure with higher resolution
-output_file_path = os.path.join(output_dir, language_dict['output_file'])
-fig.savefig(output_file_path, dpi=720)
-
-plt.show()
+            # Distance rings, clipped to the map and excluding water bodies; the last ring is the area outside
+            # the largest buffer
+            data['bands'] = {category: LevelOfDetail(distance_rings(gdf, category, buffer_distances),
+                                                     clip_to=data['mapdf'])
+                             for category in desired_order}
+    return data
+
+
+# Function to draw everything that is the same in every language: the maps of both categories
+def draw_map(fig, data, pixel):
+    gdf = data['gdf']
+    mapdf = data['mapdf'].at(pixel)
+
+    # Create two subplots side by side
+    axs = fig.subplots(1, 2, sharey=True)
+
+    for ax in axs:
+        ax.set_aspect('equal')
+        ax.set_axis_off()
+
+    # Plot buffers and maps in each subplot for each category
+    for ax, category in zip(axs, desired_order):
+        # Get subset of data for the category
+        subset = gdf[gdf['SOORT HO'] == category]
+
+        # Plot the distance bands
+        if distance_engine == 'grid':
+            ax.imshow(data['bands'][category], extent=data['grid_extent'], cmap=ListedColormap(colors),
+                      vmin=-0.5, vmax=len(colors) - 0.5, interpolation='nearest')
+        else:
+            data['bands'][category].at(pixel).plot(ax=ax, color=colors, alpha=1)
+
+        # Plot the base map
+        mapdf.plot(ax=ax, color="#FF000000", edgecolor="black", linewidth=0.5)
+
+        # Plot points for the category
+        subset.plot(ax=ax, marker='o', label=category, markersize=30, 
+                    edgecolor=category_colors[category]['edgecolor'], 
+                    facecolor=category_colors[category]['facecolor'], zorder=3)
+
+    # Add a black edge to the entire figure
+    fig.patch.set_edgecolor('black')
+    fig.patch.set_linewidth(1)
+
+    fig.tight_layout()
+
+
+# Function to draw and save the figure for one language
+def render(language, data, output_dir='Visuals', dpi=720):
+    language_dict = get_language_dict(language)
+
+    # Pick the level of detail of every layer for the size of one output pixel
+    pixel = pixel_size(data['mapdf'].total_bounds, 6, dpi)
+
+    with stage('plot'):
+        # Calculate the aspect ratio of the Netherlands map
+        bounds = data['mapdf'].at(pixel).total_bounds  # [minx, miny, maxx, maxy]
+        aspect_ratio = (bounds[3] - bounds[1]) / (bounds[2] - bounds[0])
+        figsize = (12, 6 * aspect_ratio)
+
+        # The maps are drawn once and reused for every language; only the legend and watermark are drawn here
+        with stage('map'):
+            image, positions = map_raster(data, figsize, bounds, dpi, lambda fig: draw_map(fig, data, pixel))
+        fig, axs = composite(image, positions, figsize)
+
+        # Create custom legend entries
+        legend_elements = [
+            Patch(facecolor='#2cba00', edgecolor='#2cba00', label='<10 km', alpha=1),
+            Patch(facecolor='#a3ff00', edgecolor='#a3ff00', label='10-15 km', alpha=1),
+            Patch(facecolor='#fff400', edgecolor='#fff400', label='15-20 km', alpha=1),
+            Patch(facecolor='#ffa700', edgecolor='#ffa700', label='>20 km', alpha=1)
+        ]
+
+        point_legend_elements = [
+            Line2D([0], [0], marker='o', color='w', label=language_dict['legend_names']['hbo'],
+                   markerfacecolor=category_colors['hbo']['edgecolor'], markersize=10, markeredgewidth=1.8, markeredgecolor=category_colors['hbo']['edgecolor']),
+            Line2D([0], [0], marker='o', color='w', label=language_dict['legend_names']['wo'],
+                   markerfacecolor='none', markersize=10, markeredgewidth=1.8, markeredgecolor=category_colors['wo']['edgecolor'])
+        ]
+
+        # Add the custom legend to the first plot
+        axs[0].legend(handles=legend_elements + point_legend_elements, loc='upper left', title=None)
+
+        # Add watermark
+        fig.text(0.98, 0.02, language_dict['watermark'], fontsize=8, color='gray',
+                 ha='right', va='bottom', alpha=0.7)
+
+    with stage('save'):
+        # Ensure the output directory exists
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Save the figure with higher resolution
+        output_file_path = os.path.join(output_dir, language_dict['output_file'])
+        fig.savefig(output_file_path, dpi=dpi)
+
+    return fig
+
+
+if __name__ == '__main__':
+    # Example: Select English language
+    selected_language = 'english'  # Change to 'dutch' for Dutch
+    report_at_exit('geomap_distance_to_HO')
+    render(selected_language, load_data())
+    plt.show()
@@ -1,28 +1,10 @@
 import matplotlib.pyplot as plt
-import geopandas as gpd
-from shapely.geometry import Point
-import pandas as pd
 from matplotlib.gridspec import GridSpec
 import os
-
-# Read the shapefile of the Netherlands map
-mapdf = gpd.read_file("https://stacks.stanford.edu/file/druid:st293bj4601/data.zip")
-
-# Read the CSV file with geospatial data
-df = pd.read_csv(r'Data/Geodata_prepared.csv')
-
-# Create a 'geometry' column from 'latitude' and 'longitude'
-df['geometry'] = df.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
-
-# Convert the DataFrame to a GeoDataFrame
-gdf = gpd.GeoDataFrame(df, geometry='geometry')
-
-# Ensure the CRS is set to WGS 84 (EPSG:4326)
-gdf.set_crs(epsg=4326, inplace=True)
-
-# Transform the coordinate reference system to match the map's CRS
-mapdf = mapdf.to_crs(epsg=28992)
-gdf = gdf.to_crs(epsg=28992)
+from basemap_store import load_layer
+from institution_loader import load_institutions
+from geometry_lod import LevelOfDetail, pixel_size
+from instrumentation import report_at_exit, stage
 
 # Specify the order of categories and their colors
 categories_subsets = [['wo'], ['hbo']]
@@ -55,61 +37,89 @@ language_dicts = {
 def get_language_dict(language):
     return language_dicts.get(language.lower(), language_dicts['english'])
 
-# Example: Select Dutch language
-selected_language = 'english'  # Change to 'english' for English
-language_dict = get_language_dict(selected_language)
-
-# Calculate the aspect ratio of the Netherlands map
-bounds = mapdf.total_bounds
-aspect_ratio = (bounds[3] - bounds[1]) / (bounds[2] - bounds[0])
-
-# Create a figure with a grid of subplots
-fig = plt.figure(figsize=(12, 6 * aspect_ratio))
-gs = GridSpec(2, 2, height_ratios=[1, 0.1], width_ratios=[1, 1])
-
-axes = [fig.add_subplot(gs[i, j]) for i in range(0, 2, 2) for j in range(2)]
-legend_axes = [fig.add_subplot(gs[i, j]) for i in range(1, 2, 2) for j in range(2)]
-
-# Plot each subset of categories in its respective subplot
-for ax, categories in zip(axes, categories_subsets):
-    mapdf.plot(ax=ax, color="white", edgecolor="black", zorder=1, linewidth=0.5)
-    for category in categories:
-        subset = gdf[gdf['SOORT HO'] == category]
-        subset.plot(ax=ax, marker='o', label=category, markersize=20, 
-                    edgecolor=category_colors[category]['edgecolor'], 
-                    facecolor=category_colors[category]['facecolor'], zorder=3)
-    ax.set_aspect('equal')
-    ax.set_axis_off()
-
-# Add legends to each corresponding subplot
-for ax, categories, legend_ax in zip(axes, categories_subsets, legend_axes):
-    handles = [plt.Line2D([0], [0], marker='o', color='w', label=language_dict['legend_names'][category], 
-                          markersize=10, 
-                          markerfacecolor=category_colors[category]['facecolor'],
-                          markeredgecolor=category_colors[category]['edgecolor']) 
-               for category in categories]
-    legend = legend_ax.legend(handles=handles, loc='center', ncol=1, markerscale=0.8, fontsize=14, frameon=False)
-    legend_ax.add_artist(legend)
-    legend_ax.set_axis_off()
-
-plt.subplots_adjust(wspace=0.05, hspace=0.1)  # Adjust the space between plots
-
-# Add a black border around the entire figure
-fig.patch.set_edgecolor('black')
-fig.patch.set_linewidth(1)
-
-plt.tight_layout()
-
-# Add watermark
-fig.text(0.98, 0.02, language_dict['watermark'], fontsize=8, color='gray',
-         ha='right', va='bottom', alpha=0.7)
-
-# Ensure the output directory exists
-output_dir = 'Visuals'
-os.makedirs(output_dir, exist_ok=True)
-
-# Save the figure with higher resolution
-output_file_path = os.path.join(output_dir, language_dict['output_file'])
-fig.savefig(output_file_path, dpi=720)
-
-plt.show()
+
+# Function to load the map and the institutions
+def load_data():
+    with stage('load'):
+        # Read the Netherlands map from the local base map store (already in EPSG:28992)
+        mapdf = load_layer('map')
+
+        # Load the institutions as projected points (EPSG:28992)
+        gdf = load_institutions(('SOORT HO',))
+
+    with stage('level_of_detail'):
+        return {'mapdf': LevelOfDetail(mapdf), 'gdf': gdf}
+
+
+# Function to draw and save the figure for one language
+def render(language, data, output_dir='Visuals', dpi=720):
+    language_dict = get_language_dict(language)
+    gdf = data['gdf']
+
+    # Pick the level of detail of every layer for the size of one output pixel
+    pixel = pixel_size(data['mapdf'].total_bounds, 6, dpi)
+    mapdf = data['mapdf'].at(pixel)
+
+    with stage('plot'):
+        # Calculate the aspect ratio of the Netherlands map
+        bounds = mapdf.total_bounds
+        aspect_ratio = (bounds[3] - bounds[1]) / (bounds[2] - bounds[0])
+
+        # Create a figure with a grid of subplots
+        fig = plt.figure(figsize=(12, 6 * aspect_ratio))
+        gs = GridSpec(2, 2, height_ratios=[1, 0.1], width_ratios=[1, 1])
+
+        axes = [fig.add_subplot(gs[i, j]) for i in range(0, 2, 2) for j in range(2)]
+        legend_axes = [fig.add_subplot(gs[i, j]) for i in range(1, 2, 2) for j in range(2)]
+
+        # Plot each subset of categories in its respective subplot
+        for ax, categories in zip(axes, categories_subsets):
+            mapdf.plot(ax=ax, color="white", edgecolor="black", zorder=1, linewidth=0.5)
+            for category in categories:
+                subset = gdf[gdf['SOORT HO'] == category]
+                subset.plot(ax=ax, marker='o', label=category, markersize=20, 
+                            edgecolor=category_colors[category]['edgecolor'], 
+                            facecolor=category_colors[category]['facecolor'], zorder=3)
+            ax.set_aspect('equal')
+            ax.set_axis_off()
+
+        # Add legends to each corresponding subplot
+        for ax, categories, legend_ax in zip(axes, categories_subsets, legend_axes):
+            handles = [plt.Line2D([0], [0], marker='o', color='w', label=language_dict['legend_names'][category], 
+                                  markersize=10, 
+                                  markerfacecolor=category_colors[category]['facecolor'],
+                                  markeredgecolor=category_colors[category]['edgecolor']) 
+                       for category in categories]
+            legend = legend_ax.legend(handles=handles, loc='center', ncol=1, markerscale=0.8, fontsize=14, frameon=False)
+            legend_ax.add_artist(legend)
+            legend_ax.set_axis_off()
+
+        fig.subplots_adjust(wspace=0.05, hspace=0.1)  # Adjust the space between plots
+
+        # Add a black border around the entire figure
+        fig.patch.set_edgecolor('black')
+        fig.patch.set_linewidth(1)
+
+        fig.tight_layout()
+
+        # Add watermark
+        fig.text(0.98, 0.02, language_dict['watermark'], fontsize=8, color='gray',
+                 ha='right', va='bottom', alpha=0.7)
+
+    with stage('save'):
+        # Ensure the output directory exists
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Save the figure with higher resolution
+        output_file_path = os.path.join(output_dir, language_dict['output_file'])
+        fig.savefig(output_file_path, dpi=dpi)
+
+    return fig
+
+
+if __name__ == '__main__':
+    # Example: Select Dutch language
+    selected_language = 'english'  # Change to 'english' for English
+    report_at_exit('geomap_distribution_HO_multimap')
+    render(selected_language, load_data())
+    plt.show()
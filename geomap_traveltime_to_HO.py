@@ -1,14 +1,15 @@
-import geopandas as gpd
-import pandas as pd
-from shapely.geometry import Point
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
 from matplotlib.lines import Line2D
 import os
 from matplotlib.gridspec import GridSpec
-
-# Read the shapefile of the Netherlands map
-mapdf = gpd.read_file("https://stacks.stanford.edu/file/druid:st293bj4601/data.zip")
+from basemap_store import load_layer
+from institution_loader import load_institutions
+from isochrone_store import load_isochrones
+from band_engine import traveltime_rings
+from geometry_lod import LevelOfDetail, pixel_size
+from instrumentation import report_at_exit, stage
+from render_cache import composite, map_raster
 
 # Define language dictionaries
 language_dicts = {
@@ -34,39 +35,10 @@ language_dicts = {
 def get_language_dict(language):
     return language_dicts.get(language.lower(), language_dicts['english'])
 
-# Example: Select Dutch language
-selected_language = 'english'  # Change to 'dutch' for Dutch
-language_dict = get_language_dict(selected_language)
-
-# Read the CSV file with geospatial data
-df = pd.read_csv(r'Data/Geodata_prepared.csv')
-
-# Create a 'geometry' column from 'latitude' and 'longitude'
-df['geometry'] = df.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
-
-# Convert the DataFrame to a GeoDataFrame
-gdf = gpd.GeoDataFrame(df, geometry='geometry')
-
-# Load the travel time polygons from GeoJSON
-travel_time_gdf = gpd.read_file(r'Data/all_isochrones.geojson')
-
-# Ensure the CRS is set to WGS 84 (EPSG:4326) as this is typical for lat/long data
-gdf.set_crs(epsg=4326, inplace=True)
-travel_time_gdf.set_crs(epsg=4326, inplace=True)
-
-# Transform to the same CRS
-mapdf = mapdf.to_crs(epsg=28992)
-gdf = gdf.to_crs(epsg=28992)
-travel_time_gdf = travel_time_gdf.to_crs(epsg=28992)
-
 # Define travel time ranges and colors
 travel_time_ranges = [600, 900, 1200, 1500, 1800, 2700]  # travel times in seconds
 colors = ['#B5EB84', '#E7F7B5', '#FFFF8C', '#FFE763', '#FFAE4A', '#FF8239', '#CE0000']
 
-# Separate water bodies from other areas
-water_bodies = mapdf[mapdf['TYPE_1'] == 'Water body']
-other_areas = mapdf[mapdf['TYPE_1'] != 'Water body']
-
 # Specify the order of categories and their colors
 desired_order = ['wo', 'hbo']
 category_colors = {
@@ -74,46 +46,88 @@ category_colors = {
     'wo': {'edgecolor': '#FF4191', 'facecolor': '#FF4191'}
 }
 
-# Define the aspect ratio
-aspect_ratio = 1.5
-fig = plt.figure(figsize=(12, 6 * aspect_ratio))
-gs = GridSpec(1, 2, height_ratios=[1], width_ratios=[1, 1])
-
-# Plot the maps
-axes = [fig.add_subplot(gs[0, j]) for j in range(2)]
-
-for idx, (ax, category) in enumerate(zip(axes, desired_order)):
-    range_subset = travel_time_gdf[travel_time_gdf['SOORT HO'] == category]
-    gdf_subset = gdf[gdf['SOORT HO'] == category]
-    other_areas.plot(ax=ax, color="white", edgecolor="black")
-    ax.set_aspect('equal')
-
-    # Plot buffers with decreasing travel time, clipping them to the map and excluding water bodies
-    previous_buffer = None
-    for i, travel_time in enumerate(travel_time_ranges):
-        current_buffer = range_subset[range_subset['range'] == travel_time]['geometry']
-        current_buffer_clipped = gpd.clip(gpd.GeoDataFrame(geometry=current_buffer, crs=gdf.crs), other_areas)
-        current_buffer_gdf = gpd.GeoDataFrame(geometry=[current_buffer_clipped.unary_union], crs=gdf.crs)
-
-        if previous_buffer is not None:
-            current_ring = gpd.overlay(current_buffer_gdf, previous_buffer, how='difference')
-            current_ring.plot(ax=ax, color=colors[i], alpha=1)
-        else:
-            current_buffer_gdf = gpd.overlay(current_buffer_gdf, water_bodies, how='difference')
-            current_buffer_gdf.plot(ax=ax, color=colors[i], alpha=1)
-
-        previous_buffer = current_buffer_gdf
-
-    outside_buffer = gpd.overlay(gpd.GeoDataFrame(geometry=[other_areas.unary_union], crs=gdf.crs), previous_buffer, how='difference')
-    outside_buffer.plot(ax=ax, color='red', alpha=1, zorder=2)
-
-    # Plot the rest of the map
-    mapdf.plot(ax=ax, color="#FF000000", edgecolor="black", linewidth=0.5)
-    gdf_subset.plot(ax=ax, marker='o', label=language_dict['legend_names'].get(category, category), markersize=30,
-                    edgecolor=category_colors[category]['edgecolor'],
-                    facecolor=category_colors[category]['facecolor'], zorder=3)
-
-    if idx == 0:  # Only add the legend to the left subplot
+
+# Function to load the data and compute the travel time rings once, so they can be reused for every language
+def load_data():
+    with stage('load'):
+        # Read the Netherlands map from the local base map store (already in EPSG:28992)
+        mapdf = load_layer('map')
+
+        # Load the precomputed other areas
+        other_areas = load_layer('land')
+
+        # Load the institutions as projected points (EPSG:28992)
+        gdf = load_institutions(('SOORT HO',))
+
+        # Load the travel time polygons of the plotted categories and ranges from the isochrone store
+        # (already in EPSG:28992)
+        travel_time_gdf = load_isochrones(tuple(desired_order), tuple(travel_time_ranges))
+
+    with stage('level_of_detail'):
+        mapdf = LevelOfDetail(mapdf)
+
+    with stage('bands'):
+        # Travel time rings, clipped to the map and excluding water bodies; the last ring is the area
+        # outside the largest travel time. Every level is cut to the map at the same level of detail.
+        rings = {category: LevelOfDetail(traveltime_rings(travel_time_gdf, category, travel_time_ranges),
+                                         clip_to=mapdf)
+                 for category in desired_order}
+
+    with stage('level_of_detail'):
+        return {'mapdf': mapdf, 'other_areas': LevelOfDetail(other_areas), 'gdf': gdf, 'rings': rings}
+
+
+# Function to draw everything that is the same in every language: the maps of both categories
+def draw_map(fig, data, pixel):
+    gdf = data['gdf']
+    mapdf = data['mapdf'].at(pixel)
+    other_areas = data['other_areas'].at(pixel)
+    gs = GridSpec(1, 2, height_ratios=[1], width_ratios=[1, 1])
+
+    # Plot the maps
+    axes = [fig.add_subplot(gs[0, j]) for j in range(2)]
+
+    for ax, category in zip(axes, desired_order):
+        gdf_subset = gdf[gdf['SOORT HO'] == category]
+        other_areas.plot(ax=ax, color="white", edgecolor="black")
+        ax.set_aspect('equal')
+
+        # Plot the travel time rings
+        rings = data['rings'][category].at(pixel)
+        rings.iloc[:-1].plot(ax=ax, color=colors[:len(travel_time_ranges)], alpha=1)
+
+        # Plot the area outside the largest travel time
+        rings.iloc[-1:].plot(ax=ax, color='red', alpha=1, zorder=2)
+
+        # Plot the rest of the map
+        mapdf.plot(ax=ax, color="#FF000000", edgecolor="black", linewidth=0.5)
+        gdf_subset.plot(ax=ax, marker='o', label=category, markersize=30,
+                        edgecolor=category_colors[category]['edgecolor'],
+                        facecolor=category_colors[category]['facecolor'], zorder=3)
+
+        ax.set_axis_off()
+        fig.tight_layout()
+
+
+# Function to draw and save the figure for one language
+def render(language, data, output_dir='Visuals', dpi=720):
+    language_dict = get_language_dict(language)
+
+    # Pick the level of detail of every layer for the size of one output pixel
+    pixel = pixel_size(data['mapdf'].total_bounds, 6, dpi)
+
+    with stage('plot'):
+        # Define the aspect ratio
+        aspect_ratio = 1.5
+        figsize = (12, 6 * aspect_ratio)
+
+        # The maps are drawn once and reused for every language; only the legend and watermark are drawn here
+        with stage('map'):
+            image, positions = map_raster(data, figsize, data['mapdf'].at(pixel).total_bounds, dpi,
+                                          lambda fig: draw_map(fig, data, pixel))
+        fig, axes = composite(image, positions, figsize)
+
+        # Only add the legend to the left subplot
         legend_elements = [
             Patch(facecolor='#B5EB84', edgecolor='#B5EB84', label='<10 min', alpha=1),
             Patch(facecolor='#E7F7B5', edgecolor='#E7F7B5', label='10-15 min', alpha=1),
@@ -131,21 +145,26 @@ for idx, (ax, category) in enumerate(zip(axes, desired_order)):
                    markerfacecolor=category_colors['wo']['facecolor'], markersize=10, markeredgewidth=1.8, markeredgecolor=category_colors['wo']['edgecolor'])
         ]
 
-        ax.legend(handles=legend_elements + point_legend_elements, title='Travel Time in Minutes', loc='upper left')
+        axes[0].legend(handles=legend_elements + point_legend_elements, title='Travel Time in Minutes', loc='upper left')
+
+        # Add watermark
+        fig.text(0.96, 0.04, language_dict['watermark'], fontsize=8, color='gray',
+                 ha='right', va='bottom', alpha=0.7)
 
-    ax.set_axis_off()
-    fig.tight_layout()
+    with stage('save'):
+        # Ensure the output directory exists
+        os.makedirs(output_dir, exist_ok=True)
 
-# Add watermark
-fig.text(0.96, 0.04, language_dict['watermark'], fontsize=8, color='gray',
-         ha='right', va='bottom', alpha=0.7)
+        # Save the figure with higher resolution
+        output_file_path = os.path.join(output_dir, language_dict['output_file'])
+        fig.savefig(output_file_path, dpi=dpi)
 
-# Ensure the output directory exists
-output_dir = 'Visuals'
-os.makedirs(output_dir, exist_ok=True)
+    return fig
 
-# Save the figure with higher resolution
-output_file_path = os.path.join(output_dir, language_dict['output_file'])
-fig.savefig(output_file_path, dpi=720)
 
-plt.show()
+if __name__ == '__main__':
+    # Example: Select Dutch language
+    selected_language = 'english'  # Change to 'dutch' for Dutch
+    report_at_exit('geomap_traveltime_to_HO')
+    render(selected_language, load_data())
+    plt.show()
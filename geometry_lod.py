@@ -0,0 +1,70 @@
+import shapely
+
+from band_engine import polygonal_parts
+from basemap_store import WATER_TYPE
+
+# Simplification tolerances (in meters, EPSG:28992) that are precomputed for every layer
+TOLERANCES = [10, 25, 50, 100, 250, 500, 1000]
+
+
+# Function to compute the size of one output pixel in map units for a map drawn at a given width and dpi
+def pixel_size(bounds, width_inches, dpi):
+    return (bounds[2] - bounds[0]) / (width_inches * dpi)
+
+
+# Function to simplify a layer as a coverage, so edges shared by neighbouring polygons stay identical.
+# Only polygons can be simplified as a coverage, so lines and points left by overlays are dropped first.
+def simplify_coverage(gdf, tolerance):
+    simplified = gdf.copy()
+    geometries = polygonal_parts(simplified.geometry.values)
+    polygonal = ~shapely.is_empty(geometries)
+    geometries[polygonal] = shapely.coverage_simplify(geometries[polygonal], tolerance)
+    simplified[simplified.geometry.name] = geometries
+    return simplified
+
+
+# Function to cut the polygons of a layer to a mask, keeping only polygons
+def clip_layer(gdf, mask):
+    clipped = gdf.copy()
+    clipped[clipped.geometry.name] = polygonal_parts(shapely.intersection(clipped.geometry.values, mask))
+    return clipped
+
+
+# Precomputed simplified versions of a polygon layer, from which the coarsest version that is still
+# visually lossless at the output resolution is picked. A layer drawn over a base map (clip_to, the level of
+# detail of the map layer) is cut at every level to the land of the base map simplified with the same
+# tolerance, so its outer edges stay on the simplified coastline and borders instead of drifting from them.
+class LevelOfDetail:
+    def __init__(self, gdf, tolerances=TOLERANCES, clip_to=None):
+        self.full = gdf
+        self.levels = []
+        self.lands = {}
+        for tolerance in sorted(tolerances):
+            simplified = simplify_coverage(gdf, tolerance)
+            if clip_to is not None:
+                simplified = clip_layer(simplified, clip_to.land(tolerance))
+            self.levels.append((tolerance, simplified))
+
+    @property
+    def total_bounds(self):
+        return self.full.total_bounds
+
+    # Function to return the land of a base map layer simplified with a tolerance: its areas without the
+    # water bodies, as the land mask of the bands is built. Computed once per tolerance.
+    def land(self, tolerance):
+        if tolerance not in self.lands:
+            layer = dict(self.levels).get(tolerance)
+            layer = simplify_coverage(self.full, tolerance) if layer is None else layer
+            water = (layer['TYPE_1'] == WATER_TYPE).to_numpy()
+            self.lands[tolerance] = shapely.difference(shapely.union_all(layer.geometry.values[~water]),
+                                                       shapely.union_all(layer.geometry.values[water]))
+        return self.lands[tolerance]
+
+    # Function to return the coarsest version whose tolerance stays below half a pixel
+    def at(self, pixel):
+        selected = self.full
+        for tolerance, simplified in self.levels:
+            if tolerance > pixel / 2:
+                break
+            selected = simplified
+        return selected
@@ -0,0 +1,53 @@
+import hashlib
+import os
+from functools import lru_cache
+
+import geopandas as gpd
+import pandas as pd
+
+# Prepared institution data written by geodata_preparation.py
+PREPARED_PATH = os.path.join('Data', 'Geodata_prepared.csv')
+
+# Directory for the projected institution layers shared between scripts
+CACHE_DIR = os.path.join('Data', 'cache')
+
+
+# Function to build the cache file name for a column selection and CRS of one version of the source file,
+# identified by its path and modification time
+def cache_path(columns, crs, path, mtime, cache_dir=CACHE_DIR):
+    key = '|'.join(sorted(columns) + [os.path.abspath(path), repr(mtime)])
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f'institutions_{crs}_{digest}.parquet')
+
+
+# Function to load the institutions as projected points, reading only the requested columns, in the requested
+# order. The result is cached on disk and in memory, and rebuilt when the prepared CSV changes. Every caller
+# gets its own copy, so changing it leaves the cached frame intact.
+def load_institutions(columns=('SOORT HO',), crs=28992, path=PREPARED_PATH, cache_dir=CACHE_DIR):
+    gdf = cached_institutions(tuple(sorted(columns)), crs, path, os.path.getmtime(path), cache_dir)
+    return gdf[list(columns) + ['geometry']].copy()
+
+
+# Function to load the institutions once per process and version of the source file; the frame is shared,
+# use load_institutions instead
+@lru_cache(maxsize=None)
+def cached_institutions(columns, crs, path, mtime, cache_dir):
+    columns = list(columns)
+    cached = cache_path(columns, crs, path, mtime, cache_dir)
+    if os.path.exists(cached):
+        return gpd.read_parquet(cached)
+
+    # Read only the needed columns and drop institutions that could not be geocoded
+    usecols = list(dict.fromkeys(columns + ['longitude', 'latitude']))
+    df = pd.read_csv(path, usecols=usecols)
+    df = df.dropna(subset=['longitude', 'latitude']).reset_index(drop=True)
+    if 'SOORT HO' in df.columns:
+        df['SOORT HO'] = df['SOORT HO'].astype('category')
+
+    # Build the points in one vectorized pass and project them
+    geometry = gpd.points_from_xy(df['longitude'], df['latitude'], crs='EPSG:4326')
+    gdf = gpd.GeoDataFrame(df[columns], geometry=geometry).to_crs(epsg=crs)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    gdf.to_parquet(cached)
+    return gdf
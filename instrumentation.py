@@ -0,0 +1,218 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Directory the run reports are written to
+REPORTS_DIR = os.path.join('Data', 'reports')
+
+# Name of a stage to attach the sampling profiler to, e.g. PROFILE_STAGE=overlay
+PROFILE_STAGE = os.getenv('PROFILE_STAGE')
+
+# Totals per stage path (e.g. 'render/save'): calls, wall time, CPU time and peak memory
+_stages = {}
+_counters = Counter()
+_stack = threading.local()
+_started = time.perf_counter()
+
+
+# Function to read the resident memory of this process in MB, or None if it cannot be determined
+def current_rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Background thread that samples a value every interval until it is stopped
+class Sampler(threading.Thread):
+    def __init__(self, sample, interval):
+        super().__init__(daemon=True)
+        self.sample = sample
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# Process-wide sampler of the resident memory, shared by all open stages. The outermost stage starts it
+# and stops it again; every open stage registers a peak that each sample raises. In a forked worker the
+# parent's sampler thread does not exist, so the first stage there starts its own.
+class MemorySampler:
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.peaks = {}
+        self.sampler = None
+        self.pid = None
+
+    # Function to register a stage; returns its peak, a one-item list
+    def open(self):
+        peak = [current_rss_mb()]
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid, self.peaks, self.sampler = os.getpid(), {}, None
+            self.peaks[id(peak)] = peak
+            if self.sampler is None:
+                self.sampler = Sampler(self.sample, self.interval)
+                self.sampler.start()
+        return peak
+
+    def sample(self):
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        with self.lock:
+            for peak in self.peaks.values():
+                if peak[0] is None or rss > peak[0]:
+                    peak[0] = rss
+
+    # Function to unregister a stage after a last sample; returns its peak in MB
+    def close(self, peak):
+        rss = current_rss_mb()
+        sampler = None
+        with self.lock:
+            self.peaks.pop(id(peak), None)
+            if rss is not None and (peak[0] is None or rss > peak[0]):
+                peak[0] = rss
+            if not self.peaks and self.pid == os.getpid():
+                sampler, self.sampler = self.sampler, None
+        if sampler is not None:
+            sampler.stop()
+        return peak[0]
+
+
+_memory = MemorySampler()
+
+
+# Sampling profiler: records the call stack of one thread at a fixed interval
+class StackProfiler:
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.sampler = Sampler(self.sample, interval)
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+
+# Context manager that records wall time, CPU time and peak memory of a named stage. Stages can be
+# nested and repeated; repeated stages are summed.
+@contextmanager
+def stage(name):
+    stack = getattr(_stack, 'names', [])
+    _stack.names = stack + [name]
+    path = '/'.join(_stack.names)
+
+    peak = _memory.open()
+    profiler = None
+    if PROFILE_STAGE == name:
+        profiler = StackProfiler(threading.get_ident())
+        profiler.sampler.start()
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        peak_rss = _memory.close(peak)
+        _stack.names = stack
+
+        record = _stages.setdefault(path, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': None})
+        record['calls'] += 1
+        record['wall_seconds'] += wall
+        record['cpu_seconds'] += cpu
+        if peak_rss is not None:
+            record['peak_rss_mb'] = max(record['peak_rss_mb'] or 0, peak_rss)
+        if profiler is not None:
+            profiler.sampler.stop()
+            record.setdefault('profile', Counter()).update(profiler.stacks)
+
+
+# Function to increase a counter, e.g. API calls or cache hits
+def count(name, n=1):
+    _counters[name] += n
+
+
+# Function to return and reset the recorded stages and counters, e.g. to send them from a worker process
+def drain():
+    records = {'stages': {path: dict(record) for path, record in _stages.items()}, 'counters': dict(_counters)}
+    _stages.clear()
+    _counters.clear()
+    return records
+
+
+# Function to merge records drained from another process into this one
+def merge(records):
+    for path, other in records['stages'].items():
+        record = _stages.setdefault(path, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': None})
+        record['calls'] += other['calls']
+        record['wall_seconds'] += other['wall_seconds']
+        record['cpu_seconds'] += other['cpu_seconds']
+        if other['peak_rss_mb'] is not None:
+            record['peak_rss_mb'] = max(record['peak_rss_mb'] or 0, other['peak_rss_mb'])
+        if 'profile' in other:
+            record.setdefault('profile', Counter()).update(other['profile'])
+    _counters.update(records['counters'])
+
+
+# Function to write the JSON report of this run; profiles are also written as collapsed stacks
+# that flame graph tools can read
+def write_report(script, reports_dir=REPORTS_DIR):
+    os.makedirs(reports_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(reports_dir, f'{script}_{timestamp}.json')
+
+    stages = {}
+    for stage_path, record in _stages.items():
+        stages[stage_path] = {key: value for key, value in record.items() if key != 'profile'}
+        if 'profile' in record:
+            profile_path = os.path.join(reports_dir, f'{script}_{timestamp}_{stage_path.replace("/", "-")}.folded')
+            with open(profile_path, 'w', encoding='utf-8') as f:
+                for stack, samples in record['profile'].most_common():
+                    f.write(f'{stack} {samples}\n')
+            stages[stage_path]['profile'] = profile_path
+
+    report = {
+        'script': script,
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'wall_seconds': time.perf_counter() - _started,
+        'cpu_seconds': time.process_time(),
+        'peak_rss_mb': current_rss_mb(),
+        'stages': stages,
+        'counters': dict(_counters)
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Timing report written to {path}")
+    return path
+
+
+# Function to write the report automatically when the script exits
+def report_at_exit(script):
+    atexit.register(write_report, script)
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Default location of the isochrone response cache
+CACHE_DIR = os.path.join('Data', 'cache', 'isochrones')
+
+
+# Content-addressed, size-bounded cache of isochrone API responses.
+# Entries are keyed by the rounded location and every request parameter that changes the answer,
+# and the least recently used entries are evicted once the entry or byte limit is exceeded.
+class IsochroneCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=10000, max_bytes=512 * 1024 ** 2, precision=5):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Index of cached entries: key -> [last used, size in bytes]
+        self.index = {}
+        for name in os.listdir(cache_dir):
+            if name.endswith('.json'):
+                stat = os.stat(os.path.join(cache_dir, name))
+                self.index[name[:-5]] = [stat.st_mtime, stat.st_size]
+
+    # Function to compute the cache key of an isochrone request
+    def key(self, job):
+        locations = [[round(float(lon), self.precision), round(float(lat), self.precision)]
+                     for lon, lat in job['locations']]
+        parameters = {
+            'locations': locations,
+            'profile': job.get('profile', 'driving-car'),
+            'range_type': job.get('range_type', 'time'),
+            'range': [float(value) for value in job['range']],
+            'smoothing': job.get('smoothing')
+        }
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    # Function to return the cached response for a request, or None on a cache miss
+    def get(self, job):
+        key = self.key(job)
+        with self.lock:
+            if key not in self.index:
+                self.misses += 1
+                return None
+            self.hits += 1
+            now = time.time()
+            self.index[key][0] = now
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                response = json.load(f)
+        except (OSError, ValueError):
+            with self.lock:
+                self.index.pop(key, None)
+            return None
+        os.utime(self.path(key), (now, now))
+        return response
+
+    # Function to store a response and evict old entries when the cache grows past its limits
+    def put(self, job, response):
+        key = self.key(job)
+        data = json.dumps(response).encode('utf-8')
+        tmp_path = self.path(key) + f'.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+        with self.lock:
+            self.index[key] = [time.time(), len(data)]
+            self.evict()
+
+    def evict(self):
+        total_bytes = sum(size for _, size in self.index.values())
+        if len(self.index) <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        for key, (_, size) in sorted(self.index.items(), key=lambda item: item[1][0]):
+            if len(self.index) <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            del self.index[key]
+            total_bytes -= size
@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+# Default OpenRouteService endpoint; point this to stub_ors_server.py to work offline
+DEFAULT_BASE_URL = 'https://api.openrouteservice.org'
+
+# HTTP statuses that are worth retrying
+RETRIABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Token bucket that spreads requests over a requests-per-minute budget, shared by all worker threads
+class TokenBucket:
+    def __init__(self, requests_per_minute, burst=1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Error for a request the API answered with an error status
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+# Function to decide whether a failed request should be retried
+def is_retriable(error):
+    if isinstance(error, RequestError):
+        return error.status in RETRIABLE_STATUSES
+    return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+# Fetcher that keeps several isochrone requests in flight within a shared rate budget
+class IsochroneFetcher:
+    name = 'isochrone'
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, requests_per_minute=20, max_workers=4,
+                 max_retries=5, backoff_seconds=2.0, timeout=60, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.bucket = TokenBucket(requests_per_minute, burst=max_workers)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.cache = cache
+        self.local = threading.local()
+        self.request_count = 0
+        self.count_lock = threading.Lock()
+        self.errors = {}
+
+    # Each worker thread gets its own session, because a requests session is not meant to be shared
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+            self.local.session.headers.update({'Authorization': self.api_key or '',
+                                               'Content-Type': 'application/json; charset=utf-8'})
+        return self.local.session
+
+    # Function to send one POST to the API and return the decoded response. Requests are sent here and not
+    # through the openrouteservice client, which retries 503 responses by itself, outside the rate budget.
+    def post(self, path, body):
+        response = self.session().post(self.base_url.rstrip('/') + path, json=body, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RequestError(response.status_code, response.text[:200])
+        return response.json()
+
+    # Function to send one request; subclasses override this to call another endpoint
+    def request(self, job):
+        return self.post(f"/v2/isochrones/{job['profile']}/geojson", job)
+
+    # Function to describe a job in error messages
+    def describe(self, job):
+        return job['locations']
+
+    # Function to request one job, retrying with exponential backoff on 429/5xx responses
+    def fetch(self, job):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with self.count_lock:
+                self.request_count += 1
+            try:
+                return self.request(job)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retriable(e):
+                    raise
+                delay = self.backoff_seconds * 2 ** attempt * (0.5 + random.random())
+                print(f"Retrying {self.name} request in {delay:.1f}s after error: {e}")
+                time.sleep(delay)
+
+    # Generator yielding (job index, response) in completion order; failed jobs yield None and keep their
+    # error in self.errors by job index. Cached responses are yielded first, and only cache misses are sent
+    # to the API.
+    def fetch_all(self, jobs):
+        self.errors = {}
+        pending = []
+        for index, job in enumerate(jobs):
+            response = self.cache.get(job) if self.cache is not None else None
+            if response is not None:
+                yield index, response
+            else:
+                pending.append(index)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch, jobs[index]): index for index in pending}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    response = future.result()
+                except Exception as e:
+                    print(f"Error fetching {self.name} for {self.describe(jobs[index])}: {e}")
+                    self.errors[index] = e
+                    yield index, None
+                    continue
+                if self.cache is not None:
+                    self.cache.put(jobs[index], response)
+                yield index, response
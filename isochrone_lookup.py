@@ -0,0 +1,86 @@
+import argparse
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from isochrone_store import load_isochrones
+
+
+# Spatial index over the isochrone polygons that assigns travel time bands to origin points in bulk
+class IsochroneIndex:
+    def __init__(self, isochrones):
+        isochrones = isochrones.to_crs(epsg=4326).reset_index(drop=True)
+        self.tree = shapely.STRtree(isochrones.geometry.values)
+        self.ranges = isochrones['range'].to_numpy(dtype=float)
+        self.institutions = isochrones['INSTELLINGSNAAM'].to_numpy()
+        self.categories = sorted(isochrones['SOORT HO'].unique())
+        self.category_codes = pd.Categorical(isochrones['SOORT HO'], categories=self.categories).codes
+        self.centres = isochrones[['longitude', 'latitude']].to_numpy(dtype=float)
+
+    # Function to look up lon/lat arrays; returns per category the minimum range reached and the
+    # institution that reaches the point within that range (ties go to the closest institution)
+    def lookup(self, longitudes, latitudes):
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+        point_index, polygon_index = self.tree.query(shapely.points(longitudes, latitudes), predicate='intersects')
+
+        # Approximate distance from each point to the institution of each matching polygon, for tie breaks
+        dx = (longitudes[point_index] - self.centres[polygon_index, 0]) * np.cos(np.radians(latitudes[point_index]))
+        dy = latitudes[point_index] - self.centres[polygon_index, 1]
+        distance = dx ** 2 + dy ** 2
+
+        result = {}
+        for code, category in enumerate(self.categories):
+            selected = self.category_codes[polygon_index] == code
+            points, polygons = point_index[selected], polygon_index[selected]
+
+            # Sort the matches by point, then range, then distance, and keep the first match of every point
+            order = np.lexsort((distance[selected], self.ranges[polygons], points))
+            points, polygons = points[order], polygons[order]
+            first = np.ones(len(points), dtype=bool)
+            first[1:] = points[1:] != points[:-1]
+
+            ranges = np.full(len(longitudes), np.nan)
+            institutions = np.full(len(longitudes), None, dtype=object)
+            ranges[points[first]] = self.ranges[polygons[first]]
+            institutions[points[first]] = self.institutions[polygons[first]]
+            result[f'range {category}'] = ranges
+            result[f'INSTELLINGSNAAM {category}'] = institutions
+        return pd.DataFrame(result)
+
+
+# Function to stream origin points from a CSV file in chunks and write the lookup results next to them
+def lookup_file(input_path, output_path, index, lon_column='longitude', lat_column='latitude',
+                chunksize=500000):
+    total = 0
+    start = time.perf_counter()
+    for chunk_number, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize)):
+        result = index.lookup(chunk[lon_column], chunk[lat_column])
+        result.index = chunk.index
+        pd.concat([chunk, result], axis=1).to_csv(output_path, mode='w' if chunk_number == 0 else 'a',
+                                                  header=chunk_number == 0, index=False)
+        total += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"{total} points processed ({total / elapsed * 60:,.0f} points per minute)")
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Assign travel time bands to origin points using the isochrones.')
+    parser.add_argument('input', help='CSV file with origin coordinates')
+    parser.add_argument('output', help='CSV file to write the results to')
+    parser.add_argument('--isochrones', help='Isochrone file to use instead of the isochrone store')
+    parser.add_argument('--lon-column', default='longitude')
+    parser.add_argument('--lat-column', default='latitude')
+    parser.add_argument('--chunksize', type=int, default=500000)
+    args = parser.parse_args()
+
+    if args.isochrones:
+        isochrones = gpd.read_file(args.isochrones)
+    else:
+        isochrones = load_isochrones(columns=('SOORT HO', 'range', 'INSTELLINGSNAAM', 'latitude', 'longitude'))
+    index = IsochroneIndex(isochrones)
+    lookup_file(args.input, args.output, index, args.lon_column, args.lat_column, args.chunksize)
@@ -0,0 +1,195 @@
+import json
+import os
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from pyproj import CRS
+
+# Isochrones written by geodata_traveltime_preparation.py
+ISOCHRONES_PATH = os.path.join('Data', 'all_isochrones.geojson')
+
+# Columnar copy of the isochrones: per travel profile a table with the polygons as WKB in EPSG:28992, written
+# as one row group per category and range (or per institution when built during a run, see StoreWriter), and
+# one table with the attributes of every institution
+STORE_DIR = os.path.join('Data', 'isochrones')
+INSTITUTION_COLUMNS = ['INSTELLINGSNAAM', 'SOORT HO', 'latitude', 'longitude']
+DEFAULT_PROFILE = 'driving-car'
+
+
+def store_paths(profile=DEFAULT_PROFILE, store_dir=STORE_DIR):
+    return (os.path.join(store_dir, f'isochrones_{profile}.parquet'),
+            os.path.join(store_dir, 'institutions.parquet'))
+
+
+# Function to read the institutions table of the store, or an empty one when there is none yet, and the id the
+# next new institution gets. Ids are never handed out twice, so the isochrones of another profile can not
+# point at a different institution after theirs was removed.
+def read_institutions(institutions_path):
+    if not os.path.exists(institutions_path):
+        institutions = pd.DataFrame({'institution_id': pd.Series(dtype=np.int32),
+                                     **{column: [] for column in INSTITUTION_COLUMNS}})
+        return institutions, 0
+    institutions = pd.read_parquet(institutions_path)
+    metadata = pq.read_schema(institutions_path).metadata or {}
+    next_id = int(metadata.get(b'next_institution_id', int(institutions['institution_id'].max()) + 1
+                                if len(institutions) else 0))
+    return institutions, next_id
+
+
+# Function to write the institutions table, replacing it only once it is complete
+def write_institutions(institutions, next_id, institutions_path):
+    table = pa.Table.from_pandas(institutions.reset_index(drop=True), preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'next_institution_id': str(next_id)})
+    pq.write_table(table, institutions_path + '.tmp')
+    os.replace(institutions_path + '.tmp', institutions_path)
+
+
+# Function to look up the id of every isochrone's institution. Institutions already in the table keep their id,
+# so the tables of other profiles stay valid; new ones get the next free ids. Returns the ids, the extended
+# table and the next free id.
+def assign_institution_ids(keys, institutions, next_id):
+    new = keys.drop_duplicates().merge(institutions, on=INSTITUTION_COLUMNS, how='left')
+    new = new[new['institution_id'].isna()].drop(columns='institution_id')
+    new.insert(0, 'institution_id', np.arange(next_id, next_id + len(new), dtype=np.int32))
+    institutions = pd.concat([institutions, new], ignore_index=True).astype({'institution_id': np.int32})
+    ids = keys.merge(institutions, on=INSTITUTION_COLUMNS, how='left')['institution_id']
+    return ids.to_numpy(dtype=np.int32), institutions, next_id + len(new)
+
+
+# Function to build the Arrow table of isochrones (EPSG:28992) in the layout of the store. Strings are
+# dictionary encoded by the Parquet writer, so repeating them per row costs next to nothing.
+def isochrone_table(ids, categories, ranges, geometries):
+    table = pa.table({
+        'institution_id': pa.array(ids, type=pa.int32()),
+        'SOORT HO': pa.array(categories, type=pa.string()),
+        'range': pa.array(ranges, type=pa.float64()),
+        'geometry': pa.array(shapely.to_wkb(geometries), type=pa.binary())
+    })
+    geo = {
+        'version': '1.0.0',
+        'primary_column': 'geometry',
+        'columns': {'geometry': {'encoding': 'WKB', 'geometry_types': ['Polygon', 'MultiPolygon'],
+                                 'crs': CRS.from_epsg(28992).to_json_dict()}}
+    }
+    return table.replace_schema_metadata({'geo': json.dumps(geo)})
+
+
+# Function to write isochrones with the columns of all_isochrones.geojson to the store
+def write_store(isochrones, profile=DEFAULT_PROFILE, store_dir=STORE_DIR):
+    isochrones = isochrones.to_crs(epsg=28992)
+    isochrones_path, institutions_path = store_paths(profile, store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+
+    # Normalize the institution attributes: one row per institution, referenced by id. The table is rewritten
+    # with only the institutions written now, so removed institutions disappear from every profile.
+    keys = isochrones[INSTITUTION_COLUMNS].astype({'SOORT HO': str})
+    ids, institutions, next_id = assign_institution_ids(keys, *read_institutions(institutions_path))
+    write_institutions(institutions[institutions['institution_id'].isin(ids)], next_id, institutions_path)
+
+    # Sort so every category and range is a separate row group whose statistics let readers skip it
+    order = np.lexsort((isochrones['range'].to_numpy(dtype=float), keys['SOORT HO'].to_numpy()))
+    groups = pd.DataFrame({'SOORT HO': keys['SOORT HO'].to_numpy()[order],
+                           'range': isochrones['range'].to_numpy(dtype=float)[order]})
+    starts = np.flatnonzero(~groups.duplicated())
+    ends = np.append(starts[1:], len(groups))
+
+    table = isochrone_table(ids[order], groups['SOORT HO'], groups['range'], isochrones.geometry.values[order])
+    with pq.ParquetWriter(isochrones_path, table.schema, compression='zstd') as writer:
+        for start, end in zip(starts, ends):
+            writer.write_table(table.slice(start, end - start))
+    cached_isochrones.cache_clear()
+
+
+# Writer that builds the store one batch of isochrones at a time, each batch (the isochrones of one institution)
+# a row group, so a run never holds all isochrones in memory. Readers still skip row groups by category, whose
+# statistics stay tight. The tables are written next to the store and replace it only on close; the institutions
+# table then holds only the institutions of this run.
+class StoreWriter:
+    def __init__(self, profile=DEFAULT_PROFILE, store_dir=STORE_DIR):
+        self.isochrones_path, self.institutions_path = store_paths(profile, store_dir)
+        os.makedirs(store_dir, exist_ok=True)
+        self.institutions, self.next_id = read_institutions(self.institutions_path)
+        self.written = set()
+        self.writer = None
+
+    # Function to append isochrones with the columns of all_isochrones.geojson as one row group
+    def append(self, isochrones):
+        isochrones = isochrones.to_crs(epsg=28992)
+        keys = isochrones[INSTITUTION_COLUMNS].astype({'SOORT HO': str})
+        ids, self.institutions, self.next_id = assign_institution_ids(keys, self.institutions, self.next_id)
+        self.written.update(ids.tolist())
+        table = isochrone_table(ids, keys['SOORT HO'], isochrones['range'].to_numpy(dtype=float),
+                                isochrones.geometry.values)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.isochrones_path + '.tmp', table.schema, compression='zstd')
+        self.writer.write_table(table)
+
+    # Function to complete both tables and put them in place of the store
+    def close(self):
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.isochrones_path + '.tmp', isochrone_table([], [], [], []).schema,
+                                           compression='zstd')
+        self.writer.close()
+        written = self.institutions['institution_id'].isin(list(self.written))
+        write_institutions(self.institutions[written], self.next_id, self.institutions_path)
+        os.replace(self.isochrones_path + '.tmp', self.isochrones_path)
+        cached_isochrones.cache_clear()
+
+
+# Function to (re)build the store from the GeoJSON file when the store is missing or older
+def ensure_store(source=ISOCHRONES_PATH, profile=DEFAULT_PROFILE, store_dir=STORE_DIR):
+    isochrones_path, _ = store_paths(profile, store_dir)
+    if not os.path.exists(isochrones_path) or (
+            os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(isochrones_path)):
+        write_store(gpd.read_file(source), profile, store_dir)
+
+
+# Function to read isochrones (EPSG:28992) for the requested categories and ranges, reading only the
+# matching row groups and the requested columns. Institution attributes are joined from their own table
+# only when asked for. institution_ids limits the rows to those institutions; None selects every institution
+# of the institutions table, so isochrones of institutions that were removed since are left out.
+def read_isochrones(categories=None, ranges=None, columns=('SOORT HO', 'range'), profile=DEFAULT_PROFILE,
+                    store_dir=STORE_DIR, institution_ids=None):
+    ensure_store(profile=profile, store_dir=store_dir)
+    isochrones_path, institutions_path = store_paths(profile, store_dir)
+    current = pd.read_parquet(institutions_path, columns=['institution_id'])['institution_id']
+    if institution_ids is not None:
+        current = current[current.isin([int(value) for value in institution_ids])]
+
+    filters = []
+    if categories is not None:
+        filters.append(('SOORT HO', 'in', list(categories)))
+    if ranges is not None:
+        filters.append(('range', 'in', [float(value) for value in ranges]))
+    filters.append(('institution_id', 'in', current.tolist()))
+
+    attributes = [column for column in columns if column in INSTITUTION_COLUMNS and column != 'SOORT HO']
+    read_columns = ['institution_id'] * bool(attributes) + [column for column in columns if column not in attributes]
+    isochrones = gpd.read_parquet(isochrones_path, columns=read_columns + ['geometry'], filters=filters)
+    if 'SOORT HO' in isochrones.columns:
+        isochrones['SOORT HO'] = isochrones['SOORT HO'].astype(str).astype('category')
+
+    if attributes:
+        ids = pd.unique(isochrones['institution_id']).tolist()
+        institutions = pd.read_parquet(institutions_path, columns=['institution_id'] + attributes,
+                                       filters=[('institution_id', 'in', ids)])
+        isochrones = isochrones.merge(institutions, on='institution_id', how='left').drop(columns='institution_id')
+    return isochrones[list(columns) + ['geometry']]
+
+
+# Function to load isochrones once per process; arguments must be tuples, None selects everything. Every
+# caller gets its own copy, so changing it leaves the cached frame intact.
+def load_isochrones(categories=None, ranges=None, columns=('SOORT HO', 'range'), profile=DEFAULT_PROFILE,
+                    store_dir=STORE_DIR):
+    return cached_isochrones(categories, ranges, columns, profile, store_dir).copy()
+
+
+# Function to read isochrones once per process; the frame is shared, use load_isochrones instead
+@lru_cache(maxsize=None)
+def cached_isochrones(categories, ranges, columns, profile, store_dir):
+    return read_isochrones(categories, ranges, columns, profile, store_dir)
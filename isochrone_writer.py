@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+
+from isochrone_store import ISOCHRONES_PATH
+
+# Isochrones of an unfinished run: one GeoJSON feature per line (GeoJSONSeq), appended per institution,
+# and a manifest with the institutions written so far and the length of the file that holds them
+PARTIAL_PATH = os.path.join('Data', 'cache', 'isochrones_partial.geojsonseq')
+MANIFEST_PATH = os.path.join('Data', 'cache', 'isochrones_partial.json')
+
+
+# Function to identify an institution across runs by its name, category and location
+def institution_key(row):
+    return json.dumps([row['INSTELLINGSNAAM'], row['SOORT HO'], round(float(row['longitude']), 6),
+                       round(float(row['latitude']), 6)])
+
+
+# Function to identify the institution of a written feature; the features of an institution are consecutive
+def feature_key(feature):
+    properties = feature['properties']
+    return (properties['INSTELLINGSNAAM'], properties['SOORT HO'], properties['longitude'], properties['latitude'])
+
+
+# Crash-safe writer that commits the isochrones of every institution to disk as soon as they arrive.
+# The features are appended and synced before the manifest records them, so after an interruption the
+# file is cut back to the last committed institution and the run continues from there. A run with
+# different request parameters starts over.
+class IsochroneWriter:
+    def __init__(self, parameters, path=PARTIAL_PATH, manifest_path=MANIFEST_PATH):
+        self.path = path
+        self.manifest_path = manifest_path
+        self.run = hashlib.sha256(json.dumps(parameters, sort_keys=True).encode('utf-8')).hexdigest()
+
+        manifest = None
+        if os.path.exists(manifest_path) and os.path.exists(path):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        if manifest is None or manifest['run'] != self.run:
+            manifest = {'run': self.run, 'size': 0, 'done': []}
+        self.size = manifest['size']
+        self.done = set(manifest['done'])
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Drop whatever was written after the last commit
+        with open(path, 'ab') as f:
+            f.truncate(self.size)
+        self.file = open(path, 'ab')
+        self.save_manifest()
+
+    # Function to append the features of one institution from an isochrone response and commit them
+    def append(self, key, row, response):
+        lines = []
+        for feature in response['features']:
+            properties = {
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'INSTELLINGSNAAM': row['INSTELLINGSNAAM'],
+                'SOORT HO': row['SOORT HO'],
+                'range': float(feature['properties']['value'])
+            }
+            lines.append(json.dumps({'type': 'Feature', 'properties': properties, 'geometry': feature['geometry']},
+                                    ensure_ascii=False))
+        data = ''.join(line + '\n' for line in lines).encode('utf-8')
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.size += len(data)
+        self.done.add(key)
+        self.save_manifest()
+
+    def save_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'run': self.run, 'size': self.size, 'done': sorted(self.done)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    # Function to write the committed features as one GeoJSON FeatureCollection, line by line, and remove
+    # the partial files. The output is replaced only once it is complete. With a store writer, the features
+    # of every institution are appended to the store on the way, so the store is built without reading
+    # the GeoJSON back in. keep_partial keeps the partial files, so a run with failed institutions can be
+    # written as far as it got and a rerun still requests only the institutions that are missing.
+    def finalize(self, output_path=ISOCHRONES_PATH, store=None, keep_partial=False):
+        self.file.close()
+        tmp_path = output_path + '.tmp'
+        with open(self.path, encoding='utf-8') as source, open(tmp_path, 'w', encoding='utf-8') as target:
+            target.write('{\n"type": "FeatureCollection",\n"features": [\n')
+            features = []
+            for index, line in enumerate(source):
+                target.write((',\n' if index else '') + line.rstrip('\n'))
+                if store is not None:
+                    feature = json.loads(line)
+                    if features and feature_key(feature) != feature_key(features[-1]):
+                        store.append(gpd.GeoDataFrame.from_features(features, crs='EPSG:4326'))
+                        features = []
+                    features.append(feature)
+            target.write('\n]\n}\n')
+        if store is not None:
+            if features:
+                store.append(gpd.GeoDataFrame.from_features(features, crs='EPSG:4326'))
+            # Closed after the GeoJSON is complete, so the store is the newer file and is not rebuilt from it
+            store.close()
+        os.replace(tmp_path, output_path)
+        if not keep_partial:
+            os.remove(self.manifest_path)
+            os.remove(self.path)
+
+    def close(self):
+        self.file.close()
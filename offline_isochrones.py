@@ -0,0 +1,270 @@
+import argparse
+import bz2
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+
+from institution_loader import load_institutions
+from isochrone_store import ISOCHRONES_PATH, write_store
+
+# Driving speed in km/h per OSM highway type, used when a road has no numeric maxspeed tag
+SPEEDS = {
+    'motorway': 100, 'motorway_link': 60,
+    'trunk': 80, 'trunk_link': 50,
+    'primary': 70, 'primary_link': 50,
+    'secondary': 60, 'secondary_link': 40,
+    'tertiary': 50, 'tertiary_link': 40,
+    'unclassified': 40, 'residential': 30, 'living_street': 15, 'service': 15, 'road': 30
+}
+
+# Speed in km/h assumed for the last stretch between a grid cell and the nearest road, and the largest
+# distance in meters to a road for a cell to be reachable at all
+ACCESS_SPEED = 15
+MAX_ACCESS_DISTANCE = 1000
+
+# Kilometres per mile, for maxspeed tags given in mph
+KM_PER_MILE = 1.609344
+
+
+def open_osm(path):
+    return bz2.open(path, 'rb') if path.endswith('.bz2') else open(path, 'rb')
+
+
+# Function to read the speed of a way in km/h from its tags; maxspeed is in km/h unless it says mph
+def way_speed(tags):
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(mph|km/h|kmh|kph)?\s*', tags.get('maxspeed', ''))
+    if match is None:
+        return SPEEDS[tags['highway']]
+    return float(match.group(1)) * (KM_PER_MILE if match.group(2) == 'mph' else 1)
+
+
+# Function to read the direction of a way: 1 forward only, -1 backward only, 0 both ways
+def way_direction(tags):
+    oneway = tags.get('oneway')
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway is None and (tags['highway'] in ('motorway', 'motorway_link') or tags.get('junction') == 'roundabout'):
+        return 1
+    return 0
+
+
+# Function to read the drivable roads of an OSM XML extract (.osm or .osm.bz2) into flat arrays:
+# node ids and coordinates, and per way its node references, speed and direction
+def read_osm(path):
+    node_ids, lons, lats = [], [], []
+    refs, way_lengths, speeds, directions = [], [], [], []
+    with open_osm(path) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end':
+                continue
+            if elem.tag == 'node':
+                node_ids.append(int(elem.get('id')))
+                lons.append(float(elem.get('lon')))
+                lats.append(float(elem.get('lat')))
+            elif elem.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+                way_refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                if tags.get('highway') in SPEEDS and len(way_refs) > 1:
+                    refs.extend(way_refs)
+                    way_lengths.append(len(way_refs))
+                    speeds.append(way_speed(tags))
+                    directions.append(way_direction(tags))
+            elif elem.tag != 'relation':
+                continue
+            root.clear()
+    return (np.array(node_ids, dtype=np.int64), np.array(lons), np.array(lats), np.array(refs, dtype=np.int64),
+            np.array(way_lengths, dtype=np.int64), np.array(speeds), np.array(directions))
+
+
+# Road network as a compressed sparse row matrix of travel times in seconds between nodes, with node
+# coordinates in EPSG:28992. Only the nodes of the largest strongly connected part are used as start
+# points, so locations are never snapped onto an isolated piece of road.
+class RoadGraph:
+    def __init__(self, x, y, matrix):
+        self.x = x
+        self.y = y
+        self.matrix = matrix
+        _, labels = connected_components(matrix, directed=True, connection='strong')
+        self.main_nodes = np.flatnonzero(labels == np.bincount(labels).argmax())
+        self.main_tree = cKDTree(np.column_stack([x[self.main_nodes], y[self.main_nodes]]))
+        self.tree = cKDTree(np.column_stack([x, y]))
+
+    @classmethod
+    def from_osm(cls, path):
+        node_ids, lons, lats, refs, way_lengths, speeds, directions = read_osm(path)
+
+        # Consecutive node pairs of every way, with the speed and direction of their way
+        way_index = np.repeat(np.arange(len(way_lengths)), way_lengths)
+        pair = way_index[:-1] == way_index[1:]
+        source, target, way_index = refs[:-1][pair], refs[1:][pair], way_index[:-1][pair]
+
+        # Translate node ids to positions, dropping pairs that leave the extract
+        order = np.argsort(node_ids)
+        node_ids, lons, lats = node_ids[order], lons[order], lats[order]
+        source_pos = np.clip(np.searchsorted(node_ids, source), 0, len(node_ids) - 1)
+        target_pos = np.clip(np.searchsorted(node_ids, target), 0, len(node_ids) - 1)
+        known = (node_ids[source_pos] == source) & (node_ids[target_pos] == target)
+        source_pos, target_pos, way_index = source_pos[known], target_pos[known], way_index[known]
+
+        # Keep only the nodes that are part of a road and number them from 0
+        used, inverse = np.unique(np.concatenate([source_pos, target_pos]), return_inverse=True)
+        source_pos, target_pos = np.split(inverse, 2)
+        x, y = Transformer.from_crs(4326, 28992, always_xy=True).transform(lons[used], lats[used])
+
+        seconds = np.hypot(x[target_pos] - x[source_pos], y[target_pos] - y[source_pos]) / (speeds[way_index] / 3.6)
+        direction = directions[way_index]
+        forward, backward = direction >= 0, direction <= 0
+        rows = np.concatenate([source_pos[forward], target_pos[backward]])
+        cols = np.concatenate([target_pos[forward], source_pos[backward]])
+        seconds = np.concatenate([seconds[forward], seconds[backward]])
+
+        # A sparse matrix sums duplicate entries, so keep only the fastest edge between two nodes
+        order = np.lexsort((seconds, cols, rows))
+        rows, cols, seconds = rows[order], cols[order], seconds[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        # Zero-length edges would disappear from the sparse matrix, so give them a tiny cost
+        seconds = np.maximum(seconds[first], 1e-3)
+        matrix = csr_matrix((seconds, (rows[first], cols[first])), shape=(len(used), len(used)))
+        return cls(np.asarray(x), np.asarray(y), matrix)
+
+    # Function to snap EPSG:28992 coordinates to the nearest node of the main network
+    def snap(self, x, y):
+        _, index = self.main_tree.query(np.column_stack([x, y]))
+        return self.main_nodes[index]
+
+    # Function to run one multi-source search: the travel time from the nearest source to every node,
+    # and which source that is (-1 if no source reaches the node within the limit)
+    def travel_times(self, sources, limit=np.inf):
+        times, _, nearest = dijkstra(self.matrix, directed=True, indices=sources, min_only=True, limit=limit,
+                                     return_predecessors=True)
+        nearest[np.isinf(times)] = -1
+        return times, nearest
+
+
+# Function to dissolve grid cells, given in row-major order, into one polygon. Horizontal runs of cells are
+# merged first; the runs keep a vertex at every grid line, so they still form a valid coverage whose
+# union is much cheaper than that of the individual cells.
+def dissolve_cells(col, row, edges_x, edges_y):
+    start = np.ones(len(col), dtype=bool)
+    start[1:] = (row[1:] != row[:-1]) | (col[1:] != col[:-1] + 1)
+    first = np.flatnonzero(start)
+    last = np.append(first[1:], len(col)) - 1
+    left, right, run_row = col[first], col[last] + 1, row[first]
+
+    # Every run is a ring along its bottom edge, back along its top edge and closed at the start
+    vertices = right - left + 1
+    run = np.repeat(np.arange(len(first)), 2 * vertices + 1)
+    position = np.arange(len(run)) - np.repeat(np.cumsum(2 * vertices + 1) - (2 * vertices + 1), 2 * vertices + 1)
+    count = vertices[run]
+    x = np.where(position < count, left[run] + position, right[run] - (position - count))
+    x = np.where(position == 2 * count, left[run], x)
+    y = np.where((position >= count) & (position < 2 * count), run_row[run] + 1, run_row[run])
+    rings = shapely.linearrings(np.column_stack([edges_x[x], edges_y[y]]), indices=run)
+    return shapely.coverage_union_all(shapely.polygons(rings))
+
+
+# Function to compute travel time polygons for every institution, one multi-source search per category.
+# Each institution gets the area where it is the nearest institution of its category, per range; together
+# they cover the same area as overlapping isochrones would, with the columns of all_isochrones.geojson.
+# Institutions that snap to the same road node all get the area of that node.
+def offline_isochrones(graph, institutions, ranges, resolution=250):
+    ranges = sorted(ranges)
+    institutions = institutions.to_crs(epsg=28992).reset_index(drop=True)
+    institution_nodes = graph.snap(institutions.geometry.x, institutions.geometry.y)
+
+    # Regular grid over the network; every cell is reached through the road node nearest to its centre
+    minx, miny = graph.x.min() - MAX_ACCESS_DISTANCE, graph.y.min() - MAX_ACCESS_DISTANCE
+    edges_x = np.arange(minx, graph.x.max() + MAX_ACCESS_DISTANCE + resolution, resolution)
+    edges_y = np.arange(miny, graph.y.max() + MAX_ACCESS_DISTANCE + resolution, resolution)
+    col, row = np.meshgrid(np.arange(len(edges_x) - 1), np.arange(len(edges_y) - 1))
+    col, row = col.ravel(), row.ravel()
+    access_distance, cell_node = graph.tree.query(
+        np.column_stack([edges_x[col] + resolution / 2, edges_y[row] + resolution / 2]),
+        distance_upper_bound=MAX_ACCESS_DISTANCE, workers=-1)
+    on_network = np.isfinite(access_distance)
+    col, row = col[on_network], row[on_network]
+    access_seconds, cell_node = access_distance[on_network] / (ACCESS_SPEED / 3.6), cell_node[on_network]
+
+    frames = []
+    for category, members in institutions.groupby('SOORT HO', observed=True).groups.items():
+        members = np.asarray(members)
+        times, nearest = graph.travel_times(np.unique(institution_nodes[members]), limit=ranges[-1])
+
+        # Source node of every member; institutions snapped to the same node share its area
+        source_nodes, member_source = np.unique(institution_nodes[members], return_inverse=True)
+        source_index = np.full(len(graph.x), -1)
+        source_index[source_nodes] = np.arange(len(source_nodes))
+        cell_seconds = times[cell_node] + access_seconds
+        reached = (cell_seconds <= ranges[-1]) & (nearest[cell_node] >= 0)
+        cell_source = source_index[nearest[cell_node][reached]]
+
+        # Group the cells by source node; a stable sort keeps them in row-major order within a group
+        order = np.argsort(cell_source, kind='stable')
+        cell_source = cell_source[order]
+        cell_seconds, cell_col, cell_row = cell_seconds[reached][order], col[reached][order], row[reached][order]
+        starts = np.searchsorted(cell_source, np.arange(len(source_nodes)))
+        ends = np.searchsorted(cell_source, np.arange(len(source_nodes)), side='right')
+
+        # Dissolve the cells once per source node and range
+        source_polygons = []
+        for start, end in zip(starts, ends):
+            polygons = []
+            for value in ranges:
+                within = cell_seconds[start:end] <= value
+                if within.any():
+                    polygons.append((float(value), dissolve_cells(cell_col[start:end][within],
+                                                                  cell_row[start:end][within], edges_x, edges_y)))
+            source_polygons.append(polygons)
+
+        records, geometries = [], []
+        for institution, source in zip(members, member_source.ravel()):
+            for value, geometry in source_polygons[source]:
+                records.append((institution, value))
+                geometries.append(geometry)
+        if records:
+            index, values = zip(*records)
+            frame = institutions.loc[list(index), ['latitude', 'longitude', 'INSTELLINGSNAAM', 'SOORT HO']]
+            frames.append(gpd.GeoDataFrame(frame.reset_index(drop=True).assign(range=values),
+                                           geometry=geometries, crs='EPSG:28992'))
+        print(f"{category}: {len(members)} institutions, {len(records)} polygons")
+
+    if not frames:
+        # No institution reaches any cell, e.g. when none lies near the network
+        return gpd.GeoDataFrame(columns=['latitude', 'longitude', 'INSTELLINGSNAAM', 'SOORT HO', 'range'],
+                                geometry=[], crs='EPSG:4326')
+    result = pd.concat(frames, ignore_index=True).to_crs(epsg=4326)
+    result['SOORT HO'] = result['SOORT HO'].astype(str)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute travel time polygons from a local OSM extract.')
+    parser.add_argument('osm', help='OSM XML extract (.osm or .osm.bz2), ideally filtered to highways')
+    parser.add_argument('--output', default=ISOCHRONES_PATH)
+    parser.add_argument('--ranges', type=int, nargs='+', default=[600, 900, 1200, 1500, 1800, 2700],
+                        help='Travel times in seconds')
+    parser.add_argument('--resolution', type=int, default=250, help='Grid cell size in meters')
+    args = parser.parse_args()
+
+    graph = RoadGraph.from_osm(args.osm)
+    print(f"Road graph: {graph.matrix.shape[0]} nodes, {graph.matrix.nnz} edges")
+    institutions = load_institutions(('SOORT HO', 'INSTELLINGSNAAM', 'latitude', 'longitude'))
+    isochrones = offline_isochrones(graph, institutions, args.ranges, args.resolution)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    isochrones.to_file(args.output, driver='GeoJSON')
+    write_store(isochrones)
+    print(f"{len(isochrones)} isochrones written to {args.output}")
@@ -0,0 +1,164 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import geomap_distance_to_HO
+import geomap_traveltime_to_HO
+from accessibility_stats import load_regions
+from band_engine import (compute_rings, distance_subset, land_mask, polygonal_parts, ring_frame, ring_key,
+                         store_rings, traveltime_subset)
+from institution_loader import load_institutions
+from instrumentation import drain, merge, report_at_exit, stage
+from isochrone_store import INSTITUTION_COLUMNS, ensure_store, read_isochrones, store_paths
+
+# Function to split the land mask into one partition per province of the base map
+def partition_masks(region_column='NAME_1'):
+    mask = land_mask()
+    regions = load_regions(region_column)
+    masks = pd.Series(shapely.intersection(regions.values, mask), index=regions.index)
+    return masks[~shapely.is_empty(masks.values)]
+
+
+# Function to cut the land around every partition: the land within the border margin, which holds everything
+# the partition's bands are computed from, so a worker overlays that instead of the whole country
+def partition_windows(masks, margin, mask=None):
+    mask = land_mask() if mask is None else mask
+    windows = shapely.intersection(shapely.buffer(masks.values, margin), mask)
+    return pd.Series(windows, index=masks.index)
+
+
+# Function to measure how far the isochrones of the categories reach: the largest distance from an institution
+# to its isochrone of any of the ranges, which is the default border margin for travel time
+def isochrone_reach(categories, thresholds):
+    isochrones = read_isochrones(tuple(categories), tuple(thresholds), ('longitude', 'latitude'))
+    points = gpd.GeoSeries.from_xy(isochrones['longitude'], isochrones['latitude'], crs='EPSG:4326').to_crs(epsg=28992)
+    # For a point and a polygon this is the distance to the farthest vertex of the polygon
+    reach = shapely.hausdorff_distance(np.asarray(points.values), np.asarray(isochrones.geometry.values))
+    return float(np.nanmax(reach, initial=0))
+
+
+# Function to load the institutions that can reach a partition: one row per institution with its province,
+# its point in EPSG:28992 and, for travel time, its id in the isochrone store
+def partition_points(measure):
+    institutions = load_institutions(('SOORT HO', 'PROVINCIE', 'INSTELLINGSNAAM', 'latitude', 'longitude'))
+    institutions['SOORT HO'] = institutions['SOORT HO'].astype(str)
+    if measure == 'distance':
+        return institutions
+
+    # Isochrones belong to the institutions of the store; their province comes from the prepared data.
+    # The store is brought up to date here, before the workers read from it.
+    ensure_store()
+    _, institutions_path = store_paths()
+    stored = pd.read_parquet(institutions_path, columns=['institution_id'] + INSTITUTION_COLUMNS)
+    stored['SOORT HO'] = stored['SOORT HO'].astype(str)
+    provinces = pd.DataFrame(institutions.drop(columns='geometry')).drop_duplicates(INSTITUTION_COLUMNS)
+    stored = stored.merge(provinces, on=INSTITUTION_COLUMNS, how='left')
+    geometry = gpd.points_from_xy(stored['longitude'], stored['latitude'], crs='EPSG:4326')
+    return gpd.GeoDataFrame(stored, geometry=geometry).to_crs(epsg=28992)
+
+
+# Function to select the institutions of a partition: those in the province by their PROVINCIE and those
+# of other provinces within the border margin of its land, whose bands can cross the border
+def partition_members(points, name, mask, margin):
+    shapely.prepare(mask)
+    return points[(points['PROVINCIE'] == name).to_numpy() | shapely.dwithin(points.geometry.values, mask, margin)]
+
+
+# Function to compute the rings of one category within one partition in a worker process. Only the
+# members' points or isochrones are loaded, and only those that reach the partition take part. The rings are
+# computed against the window of land around the partition and cut to the partition afterwards: clipping
+# every threshold to the partition border instead leaves the unions with shared edges along it, which GEOS
+# overlays slowly, while the window border lies a margin away. Returns the ring geometries and the stage
+# timings recorded by the worker.
+def partition_rings(measure, category, thresholds, mask, window, members):
+    shapely.prepare(mask)
+    shapely.prepare(window)
+    if measure == 'distance':
+        geometries = [members.buffer(distance).values for distance in thresholds]
+    else:
+        isochrones = read_isochrones((category,), tuple(thresholds), ('range',), institution_ids=tuple(members))
+        geometries = [isochrones.geometry.values[isochrones['range'].to_numpy() == value] for value in thresholds]
+    geometries = [values[shapely.intersects(mask, values)] for values in geometries]
+    rings = compute_rings(geometries, thresholds, mask=window)
+    with stage('partition'):
+        rings = polygonal_parts(shapely.intersection(rings.geometry.values, mask))
+    return rings, drain()
+
+
+# Function to stitch the partition rings into national rings: band by band, the pieces of all partitions
+# are merged into one geometry. Partitions only overlap where base map regions do, and there both agree.
+def stitch_rings(pieces, thresholds):
+    with stage('stitch'):
+        rings = [shapely.union_all([piece[band] for piece in pieces]) for band in range(len(thresholds) + 1)]
+    return ring_frame(rings, thresholds)
+
+
+# Function to compute the rings of every category per partition across a process pool and store the
+# stitched rings in the band cache, under the same key the figures look them up by
+def partitioned_bands(measure, categories, thresholds, margin=None, region_column='NAME_1', processes=None):
+    start = time.perf_counter()
+    with stage('load'):
+        masks = partition_masks(region_column)
+        points = partition_points(measure)
+        if margin is None:
+            margin = max(thresholds) if measure == 'distance' else isochrone_reach(categories, thresholds)
+    with stage('windows'):
+        windows = partition_windows(masks, margin)
+
+    jobs = {}
+    # Workers start from empty records, not the ones copied from this process
+    with ProcessPoolExecutor(max_workers=processes, initializer=drain) as executor:
+        for category in categories:
+            candidates = points[points['SOORT HO'] == category]
+            for name, mask in masks.items():
+                members = partition_members(candidates, name, mask, margin)
+                members = members if measure == 'distance' else members['institution_id'].to_numpy()
+                future = executor.submit(partition_rings, measure, category, thresholds, mask, windows[name],
+                                         members)
+                jobs[future] = (category, name, len(members))
+
+        pieces = {category: {} for category in categories}
+        for future in as_completed(jobs):
+            category, name, size = jobs[future]
+            rings, records = future.result()
+            merge(records)
+            pieces[category][name] = rings
+            print(f"{measure} {category} {name}: {size} institutions")
+
+    for category in categories:
+        # Stitched in a fixed order, so the result does not depend on which partition finished first
+        rings = stitch_rings([pieces[category][name] for name in masks.index], thresholds)
+        with stage('load'):
+            if measure == 'distance':
+                subset = distance_subset(load_institutions(('SOORT HO',)), category)
+            else:
+                subset = traveltime_subset(read_isochrones((category,), tuple(thresholds)), category)
+        store_rings(ring_key(measure, category, thresholds, subset), rings)
+    print(f"{measure} bands for {len(categories)} categories in {len(masks)} partitions "
+          f"(margin {margin:,.0f} m) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    report_at_exit('partitioned_bands')
+
+    parser = argparse.ArgumentParser(description='Compute the band rings per province in parallel and stitch them '
+                                                 'into the band cache used by the figures.')
+    parser.add_argument('--measure', nargs='+', choices=['traveltime', 'distance'], default=['traveltime', 'distance'])
+    parser.add_argument('--categories', nargs='+', default=geomap_traveltime_to_HO.desired_order)
+    parser.add_argument('--margin', type=float,
+                        help='Border margin in meters; default the largest distance, or the farthest any isochrone '
+                             'reaches from its institution')
+    parser.add_argument('--region-column', default='NAME_1', help='Column of the base map that names the provinces')
+    parser.add_argument('--processes', type=int, default=None, help='Number of worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    for measure in args.measure:
+        thresholds = geomap_traveltime_to_HO.travel_time_ranges if measure == 'traveltime' \
+            else geomap_distance_to_HO.buffer_distances
+        with stage(measure):
+            partitioned_bands(measure, args.categories, thresholds, args.margin, args.region_column, args.processes)
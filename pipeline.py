@@ -0,0 +1,213 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import render_all
+from basemap_store import LAYERS, layer_path
+from isochrone_fetcher import DEFAULT_BASE_URL
+from isochrone_store import store_paths
+
+# Fingerprints of the last successful run of every stage, plus file hashes by (path, size, mtime)
+STATE_PATH = os.path.join('Data', 'cache', 'pipeline_state.json')
+
+INPUT_CSV = os.path.join('Data', 'Locaties hoger onderwijs.csv')
+PREPARED_CSV = os.path.join('Data', 'Geodata_prepared.csv')
+ISOCHRONES = os.path.join('Data', 'all_isochrones.geojson')
+ISOCHRONE_STORE = list(store_paths())
+BASEMAP_FILES = [layer_path(name) for name in LAYERS]
+
+
+# A stage: the script that produces the outputs from the inputs, the stages it waits for, the source files
+# its result depends on (by default the script and every local module it imports) and any parameters that
+# do not live in the source code
+class Stage:
+    def __init__(self, name, script, inputs, outputs, after=(), args=(), params=None, sources=None):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.after = list(after)
+        self.args = list(args)
+        self.params = params or {}
+        self.sources = sources if sources is not None else local_sources(script)
+
+
+# Function to build the dependency graph:
+# Locaties hoger onderwijs.csv -> Geodata_prepared.csv -> isochrone store -> band rings -> PNGs.
+# The band rings are cached by content in Data/cache/bands, so they are rebuilt inside the render
+# stages only when their own inputs change; a color tweak only re-renders.
+def build_stages(languages=tuple(render_all.LANGUAGES), dpi=720, basemap_source=None):
+    stages = [
+        Stage('basemap', 'basemap_store.py', [basemap_source] if basemap_source else [], BASEMAP_FILES,
+              args=[basemap_source] if basemap_source else []),
+        Stage('geocode', 'geodata_preparation.py', [INPUT_CSV], [PREPARED_CSV]),
+        Stage('isochrones', 'geodata_traveltime_preparation.py', [PREPARED_CSV], [ISOCHRONES] + ISOCHRONE_STORE,
+              after=['geocode'], params={'base_url': os.getenv('OPENROUTE_BASE_URL', DEFAULT_BASE_URL)})
+    ]
+    for figure, module in render_all.FIGURES.items():
+        inputs = BASEMAP_FILES + [PREPARED_CSV] + (ISOCHRONE_STORE if figure == 'traveltime' else [])
+        after = ['basemap', 'geocode'] + (['isochrones'] if figure == 'traveltime' else [])
+        outputs = [os.path.join('Visuals', module.get_language_dict(language)['output_file'])
+                   for language in languages]
+        # Only the figure's own script counts, so a color tweak in one figure does not re-render the others
+        sources = sorted(set(local_sources(module.__name__ + '.py')) | {'render_all.py'})
+        stages.append(Stage(f'render_{figure}', 'render_all.py', inputs, outputs, after=after,
+                            args=['--figures', figure, '--languages', *languages, '--dpi', str(dpi),
+                                  '--processes', '1'],
+                            params={'languages': list(languages), 'dpi': dpi}, sources=sources))
+    return stages
+
+
+# Function to list the local modules a script depends on, following imports recursively
+def local_sources(script, root='.'):
+    sources, pending = [], [script]
+    while pending:
+        path = pending.pop()
+        if path in sources:
+            continue
+        sources.append(path)
+        with open(os.path.join(root, path), encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            pending.extend(name + '.py' for name in names if os.path.exists(os.path.join(root, name + '.py')))
+    return sorted(sources)
+
+
+# Function to hash a source file by its syntax tree, so edits to comments or formatting do not count as changes
+def source_hash(path):
+    with open(path, encoding='utf-8') as f:
+        return hashlib.sha256(ast.dump(ast.parse(f.read())).encode('utf-8')).hexdigest()
+
+
+# Function to hash a data file; the hash is reused while its size and modification time are unchanged
+def file_hash(path, known):
+    stat = os.stat(path)
+    signature = f'{stat.st_size}:{stat.st_mtime_ns}'
+    if known.get(path, {}).get('signature') != signature:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        known[path] = {'signature': signature, 'hash': digest.hexdigest()}
+    return known[path]['hash']
+
+
+# Function to fingerprint a stage from the content of its inputs, its source code and its parameters
+def fingerprint(stage, known):
+    parts = {
+        'inputs': {path: file_hash(path, known) if os.path.exists(path) else None for path in stage.inputs},
+        'sources': {path: source_hash(path) for path in stage.sources},
+        'args': stage.args,
+        'params': stage.params
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {'stages': {}, 'files': {}}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Function to run one stage as a separate process; returns the exit code and the captured output
+def run_stage(stage):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, stage.script, *stage.args], capture_output=True, text=True)
+    return result.returncode, result.stdout + result.stderr, time.perf_counter() - start
+
+
+# Function to run every stale stage, starting each one as soon as the stages it depends on are done.
+# A stage is stale when its fingerprint changed or one of its outputs is missing. Fingerprints are taken
+# when a stage is about to start, so a stage whose upstream reran with an identical result is still skipped.
+def run_pipeline(stages, force=(), dry_run=False, max_workers=4, state_path=STATE_PATH):
+    state = load_state(state_path)
+    by_name = {stage.name: stage for stage in stages}
+    done, failed, running, would_run = set(), set(), {}, set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(done) + len(failed) < len(stages):
+            for stage in stages:
+                if stage.name in done or stage.name in failed or stage.name in running.values():
+                    continue
+                if any(name in failed for name in stage.after):
+                    print(f"[{stage.name}] skipped, an upstream stage failed")
+                    failed.add(stage.name)
+                    continue
+                if not all(name in done for name in stage.after):
+                    continue
+
+                stage_fingerprint = fingerprint(stage, state['files'])
+                stale = (stage.name in force or state['stages'].get(stage.name) != stage_fingerprint
+                         or not all(os.path.exists(path) for path in stage.outputs))
+                upstream = [name for name in stage.after if name in would_run]
+                if dry_run and (stale or upstream):
+                    reason = 'stale' if stale else f"runs if {', '.join(upstream)} changes its output"
+                    print(f"[{stage.name}] {reason}, would run {stage.script}")
+                    would_run.add(stage.name)
+                    done.add(stage.name)
+                elif not stale:
+                    print(f"[{stage.name}] up to date")
+                    done.add(stage.name)
+                else:
+                    print(f"[{stage.name}] running {stage.script}")
+                    running[executor.submit(run_stage, stage)] = stage.name
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, output, seconds = future.result()
+                print(output, end='')
+                if returncode == 0:
+                    # Record the fingerprint of the inputs the stage actually ran on
+                    state['stages'][name] = fingerprint(by_name[name], state['files'])
+                    done.add(name)
+                    print(f"[{name}] finished in {seconds:.1f}s")
+                else:
+                    failed.add(name)
+                    print(f"[{name}] failed with exit code {returncode}")
+            if not dry_run:
+                save_state(state, state_path)
+
+    if not dry_run:
+        save_state(state, state_path)
+    return not failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the stages of the pipeline whose inputs changed.')
+    parser.add_argument('--languages', nargs='+', choices=render_all.LANGUAGES, default=render_all.LANGUAGES)
+    parser.add_argument('--dpi', type=int, default=720)
+    parser.add_argument('--basemap-source', help='Local copy of the base map to import instead of downloading it')
+    parser.add_argument('--force', nargs='+', default=[], help='Stages to run even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the stages that would run')
+    parser.add_argument('--max-workers', type=int, default=4, help='Number of stages run at the same time')
+    args = parser.parse_args()
+
+    stages = build_stages(args.languages, args.dpi, args.basemap_source)
+    unknown = set(args.force) - {stage.name for stage in stages}
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    sys.exit(0 if run_pipeline(stages, args.force, args.dry_run, args.max_workers) else 1)
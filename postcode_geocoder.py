@@ -0,0 +1,126 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Directory of the postcode index: sorted lookup keys with their coordinates, stored as .npy files that are
+# memory-mapped on load, so only the pages that are searched are read from disk
+INDEX_DIR = os.path.join('Data', 'postcode_index')
+
+# House numbers are packed into the key below the postcode, so they must stay below this value
+NUMBER_LIMIT = 100000
+
+
+# Function to turn PC6 postcodes ('1234 AB') into integers; invalid postcodes become -1
+def postcode_codes(postcodes):
+    parts = pd.Series(postcodes, dtype=object).astype(str).str.upper().str.replace(r'\s+', '', regex=True) \
+        .str.extract(r'^(\d{4})([A-Z])([A-Z])$')
+    valid = parts.notna().all(axis=1).to_numpy()
+    codes = np.full(len(parts), -1, dtype=np.int64)
+    digits = parts[0][valid].astype(int).to_numpy()
+    first = np.array(parts[1][valid].tolist(), dtype='U1').view(np.int32) - ord('A')
+    second = np.array(parts[2][valid].tolist(), dtype='U1').view(np.int32) - ord('A')
+    codes[valid] = digits * 676 + first * 26 + second
+    return codes
+
+
+# Function to read the house number from values such as '26', '26-A' or '26 bis'; missing numbers become -1
+def house_numbers(values):
+    numbers = pd.Series(values, dtype=object).astype(str).str.extract(r'^\s*(\d+)')[0]
+    numbers = pd.to_numeric(numbers, errors='coerce').fillna(-1).to_numpy(dtype=np.int64, copy=True)
+    numbers[numbers >= NUMBER_LIMIT] = -1
+    return numbers
+
+
+# Function to build the index from a reference file with one row per address (for example an extract of the
+# BAG): postcode, house number and WGS 84 coordinates. Also stores the centre of every postcode as fallback.
+def build_index(source, index_dir=INDEX_DIR, postcode_column='postcode', number_column='huisnummer',
+                lon_column='lon', lat_column='lat', chunksize=1000000):
+    keys, codes, coordinates = [], [], []
+    columns = [postcode_column, number_column, lon_column, lat_column]
+    for chunk in pd.read_csv(source, usecols=columns, dtype={postcode_column: str, number_column: str},
+                             chunksize=chunksize):
+        chunk_codes, numbers = postcode_codes(chunk[postcode_column]), house_numbers(chunk[number_column])
+        lonlat = chunk[[lon_column, lat_column]].to_numpy(dtype=float)
+        valid = (chunk_codes >= 0) & np.isfinite(lonlat).all(axis=1)
+        keys.append(np.where(numbers[valid] >= 0, chunk_codes[valid] * NUMBER_LIMIT + numbers[valid], -1))
+        codes.append(chunk_codes[valid])
+        coordinates.append(lonlat[valid])
+    keys, codes, coordinates = np.concatenate(keys), np.concatenate(codes), np.concatenate(coordinates)
+
+    # Postcode centres: the mean of all addresses with that postcode, including those without a number
+    pc_codes, inverse = np.unique(codes, return_inverse=True)
+    centre_coordinates = np.column_stack([np.bincount(inverse, weights=coordinates[:, axis]) for axis in (0, 1)])
+    centre_coordinates /= np.bincount(inverse)[:, None]
+
+    # Addresses, sorted by key; an address listed more than once keeps its first coordinates
+    with_number = keys >= 0
+    keys, coordinates = keys[with_number], coordinates[with_number]
+    order = np.argsort(keys, kind='stable')
+    keys, coordinates = keys[order], coordinates[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, 'address_keys.npy'), keys[first])
+    np.save(os.path.join(index_dir, 'address_coordinates.npy'), coordinates[first])
+    np.save(os.path.join(index_dir, 'postcode_keys.npy'), pc_codes)
+    np.save(os.path.join(index_dir, 'postcode_coordinates.npy'), centre_coordinates)
+    return int(first.sum()), len(pc_codes)
+
+
+# Memory-mapped postcode + house number lookup with a fallback to the postcode centre
+class PostcodeIndex:
+    def __init__(self, index_dir=INDEX_DIR):
+        def load(name):
+            return np.load(os.path.join(index_dir, name + '.npy'), mmap_mode='r')
+        self.address_keys, self.address_coordinates = load('address_keys'), load('address_coordinates')
+        self.postcode_keys, self.postcode_coordinates = load('postcode_keys'), load('postcode_coordinates')
+
+    @staticmethod
+    def exists(index_dir=INDEX_DIR):
+        return os.path.exists(os.path.join(index_dir, 'address_keys.npy'))
+
+    # Function to find sorted keys; returns the position of every key and whether it was found
+    @staticmethod
+    def search(sorted_keys, keys):
+        position = np.clip(np.searchsorted(sorted_keys, keys), 0, max(len(sorted_keys) - 1, 0))
+        found = (keys >= 0) & (len(sorted_keys) > 0)
+        found[found] = sorted_keys[position[found]] == keys[found]
+        return position, found
+
+    # Function to geocode postcodes and house numbers in bulk. Returns longitude, latitude and the precision
+    # of every row: 'address', 'postcode' (centre of the postcode, if fallback is enabled) or None.
+    def lookup(self, postcodes, numbers, fallback=True):
+        codes, numbers = postcode_codes(postcodes), house_numbers(numbers)
+        keys = np.where((codes >= 0) & (numbers >= 0), codes * NUMBER_LIMIT + numbers, -1)
+        coordinates = np.full((len(keys), 2), np.nan)
+        precision = np.full(len(keys), None, dtype=object)
+
+        position, found = self.search(self.address_keys, keys)
+        coordinates[found] = self.address_coordinates[position[found]]
+        precision[found] = 'address'
+
+        if fallback:
+            position, centre = self.search(self.postcode_keys, codes)
+            centre &= ~found
+            coordinates[centre] = self.postcode_coordinates[position[centre]]
+            precision[centre] = 'postcode'
+
+        return pd.DataFrame({'longitude': coordinates[:, 0], 'latitude': coordinates[:, 1], 'precision': precision})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the local postcode + house number index.')
+    parser.add_argument('source', help='CSV with one row per address, for example an extract of the BAG')
+    parser.add_argument('--index-dir', default=INDEX_DIR)
+    parser.add_argument('--postcode-column', default='postcode')
+    parser.add_argument('--number-column', default='huisnummer')
+    parser.add_argument('--lon-column', default='lon')
+    parser.add_argument('--lat-column', default='lat')
+    args = parser.parse_args()
+
+    addresses, postcodes = build_index(args.source, args.index_dir, args.postcode_column, args.number_column,
+                                       args.lon_column, args.lat_column)
+    print(f"Indexed {addresses} addresses and {postcodes} postcodes in {args.index_dir}")
@@ -0,0 +1,74 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use('Agg')  # Render headless; must be selected before pyplot is imported
+import matplotlib.pyplot as plt
+
+import geomap_distance_to_HO
+import geomap_distribution_HO
+import geomap_distribution_HO_multimap
+import geomap_traveltime_to_HO
+from instrumentation import drain, merge, stage, write_report
+
+# Figures that can be rendered, by name
+FIGURES = {
+    'distance': geomap_distance_to_HO,
+    'distribution': geomap_distribution_HO,
+    'distribution_multimap': geomap_distribution_HO_multimap,
+    'traveltime': geomap_traveltime_to_HO
+}
+LANGUAGES = ['english', 'dutch']
+
+# Prepared data of every figure, set once per worker process
+_figure_data = {}
+
+
+def init_worker(figure_data):
+    _figure_data.update(figure_data)
+
+
+# Function to render one figure in every language in a worker process, so the languages share the map
+# raster; returns the output paths and the stage timings recorded by the worker
+def render_job(figure, languages, output_dir, dpi):
+    paths = []
+    for language in languages:
+        with stage(figure):
+            fig = FIGURES[figure].render(language, _figure_data[figure], output_dir=output_dir, dpi=dpi)
+        plt.close(fig)
+        paths.append(os.path.join(output_dir, FIGURES[figure].get_language_dict(language)['output_file']))
+    return paths, drain()
+
+
+# Function to load every figure's data once and render all combinations across a process pool
+def render_all(figures=tuple(FIGURES), languages=tuple(LANGUAGES), output_dir='Visuals', dpi=720, processes=None):
+    start = time.perf_counter()
+    figure_data = {}
+    for figure in figures:
+        with stage(figure):
+            figure_data[figure] = FIGURES[figure].load_data()
+    print(f"Data prepared in {time.perf_counter() - start:.1f}s")
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(figure_data,)) as executor:
+        futures = [executor.submit(render_job, figure, languages, output_dir, dpi) for figure in figures]
+        for future in as_completed(futures):
+            paths, records = future.result()
+            merge(records)
+            for path in paths:
+                print(f"Saved {path}")
+    print(f"Rendered {len(figures) * len(languages)} figures in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render every figure in every language.')
+    parser.add_argument('--figures', nargs='+', choices=list(FIGURES), default=list(FIGURES))
+    parser.add_argument('--languages', nargs='+', choices=LANGUAGES, default=LANGUAGES)
+    parser.add_argument('--output-dir', default='Visuals')
+    parser.add_argument('--dpi', type=int, default=720)
+    parser.add_argument('--processes', type=int, default=None, help='Number of worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    render_all(args.figures, args.languages, args.output_dir, args.dpi, args.processes)
+    write_report('render_all')
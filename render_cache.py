@@ -0,0 +1,36 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+# Figures are drawn in two parts: the map, which is the same in every language (base map fill, water, bands,
+# outlines and institutions), and the text, which is not (legends and watermark). The map is rasterized
+# once per figure size, map extent and dpi and kept with the data it was drawn from; for every language
+# only the text is drawn over it.
+
+
+# Function to return the map raster and the positions of its axes, drawing it with draw(fig) on a cache miss
+def map_raster(data, figsize, extent, dpi, draw):
+    rasters = data.setdefault('map_rasters', {})
+    key = (tuple(figsize), tuple(np.round(extent, 3)), dpi)
+    if key not in rasters:
+        fig = plt.figure(figsize=figsize, dpi=dpi)
+        draw(fig)
+        fig.canvas.draw()
+        image = np.asarray(fig.canvas.buffer_rgba()).copy()
+        # The positions after drawing, once the equal aspect ratio has been applied
+        positions = [ax.get_position() for ax in fig.axes]
+        plt.close(fig)
+        rasters[key] = image, positions
+    return rasters[key]
+
+
+# Function to start a figure from a map raster; returns the figure and empty axes at the positions of the
+# map's axes, to place legends on
+def composite(image, positions, figsize):
+    fig = plt.figure(figsize=figsize)
+    background = fig.add_axes((0, 0, 1, 1))
+    background.imshow(image, interpolation='none', aspect='auto')
+    background.set_axis_off()
+    axes = [fig.add_axes(position) for position in positions]
+    for ax in axes:
+        ax.set_axis_off()
+    return fig, axes
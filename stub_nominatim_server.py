@@ -0,0 +1,62 @@
+import argparse
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Nominatim search API, so geocoding can be benchmarked and tested offline.
+# Every query resolves to a fixed pseudo-random location inside the Netherlands.
+
+
+# Function to derive a stable location from the query parameters
+def fake_location(query):
+    digest = hashlib.sha256(json.dumps(query, sort_keys=True).encode('utf-8')).digest()
+    lon = 3.4 + 3.8 * int.from_bytes(digest[:4], 'big') / 2 ** 32
+    lat = 50.8 + 2.7 * int.from_bytes(digest[4:8], 'big') / 2 ** 32
+    return lon, lat
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        time.sleep(self.latency)
+        if url.path.rstrip('/') != '/search':
+            self.send_json(404, {'error': f'Unknown endpoint {url.path}'})
+            return
+
+        query = {key: values[0] for key, values in parse_qs(url.query).items() if key not in ('format', 'limit')}
+        lon, lat = fake_location(query)
+        display_name = ', '.join(str(value) for key, value in sorted(query.items()))
+        self.send_json(200, [{'lat': str(lat), 'lon': str(lon), 'display_name': display_name}])
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to create a stub server; use port 0 to pick a free port
+def make_server(host='127.0.0.1', port=8081, latency=0.0):
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'latency': latency})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stub of the Nominatim search API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency)
+    print(f"Stub Nominatim running on http://{args.host}:{server.server_port}")
+    server.serve_forever()
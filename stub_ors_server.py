@@ -0,0 +1,129 @@
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenRouteService API, so the fetch pipeline can be run and tested offline.
+# Isochrones are circles whose radius grows with the requested range, and matrix durations are the
+# straight-line distance at the same average speed.
+
+# Assumed average speed (m/s) for 'time' ranges; 'distance' ranges are used as the radius directly
+AVERAGE_SPEED = 15.0
+
+
+# Function to build a circular polygon around a lon/lat location with a radius in meters
+def circle(lon, lat, radius, segments=32):
+    coordinates = []
+    for i in range(segments + 1):
+        angle = 2 * math.pi * (i % segments) / segments
+        dx = radius * math.cos(angle) / (111320 * math.cos(math.radians(lat)))
+        dy = radius * math.sin(angle) / 110540
+        coordinates.append([round(lon + dx, 6), round(lat + dy, 6)])
+    return {'type': 'Polygon', 'coordinates': [coordinates]}
+
+
+# Function to build an ORS-style isochrone response for a request body
+def isochrone_response(body):
+    features = []
+    for group_index, (lon, lat) in enumerate(body['locations']):
+        for value in sorted(body['range']):
+            radius = value * AVERAGE_SPEED if body.get('range_type', 'time') == 'time' else value
+            features.append({
+                'type': 'Feature',
+                'properties': {'group_index': group_index, 'value': value, 'center': [lon, lat]},
+                'geometry': circle(lon, lat, radius)
+            })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+# Function to build an ORS-style matrix response with the durations (s) from every source to every destination
+def matrix_response(body):
+    locations = body['locations']
+    sources = body.get('sources') or range(len(locations))
+    destinations = body.get('destinations') or range(len(locations))
+    durations = []
+    for source in sources:
+        lon1, lat1 = locations[int(source)]
+        row = []
+        for destination in destinations:
+            lon2, lat2 = locations[int(destination)]
+            # Haversine distance in meters
+            a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2 + math.cos(math.radians(lat1))
+                 * math.cos(math.radians(lat2)) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+            row.append(round(2 * 6371000 * math.asin(math.sqrt(a)) / AVERAGE_SPEED, 2))
+        durations.append(row)
+    return {'durations': durations,
+            'sources': [{'location': locations[int(index)]} for index in sources],
+            'destinations': [{'location': locations[int(index)]} for index in destinations]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    failure_rate = 0.0
+    latency = 0.0
+    # Largest number of routes (sources x destinations) in one matrix request, as on the public API
+    max_routes = 3500
+
+    def do_POST(self):
+        with self.server.count_lock:
+            self.server.request_count += 1
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        time.sleep(self.latency)
+
+        # Randomly answer with rate-limit or server errors to exercise the retry logic
+        if random.random() < self.failure_rate:
+            self.send_json(random.choice([429, 503]), {'error': 'stub failure'})
+            return
+
+        if re.fullmatch(r'/v2/isochrones/[\w-]+/geojson', self.path):
+            self.send_json(200, isochrone_response(body))
+        elif re.fullmatch(r'/v2/matrix/[\w-]+(/json)?', self.path):
+            routes = (len(body.get('sources') or body['locations'])
+                      * len(body.get('destinations') or body['locations']))
+            if routes > self.max_routes:
+                self.send_json(400, {'error': {'code': 6004, 'message': f'Request has {routes} routes, '
+                                                                      f'more than the limit of {self.max_routes}'}})
+            else:
+                self.send_json(200, matrix_response(body))
+        else:
+            self.send_json(404, {'error': f'Unknown endpoint {self.path}'})
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to create a stub server; use port 0 to pick a free port
+def make_server(host='127.0.0.1', port=8080, failure_rate=0.0, latency=0.0, max_routes=3500):
+    handler = type('ConfiguredStubHandler', (StubHandler,),
+                   {'failure_rate': failure_rate, 'latency': latency, 'max_routes': max_routes})
+    server = ThreadingHTTPServer((host, port), handler)
+    # Number of requests received, failed ones included
+    server.request_count = 0
+    server.count_lock = threading.Lock()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stub of the OpenRouteService API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests answered with 429/503')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--max-routes', type=int, default=3500, help='Largest matrix request that is answered')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.failure_rate, args.latency, args.max_routes)
+    print(f"Stub OpenRouteService running on http://{args.host}:{server.server_port}")
+    server.serve_forever()
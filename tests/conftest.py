@@ -0,0 +1,29 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# The scripts are top-level modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stub_ors_server  # noqa: E402
+
+
+# Fixture that starts a stub OpenRouteService server on a free port; call it with the make_server options
+# and use the returned base URL. The servers started so far are in its servers attribute.
+@pytest.fixture
+def stub_ors():
+    servers = []
+
+    def start(**options):
+        server = stub_ors_server.make_server(port=0, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+
+    start.servers = servers
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import band_animation
+from band_animation import FrameSink, check_output
+
+
+def test_gif_frames_are_written_one_at_a_time(tmp_path):
+    path = str(tmp_path / 'animation.gif')
+    frames = [np.full((40, 60, 3), value, dtype=np.uint8) for value in (0, 120, 250)]
+    frames[1][5:10, 5:10] = [255, 0, 0]
+    sink = FrameSink(path, 60, 40, fps=10)
+    for index, frame in enumerate(frames):
+        sink.write(frame, repeat=2)
+        # Every frame is on disk as soon as it is written
+        assert sink.gif.frames == index + 1
+    sink.close()
+
+    with Image.open(path) as image:
+        assert image.n_frames == 3 and image.info['loop'] == 0
+        for index, frame in enumerate(frames):
+            image.seek(index)
+            assert image.info['duration'] == 200
+            assert np.array_equal(np.asarray(image.convert('RGB')), frame)
+
+
+def test_output_extension_must_have_a_writer(monkeypatch):
+    monkeypatch.setattr(band_animation, 'output_formats', lambda: {'.mp4': False, '.gif': True})
+    check_output('animation.gif')
+    with pytest.raises(ValueError, match='ffmpeg'):
+        check_output('animation.mp4')
+    with pytest.raises(ValueError, match='use one of'):
+        check_output('animation.avi')
@@ -0,0 +1,51 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+from shapely.plotting import patch_from_polygon
+
+from band_engine import compute_rings, polygonal_parts
+from basemap_store import layer_digest, layer_path
+
+
+def test_polygonal_parts_drop_lines_and_points():
+    geometries = np.array([
+        shapely.GeometryCollection([shapely.box(0, 0, 1, 1), shapely.LineString([(1, 1), (2, 2)]), shapely.Point(3, 3)]),
+        shapely.LineString([(0, 0), (1, 1)]),
+        shapely.box(0, 0, 2, 2),
+    ], dtype=object)
+    parts = polygonal_parts(geometries)
+
+    assert shapely.get_type_id(parts).tolist() == [shapely.GeometryType.MULTIPOLYGON] * 3
+    assert shapely.area(parts).tolist() == [1.0, 0.0, 4.0]
+    assert shapely.is_empty(parts[1])
+    # Every non-empty result can be drawn as a patch, unlike the collection it came from
+    patch_from_polygon(parts[0])
+
+
+def test_compute_rings_are_disjoint_and_cover_the_outermost_threshold():
+    mask = shapely.box(0, 0, 100, 60).difference(shapely.box(40, 0, 45, 60).union(shapely.box(80, 20, 90, 30)))
+    centres = shapely.points([[20, 30], [70, 30]])
+    thresholds = [10, 25, 40]
+    rings = compute_rings([shapely.buffer(centres, distance) for distance in thresholds], thresholds, mask=mask)
+
+    geometries = rings.geometry.values
+    assert rings['lower'].tolist() == [0, 10, 25, 40]
+    for i in range(len(geometries)):
+        for j in range(i + 1, len(geometries)):
+            assert shapely.area(shapely.intersection(geometries[i], geometries[j])) < 1e-6
+    outermost = shapely.intersection(shapely.union_all(shapely.buffer(centres, thresholds[-1])), mask)
+    assert shapely.area(shapely.symmetric_difference(shapely.union_all(geometries[:-1]), outermost)) < 1e-6
+    assert shapely.area(shapely.union_all(geometries)) == pytest.approx(mask.area)
+
+
+def test_layer_digest_changes_when_the_base_map_is_written_again(tmp_path):
+    layer = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 1, 1)], crs='EPSG:28992')
+    for name in ('land_union', 'water'):
+        layer.to_parquet(layer_path(name, str(tmp_path)))
+    before = layer_digest(('land_union', 'water'), str(tmp_path))
+    assert layer_digest(('land_union', 'water'), str(tmp_path)) == before
+
+    gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 2, 2)], crs='EPSG:28992').to_parquet(
+        layer_path('water', str(tmp_path)))
+    assert layer_digest(('land_union', 'water'), str(tmp_path)) != before
@@ -0,0 +1,34 @@
+import geopandas as gpd
+import pytest
+import shapely
+
+from catchments import traveltime_catchments
+
+# A 20 x 10 km strip of land in the Dutch grid
+MASK = shapely.box(150000, 450000, 170000, 460000)
+
+
+def institutions(xs, codes, names):
+    points = gpd.GeoSeries(gpd.points_from_xy(xs, [455000.0] * len(xs)), crs='EPSG:28992').to_crs(epsg=4326)
+    return gpd.GeoDataFrame({'INSTELLINGSCODE': codes, 'INSTELLINGSNAAM': names, 'SOORT HO': 'hbo',
+                             'latitude': points.y, 'longitude': points.x}, geometry=points.values)
+
+
+# Square isochrones around every institution, half widths by range, in WGS 84 like the store's coordinates
+def isochrones(members, half_widths):
+    points = members.to_crs(epsg=28992)
+    rows = [{'SOORT HO': 'hbo', 'range': float(value), 'latitude': row['latitude'], 'longitude': row['longitude'],
+             'geometry': shapely.box(point.x - width, point.y - width, point.x + width, point.y + width)}
+            for (_, row), point in zip(members.iterrows(), points.geometry)
+            for value, width in half_widths.items()]
+    return gpd.GeoDataFrame(rows, crs='EPSG:28992').to_crs(epsg=4326)
+
+
+def test_campuses_with_the_same_name_get_their_own_isochrones():
+    members = institutions([153000, 167000], ['A1', 'A2'], ['Hogeschool', 'Hogeschool'])
+    result = traveltime_catchments(members, isochrones(members, {600: 2000, 1200: 6000}), resolution=500, mask=MASK)
+
+    west, east = result.loc['A1', 'geometry'], result.loc['A2', 'geometry']
+    assert result.loc['A1', 'area_km2'] == pytest.approx(result.loc['A2', 'area_km2'])
+    assert west.centroid.x < 160000 < east.centroid.x
+    assert not west.overlaps(east)
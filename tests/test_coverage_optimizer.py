@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+import shapely
+
+from band_engine import ring_frame
+from coverage_optimizer import gap_points
+
+# Three nested bands around the origin: within 10 km, 10 to 20 km and beyond 20 km (within 50 km here)
+RINGS = ring_frame([shapely.box(-10000, -10000, 10000, 10000),
+                    shapely.box(-20000, -20000, 20000, 20000).difference(shapely.box(-10000, -10000, 10000, 10000)),
+                    shapely.box(-50000, -50000, 50000, 50000).difference(shapely.box(-20000, -20000, 20000, 20000))],
+                   [10000, 20000])
+POPULATION = (shapely.points([[0, 0], [15000, 0], [30000, 0]]), np.array([1.0, 2.0, 4.0]))
+
+
+@pytest.mark.parametrize('threshold, weights', [(10000, [2.0, 4.0]), (20000, [4.0])])
+def test_gap_points_lie_beyond_the_threshold(threshold, weights):
+    _, gap_weights = gap_points(RINGS, threshold, population=POPULATION)
+    assert gap_weights.tolist() == weights
+
+
+def test_gap_points_reject_a_threshold_between_bands():
+    with pytest.raises(ValueError, match='not one of the band thresholds'):
+        gap_points(RINGS, 15000, population=POPULATION)
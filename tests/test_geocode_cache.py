@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from geocode_cache import MISS_RETRY_SECONDS, is_found, is_fresh, load_cache, location_to_entry, save_cache
+
+
+def test_misses_are_asked_again_once_they_are_old():
+    miss = location_to_entry(None, now=1000.0)
+    assert not is_found(miss)
+    assert is_fresh(miss, now=1000.0 + MISS_RETRY_SECONDS - 1)
+    assert not is_fresh(miss, now=1000.0 + MISS_RETRY_SECONDS)
+    # Misses of caches written before they had a time
+    assert not is_fresh(None)
+
+
+def test_found_locations_stay_fresh():
+    entry = location_to_entry(SimpleNamespace(address='Utrecht', latitude=52.09, longitude=5.12), now=0.0)
+    assert is_found(entry) and is_fresh(entry, now=10 ** 12)
+
+
+def test_save_cache_merges_into_the_cache_on_disk(tmp_path):
+    path = str(tmp_path / 'geocode_cache.json')
+    save_cache({'a': {'location': 'A', 'latitude': 1.0, 'longitude': 2.0}}, path)
+    save_cache({'b': location_to_entry(None, now=5.0)}, path)
+    assert set(load_cache(path)) == {'a', 'b'}
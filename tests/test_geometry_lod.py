@@ -0,0 +1,35 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from geometry_lod import LevelOfDetail, simplify_coverage
+
+# A wiggly province next to a water body, so simplification moves their shared edge
+COAST = shapely.LineString([(x, 50 + 3 * np.sin(x / 4)) for x in np.linspace(0, 100, 200)])
+LAND = shapely.box(0, 0, 100, 100).difference(shapely.box(0, 50, 100, 100)).union(
+    shapely.Polygon(list(COAST.coords) + [(100, 0), (0, 0)])).buffer(0)
+WATER = shapely.box(0, 0, 100, 100).difference(LAND)
+MAP = gpd.GeoDataFrame({'TYPE_1': ['Provincie', 'Water body']}, geometry=[LAND, WATER], crs='EPSG:28992')
+
+
+def rings():
+    inner = shapely.intersection(shapely.Point(50, 30).buffer(30), LAND)
+    collection = shapely.GeometryCollection([inner, shapely.LineString([(0, 0), (5, 5)])])
+    return gpd.GeoDataFrame({'band': [0, 1]}, geometry=[collection, LAND.difference(inner)], crs='EPSG:28992')
+
+
+def test_simplify_coverage_accepts_collections():
+    simplified = simplify_coverage(rings(), 2)
+    assert shapely.get_type_id(simplified.geometry.values).tolist() == [shapely.GeometryType.MULTIPOLYGON] * 2
+    assert simplified.area.sum() > 0
+
+
+def test_rings_follow_the_simplified_map():
+    basemap = LevelOfDetail(MAP, tolerances=[5])
+    detail = LevelOfDetail(rings(), tolerances=[5], clip_to=basemap)
+    simplified_rings = detail.at(10)
+    land = basemap.land(5)
+
+    covered = shapely.union_all(simplified_rings.geometry.values)
+    assert shapely.area(shapely.difference(covered, land)) < 1e-6
+    assert shapely.area(shapely.difference(land, covered)) < 0.01 * land.area
@@ -0,0 +1,37 @@
+import os
+
+import pandas as pd
+
+from institution_loader import load_institutions
+
+
+def test_changing_a_loaded_frame_leaves_the_cache_intact(tmp_path):
+    path = tmp_path / 'Geodata_prepared.csv'
+    pd.DataFrame({'SOORT HO': ['hbo', 'wo', 'hbo'], 'INSTELLINGSNAAM': ['A', 'B', 'C'],
+                  'latitude': [52.0, 52.1, None], 'longitude': [5.0, 5.1, 5.2]}).to_csv(path, index=False)
+    options = dict(path=str(path), cache_dir=str(tmp_path / 'cache'))
+
+    first = load_institutions(('SOORT HO', 'INSTELLINGSNAAM'), **options)
+    assert len(first) == 2 and first['SOORT HO'].dtype == 'category'
+    first['SOORT HO'] = first['SOORT HO'].astype(str)
+    first.loc[0, 'INSTELLINGSNAAM'] = 'changed'
+
+    second = load_institutions(('SOORT HO', 'INSTELLINGSNAAM'), **options)
+    assert second['SOORT HO'].dtype == 'category'
+    assert second['INSTELLINGSNAAM'].tolist() == ['A', 'B']
+
+
+def test_cache_follows_edits_and_requested_column_order(tmp_path):
+    path = tmp_path / 'Geodata_prepared.csv'
+    options = dict(path=str(path), cache_dir=str(tmp_path / 'cache'))
+    pd.DataFrame({'SOORT HO': ['hbo'], 'INSTELLINGSNAAM': ['A'], 'latitude': [52.0], 'longitude': [5.0]}).to_csv(
+        path, index=False)
+    assert load_institutions(('SOORT HO', 'INSTELLINGSNAAM'), **options).columns.tolist() == [
+        'SOORT HO', 'INSTELLINGSNAAM', 'geometry']
+    assert load_institutions(('INSTELLINGSNAAM', 'SOORT HO'), **options).columns.tolist() == [
+        'INSTELLINGSNAAM', 'SOORT HO', 'geometry']
+
+    pd.DataFrame({'SOORT HO': ['wo', 'hbo'], 'INSTELLINGSNAAM': ['B', 'C'], 'latitude': [52.0, 52.1],
+                  'longitude': [5.0, 5.1]}).to_csv(path, index=False)
+    os.utime(path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+    assert load_institutions(('INSTELLINGSNAAM', 'SOORT HO'), **options)['INSTELLINGSNAAM'].tolist() == ['B', 'C']
@@ -0,0 +1,23 @@
+import threading
+
+from instrumentation import drain, stage
+
+
+def test_nested_stages_share_one_memory_sampler():
+    drain()
+    before = threading.active_count()
+    with stage('outer'):
+        during = threading.active_count()
+        for _ in range(50):
+            with stage('inner'):
+                assert threading.active_count() == during
+        blob = bytearray(50 * 1024 ** 2)
+        with stage('allocate'):
+            blob[::4096] = b'x' * len(blob[::4096])
+    assert during == before + 1
+    assert threading.active_count() == before
+
+    stages = drain()['stages']
+    assert stages['outer/inner']['calls'] == 50
+    assert stages['outer']['peak_rss_mb'] >= stages['outer/inner']['peak_rss_mb'] > 0
+    assert stages['outer/allocate']['peak_rss_mb'] >= stages['outer/inner']['peak_rss_mb'] + 40
@@ -0,0 +1,96 @@
+import random
+import time
+
+from isochrone_cache import IsochroneCache
+from isochrone_fetcher import IsochroneFetcher, TokenBucket, is_retriable
+
+
+def isochrone_job(lon, lat, ranges=(600, 1200)):
+    return {'locations': [[lon, lat]], 'profile': 'driving-car', 'range': list(ranges)}
+
+
+def test_token_bucket_spreads_requests_over_the_budget():
+    bucket = TokenBucket(requests_per_minute=600, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # One token up front, then one every 0.1 s
+    assert time.monotonic() - start >= 0.45
+
+
+def test_fetch_all_returns_every_response(stub_ors):
+    fetcher = IsochroneFetcher('key', base_url=stub_ors(), requests_per_minute=10 ** 6)
+    jobs = [isochrone_job(5.0 + i / 10, 52.0) for i in range(5)]
+    results = dict(fetcher.fetch_all(jobs))
+    assert sorted(results) == list(range(5))
+    for index, response in results.items():
+        assert [feature['properties']['value'] for feature in response['features']] == [600, 1200]
+        assert response['features'][0]['properties']['center'] == jobs[index]['locations'][0]
+    assert fetcher.request_count == 5
+
+
+def test_fetch_retries_429_and_5xx_responses(stub_ors):
+    random.seed(1)
+    fetcher = IsochroneFetcher('key', base_url=stub_ors(failure_rate=0.5), requests_per_minute=10 ** 6,
+                               max_retries=20, backoff_seconds=0.001)
+    jobs = [isochrone_job(5.0 + i / 10, 52.0) for i in range(8)]
+    results = dict(fetcher.fetch_all(jobs))
+    assert all(response is not None for response in results.values())
+    assert len(results) == 8
+    assert fetcher.request_count > 8
+    assert stub_ors.servers[0].request_count == fetcher.request_count
+
+
+def test_fetch_all_yields_none_when_retries_run_out(stub_ors):
+    fetcher = IsochroneFetcher('key', base_url=stub_ors(failure_rate=1.0), requests_per_minute=10 ** 6,
+                               max_retries=2, backoff_seconds=0.001)
+    results = dict(fetcher.fetch_all([isochrone_job(5.0, 52.0), isochrone_job(6.0, 52.0)]))
+    assert results == {0: None, 1: None}
+    # Every attempt reaches the server once and is counted, with no retries hidden below the fetcher
+    assert stub_ors.servers[0].request_count == 2 * 3
+    assert fetcher.request_count == 2 * 3
+
+
+def test_failed_request_reports_the_status(stub_ors, capsys):
+    fetcher = IsochroneFetcher('key', base_url=stub_ors(failure_rate=1.0), requests_per_minute=10 ** 6,
+                               max_retries=0)
+    assert dict(fetcher.fetch_all([isochrone_job(5.0, 52.0)])) == {0: None}
+    output = capsys.readouterr().out
+    assert 'HTTP 429' in output or 'HTTP 503' in output
+    assert fetcher.errors[0].status in (429, 503) and is_retriable(fetcher.errors[0])
+
+
+def test_cache_serves_hits_and_sends_only_misses(stub_ors, tmp_path):
+    cache = IsochroneCache(str(tmp_path))
+    url = stub_ors()
+    jobs = [isochrone_job(5.0, 52.0), isochrone_job(6.0, 52.0)]
+    first = dict(IsochroneFetcher('key', base_url=url, requests_per_minute=10 ** 6, cache=cache).fetch_all(jobs))
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    fetcher = IsochroneFetcher('key', base_url=url, requests_per_minute=10 ** 6, cache=cache)
+    second = dict(fetcher.fetch_all(jobs + [isochrone_job(7.0, 52.0)]))
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert fetcher.request_count == 1
+    assert second[0] == first[0] and second[1] == first[1]
+
+
+def test_cache_key_ignores_rounding_noise_but_not_parameters(tmp_path):
+    cache = IsochroneCache(str(tmp_path))
+    assert cache.key(isochrone_job(5.0, 52.0)) == cache.key(isochrone_job(5.0000001, 52.0))
+    assert cache.key(isochrone_job(5.0, 52.0)) != cache.key(isochrone_job(5.0, 52.0, ranges=(600,)))
+
+
+def test_cache_evicts_least_recently_used_entry(tmp_path):
+    cache = IsochroneCache(str(tmp_path), max_entries=2)
+    a, b, c = isochrone_job(5.0, 52.0), isochrone_job(6.0, 52.0), isochrone_job(7.0, 52.0)
+    cache.put(a, {'id': 'a'})
+    time.sleep(0.01)
+    cache.put(b, {'id': 'b'})
+    time.sleep(0.01)
+    # Using a makes b the least recently used entry
+    assert cache.get(a) == {'id': 'a'}
+    time.sleep(0.01)
+    cache.put(c, {'id': 'c'})
+    assert cache.get(b) is None
+    assert cache.get(a) == {'id': 'a'} and cache.get(c) == {'id': 'c'}
+    assert len(list(tmp_path.glob('*.json'))) == 2
@@ -0,0 +1,107 @@
+import json
+
+import pandas as pd
+
+from isochrone_store import StoreWriter, read_isochrones, store_paths
+from isochrone_writer import IsochroneWriter, institution_key
+
+PARAMETERS = {'profile': 'driving-car', 'range': [600, 1200]}
+
+
+def institution(name, lon, lat, category='hbo'):
+    return pd.Series({'INSTELLINGSNAAM': name, 'SOORT HO': category, 'longitude': lon, 'latitude': lat})
+
+
+def response(lon, lat, ranges=(600, 1200)):
+    features = []
+    for value in ranges:
+        size = value / 60000
+        ring = [[lon - size, lat - size], [lon + size, lat - size], [lon + size, lat + size], [lon - size, lat + size],
+                [lon - size, lat - size]]
+        features.append({'type': 'Feature', 'properties': {'value': value},
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def writer(tmp_path):
+    return IsochroneWriter(PARAMETERS, path=str(tmp_path / 'partial.geojsonseq'),
+                           manifest_path=str(tmp_path / 'partial.json'))
+
+
+def test_unfinished_run_resumes_after_the_committed_institutions(tmp_path):
+    first = writer(tmp_path)
+    row = institution('Campus A', 5.0, 52.0)
+    first.append(institution_key(row), row, response(5.0, 52.0))
+    first.close()
+
+    second = writer(tmp_path)
+    assert second.done == {institution_key(row)}
+    second.close()
+    assert IsochroneWriter({'profile': 'cycling-regular'}, path=second.path,
+                           manifest_path=second.manifest_path).done == set()
+
+
+def test_finalize_streams_every_institution_into_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = [institution('Campus', 5.0, 52.0), institution('Campus', 6.0, 52.5), institution('School', 5.5, 51.5, 'wo')]
+    run = writer(tmp_path)
+    for row in rows:
+        run.append(institution_key(row), row, response(row['longitude'], row['latitude']))
+    store_dir = str(tmp_path / 'store')
+    run.finalize(str(tmp_path / 'all_isochrones.geojson'), StoreWriter(store_dir=store_dir))
+
+    assert not (tmp_path / 'partial.geojsonseq').exists() and not (tmp_path / 'partial.json').exists()
+    with open(tmp_path / 'all_isochrones.geojson', encoding='utf-8') as f:
+        assert len(json.load(f)['features']) == 6
+
+    # The two campuses of the same name are separate institutions, each with its own isochrones
+    isochrones = read_isochrones(columns=('INSTELLINGSNAAM', 'SOORT HO', 'longitude', 'range'), store_dir=store_dir)
+    assert sorted(zip(isochrones['INSTELLINGSNAAM'], isochrones['longitude'], isochrones['range'])) == [
+        ('Campus', 5.0, 600.0), ('Campus', 5.0, 1200.0), ('Campus', 6.0, 600.0), ('Campus', 6.0, 1200.0),
+        ('School', 5.5, 600.0), ('School', 5.5, 1200.0)]
+    assert len(read_isochrones(('wo',), (1200,), store_dir=store_dir)) == 1
+    assert len(pd.read_parquet(store_paths(store_dir=store_dir)[1])) == 3
+
+
+def finalize_run(tmp_path, rows, profile='driving-car'):
+    run = writer(tmp_path)
+    for row in rows:
+        run.append(institution_key(row), row, response(row['longitude'], row['latitude']))
+    run.finalize(str(tmp_path / 'all_isochrones.geojson'), StoreWriter(profile, store_dir=str(tmp_path / 'store')))
+
+
+def test_removed_institutions_leave_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store_dir = str(tmp_path / 'store')
+    first, second, third = institution('A', 5.0, 52.0), institution('B', 6.0, 52.5), institution('C', 5.5, 51.5)
+    finalize_run(tmp_path, [first, second], profile='cycling-regular')
+    finalize_run(tmp_path, [first, second])
+    finalize_run(tmp_path, [first, third])
+
+    institutions = pd.read_parquet(store_paths(store_dir=store_dir)[1])
+    assert sorted(institutions['INSTELLINGSNAAM']) == ['A', 'C']
+    # C gets a new id, not the one B had
+    assert institutions['institution_id'].is_unique and institutions['institution_id'].max() == 2
+    assert sorted(read_isochrones(columns=('INSTELLINGSNAAM', 'range'), store_dir=store_dir)['INSTELLINGSNAAM']) == [
+        'A', 'A', 'C', 'C']
+    # The other profile still has B's isochrones, but B is no longer an institution
+    cycling = read_isochrones(columns=('INSTELLINGSNAAM', 'range'), profile='cycling-regular', store_dir=store_dir)
+    assert sorted(cycling['INSTELLINGSNAAM']) == ['A', 'A']
+
+
+def test_finalize_with_failures_keeps_the_run_resumable(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store_dir = str(tmp_path / 'store')
+    done, failed = institution('A', 5.0, 52.0), institution('B', 6.0, 52.5)
+    run = writer(tmp_path)
+    run.append(institution_key(done), done, response(5.0, 52.0))
+    run.finalize(str(tmp_path / 'all_isochrones.geojson'), StoreWriter(store_dir=store_dir), keep_partial=True)
+
+    # The output holds what succeeded, and a rerun still only needs the failed institution
+    assert set(read_isochrones(columns=('INSTELLINGSNAAM',), store_dir=store_dir)['INSTELLINGSNAAM']) == {'A'}
+    rerun = writer(tmp_path)
+    assert rerun.done == {institution_key(done)}
+    rerun.append(institution_key(failed), failed, response(6.0, 52.5))
+    rerun.finalize(str(tmp_path / 'all_isochrones.geojson'), StoreWriter(store_dir=store_dir))
+    assert set(read_isochrones(columns=('INSTELLINGSNAAM',), store_dir=store_dir)['INSTELLINGSNAAM']) == {'A', 'B'}
+    assert not (tmp_path / 'partial.json').exists()
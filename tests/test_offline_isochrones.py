@@ -0,0 +1,57 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from offline_isochrones import RoadGraph, offline_isochrones, way_speed
+
+
+@pytest.mark.parametrize('tags, speed', [
+    ({'highway': 'residential', 'maxspeed': '50'}, 50),
+    ({'highway': 'residential', 'maxspeed': '50 km/h'}, 50),
+    ({'highway': 'residential', 'maxspeed': '30 mph'}, 30 * 1.609344),
+    ({'highway': 'residential', 'maxspeed': 'NL:urban'}, 30),
+    ({'highway': 'motorway'}, 100),
+])
+def test_way_speed(tags, speed):
+    assert way_speed(tags) == pytest.approx(speed)
+
+
+# A straight two-way road of 11 nodes, 1 km apart, 60 s per kilometre
+def line_graph():
+    x = np.arange(11) * 1000.0 + 150000
+    y = np.full(11, 450000.0)
+    rows = np.concatenate([np.arange(10), np.arange(1, 11)])
+    cols = np.concatenate([np.arange(1, 11), np.arange(10)])
+    return RoadGraph(x, y, csr_matrix((np.full(20, 60.0), (rows, cols)), shape=(11, 11)))
+
+
+def institutions(xs, names):
+    return gpd.GeoDataFrame({'SOORT HO': 'hbo', 'INSTELLINGSNAAM': names, 'latitude': 52.0, 'longitude': 5.0},
+                            geometry=gpd.points_from_xy(xs, [450000.0] * len(xs)), crs='EPSG:28992')
+
+
+def test_institutions_split_the_network_between_them():
+    result = offline_isochrones(line_graph(), institutions([150000, 160000], ['West', 'East']), [120, 300],
+                                resolution=250)
+    assert sorted(zip(result['INSTELLINGSNAAM'], result['range'])) == [
+        ('East', 120), ('East', 300), ('West', 120), ('West', 300)]
+    areas = result.to_crs(epsg=28992).set_index(['INSTELLINGSNAAM', 'range']).area
+    assert areas['West', 300] == pytest.approx(areas['East', 300])
+    assert areas['West', 120] < areas['West', 300]
+
+
+def test_institutions_on_the_same_node_share_its_area():
+    result = offline_isochrones(line_graph(), institutions([150000, 150010, 160000], ['First', 'Second', 'East']),
+                                [120, 300], resolution=250)
+    assert sorted(zip(result['INSTELLINGSNAAM'], result['range'])) == [
+        ('East', 120), ('East', 300), ('First', 120), ('First', 300), ('Second', 120), ('Second', 300)]
+    areas = result.to_crs(epsg=28992).set_index(['INSTELLINGSNAAM', 'range']).area
+    assert areas['First', 300] == pytest.approx(areas['Second', 300])
+    assert areas['First', 120] == pytest.approx(areas['Second', 120])
+
+
+def test_no_reachable_cells_gives_an_empty_frame():
+    result = offline_isochrones(line_graph(), institutions([150000], ['Only']), [1])
+    assert result.empty
+    assert {'INSTELLINGSNAAM', 'SOORT HO', 'range'} <= set(result.columns)
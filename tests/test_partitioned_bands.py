@@ -0,0 +1,40 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+import partitioned_bands
+from band_engine import compute_rings
+from partitioned_bands import partition_members, partition_rings, partition_windows, stitch_rings
+
+THRESHOLDS = [5000, 10000]
+
+
+def test_partitions_overlay_only_their_window_and_stitch_to_the_national_rings(monkeypatch):
+    land = shapely.box(0, 0, 100000, 10000)
+    masks = pd.Series([shapely.box(0, 0, 50000, 10000), shapely.box(50000, 0, 100000, 10000)], index=['West', 'East'])
+    points = gpd.GeoDataFrame({'PROVINCIE': ['West', 'West', 'East']},
+                              geometry=gpd.points_from_xy([10000, 45000, 80000], [5000] * 3), crs='EPSG:28992')
+    margin = max(THRESHOLDS)
+    windows = partition_windows(masks, margin, land)
+
+    # Record what every partition overlays
+    work = []
+
+    def recording_rings(geometries, thresholds, mask=None, crs='EPSG:28992'):
+        work.append((mask, sum(len(values) for values in geometries)))
+        return compute_rings(geometries, thresholds, mask, crs)
+
+    monkeypatch.setattr(partitioned_bands, 'compute_rings', recording_rings)
+    pieces = [partition_rings('distance', 'hbo', THRESHOLDS, masks[name], windows[name],
+                              partition_members(points, name, masks[name], margin))[0] for name in masks.index]
+
+    # Every partition overlays only the land within the margin and the institutions that reach it
+    for window, geometries in work:
+        assert shapely.area(window) == pytest.approx(60000 * 10000) and shapely.area(window) < shapely.area(land)
+        assert geometries == 2 * len(THRESHOLDS) < len(points) * len(THRESHOLDS)
+
+    national = compute_rings([points.buffer(distance).values for distance in THRESHOLDS], THRESHOLDS, mask=land)
+    stitched = stitch_rings(pieces, THRESHOLDS)
+    difference = shapely.symmetric_difference(stitched.geometry.values, national.geometry.values)
+    assert (shapely.area(difference) < 1e-3).all()
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from stub_ors_server import matrix_response
+from traveltime_matrix import MatrixFetcher, chunk_sizes, duration_matrix, matrix_jobs, nearest_by_category
+
+# A small route limit, so a handful of locations already needs several requests
+MAX_ROUTES = 12
+
+
+def grid_locations(n, lon=5.0, lat=52.0):
+    return np.column_stack([lon + np.arange(n) * 0.05, lat + np.arange(n) % 3 * 0.05])
+
+
+@pytest.mark.parametrize('n_origins, n_destinations', [(1, 1), (5, 7), (30, 4), (3, 40), (40, 40), (7, 0), (0, 7)])
+def test_chunk_sizes_respect_the_route_limit(n_origins, n_destinations):
+    origins, destinations = chunk_sizes(n_origins, n_destinations, MAX_ROUTES)
+    assert origins >= 1 and destinations >= 1
+    assert origins * destinations <= MAX_ROUTES
+
+
+def test_chunk_sizes_respect_the_location_limit():
+    origins, destinations = chunk_sizes(50, 50, max_routes=3500, max_locations=25)
+    assert origins + destinations <= 25
+
+
+@pytest.mark.parametrize('max_locations', [2, 3, 4])
+@pytest.mark.parametrize('n_origins, n_destinations', [(1, 1), (5, 7), (7, 0), (0, 7)])
+def test_chunk_sizes_with_few_locations_keep_one_origin_and_destination(n_origins, n_destinations, max_locations):
+    origins, destinations = chunk_sizes(n_origins, n_destinations, max_routes=3500, max_locations=max_locations)
+    assert origins >= 1 and destinations >= 1
+    assert origins + destinations <= max_locations
+
+
+@pytest.mark.parametrize('max_routes, max_locations', [(3500, 1), (3500, 0), (0, None)])
+def test_chunk_sizes_reject_limits_without_room_for_a_pair(max_routes, max_locations):
+    with pytest.raises(ValueError):
+        chunk_sizes(5, 5, max_routes=max_routes, max_locations=max_locations)
+
+
+@pytest.mark.parametrize('n_origins, n_destinations', [(5, 7), (30, 4), (3, 40), (0, 7), (7, 0)])
+def test_matrix_jobs_cover_every_pair_once_within_the_limit(n_origins, n_destinations):
+    jobs, blocks = matrix_jobs(grid_locations(n_origins), grid_locations(n_destinations, lat=51.0),
+                               max_routes=MAX_ROUTES)
+    covered = np.zeros((n_origins, n_destinations), dtype=int)
+    for job, (origin_block, destination_block) in zip(jobs, blocks):
+        assert len(job['sources']) * len(job['destinations']) <= MAX_ROUTES
+        assert len(job['locations']) == len(job['sources']) + len(job['destinations'])
+        covered[origin_block, destination_block] += 1
+    assert (covered == 1).all()
+
+
+def test_duration_matrix_fills_every_block(stub_ors):
+    origins, destinations = grid_locations(7), grid_locations(9, lat=51.5)
+    fetcher = MatrixFetcher('key', base_url=stub_ors(max_routes=MAX_ROUTES), requests_per_minute=10 ** 6)
+    durations, requests = duration_matrix(fetcher, origins, destinations, max_routes=MAX_ROUTES)
+
+    assert durations.shape == (7, 9)
+    assert requests > 1 and fetcher.request_count == requests
+    expected = matrix_response({'locations': np.concatenate([origins, destinations]).tolist(),
+                                'sources': list(range(7)), 'destinations': list(range(7, 16))})['durations']
+    np.testing.assert_allclose(durations, expected)
+
+
+def test_duration_matrix_leaves_requests_over_the_limit_empty(stub_ors):
+    fetcher = MatrixFetcher('key', base_url=stub_ors(max_routes=MAX_ROUTES), requests_per_minute=10 ** 6)
+    # Asking for larger requests than the server answers: every request fails and nothing is filled in
+    durations, _ = duration_matrix(fetcher, grid_locations(6), grid_locations(6, lat=51.5), max_routes=36)
+    assert np.isnan(durations).all()
+
+
+def test_nearest_by_category_picks_the_minimum_per_category():
+    durations = np.array([
+        [300.0, 100.0, 50.0, np.nan],
+        [np.nan, 200.0, np.nan, np.nan],
+        [np.nan, np.nan, np.nan, 700.0],
+    ])
+    result = nearest_by_category(durations, ['hbo', 'hbo', 'wo', 'wo'])
+
+    times, nearest = result['hbo']
+    np.testing.assert_array_equal(times, [100.0, 200.0, np.nan])
+    np.testing.assert_array_equal(nearest, [1, 1, -1])
+    times, nearest = result['wo']
+    np.testing.assert_array_equal(times, [50.0, np.nan, 700.0])
+    np.testing.assert_array_equal(nearest, [2, -1, 3])
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from matplotlib.figure import Figure
+
+import geomap_distance_to_HO
+import geomap_traveltime_to_HO
+from band_engine import distance_rings, traveltime_rings
+from institution_loader import load_institutions
+from isochrone_store import load_isochrones
+
+# Output directory of the tile pyramid
+TILES_DIR = os.path.join('Visuals', 'tiles')
+
+# Half the width of the Web Mercator (EPSG:3857) world, in meters
+WORLD_HALF_WIDTH = 20037508.342789244
+TILE_SIZE = 256
+
+
+# Function to compute the EPSG:3857 bounds of tile (x, y) at zoom level z
+def tile_bounds(z, x, y):
+    size = 2 * WORLD_HALF_WIDTH / 2 ** z
+    minx = -WORLD_HALF_WIDTH + x * size
+    maxy = WORLD_HALF_WIDTH - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+# Function to list the tiles at zoom level z that overlap the given EPSG:3857 bounds
+def tiles_for_bounds(bounds, z):
+    size = 2 * WORLD_HALF_WIDTH / 2 ** z
+    x0 = max(0, math.floor((bounds[0] + WORLD_HALF_WIDTH) / size))
+    x1 = min(2 ** z - 1, math.floor((bounds[2] + WORLD_HALF_WIDTH) / size))
+    y0 = max(0, math.floor((WORLD_HALF_WIDTH - bounds[3]) / size))
+    y1 = min(2 ** z - 1, math.floor((WORLD_HALF_WIDTH - bounds[1]) / size))
+    return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+# A tile layer: polygons (band rings) or points, each with its own color, in EPSG:3857
+class TileLayer:
+    def __init__(self, name, gdf, colors, markersize=None):
+        gdf = gdf.to_crs(epsg=3857)
+        self.name = name
+        self.geometries = gdf.geometry.values
+        self.colors = list(colors)
+        self.markersize = markersize
+        self.tree = shapely.STRtree(self.geometries)
+        self.bounds = gdf.total_bounds
+
+    # Function to clip the layer to a tile; returns the clipped geometries and their colors
+    def clip(self, bounds):
+        # Include a margin for point markers, so markers on a tile edge are drawn on both tiles
+        margin = (bounds[2] - bounds[0]) * 0.05 if self.markersize else 0
+        bounds = (bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+        index = np.sort(self.tree.query(shapely.box(*bounds)))
+        clipped = shapely.clip_by_rect(self.geometries[index], *bounds)
+        keep = ~shapely.is_empty(clipped)
+        return clipped[keep], [self.colors[i] for i in index[keep]]
+
+
+# Function to fingerprint the content of one tile, so unchanged tiles can be skipped on rerun
+def tile_hash(geometries, colors, markersize):
+    digest = hashlib.sha256(repr((colors, markersize)).encode('utf-8'))
+    for wkb in shapely.to_wkb(geometries):
+        digest.update(wkb)
+    return digest.hexdigest()
+
+
+# Layers and reusable figure of a worker process
+_layers = {}
+_figure = None
+
+
+def init_worker(layers):
+    global _figure
+    _layers.update({layer.name: layer for layer in layers})
+    _figure = Figure(figsize=(TILE_SIZE / 100, TILE_SIZE / 100), dpi=100)
+    _figure.add_axes([0, 0, 1, 1])
+
+
+# Function to render a tile if its content changed; returns its key and hash (None if it is empty)
+def render_tile(layer_name, z, x, y, previous_hash, output_dir):
+    layer = _layers[layer_name]
+    bounds = tile_bounds(z, x, y)
+    geometries, colors = layer.clip(bounds)
+    path = os.path.join(output_dir, layer_name, str(z), str(x), f'{y}.png')
+    key = f'{z}/{x}/{y}'
+    if len(geometries) == 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return key, None
+
+    content_hash = tile_hash(geometries, colors, layer.markersize)
+    if content_hash == previous_hash and os.path.exists(path):
+        return key, content_hash
+
+    ax = _figure.axes[0]
+    ax.clear()
+    ax.set_axis_off()
+    if layer.markersize:
+        gpd.GeoSeries(geometries).plot(ax=ax, color=colors, markersize=layer.markersize,
+                                       edgecolor='white', linewidth=0.5)
+    else:
+        gpd.GeoSeries(geometries).plot(ax=ax, color=colors, linewidth=0)
+    ax.set_xlim(bounds[0], bounds[2])
+    ax.set_ylim(bounds[1], bounds[3])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _figure.savefig(path, transparent=True)
+    return key, content_hash
+
+
+# Function to build the tile layers: band rings per category for both figures, plus institution points
+def build_layers():
+    gdf = load_institutions(('SOORT HO',))
+    travel_time_gdf = load_isochrones(tuple(geomap_traveltime_to_HO.desired_order),
+                                      tuple(geomap_traveltime_to_HO.travel_time_ranges))
+    layers = []
+    for category in geomap_traveltime_to_HO.desired_order:
+        rings = traveltime_rings(travel_time_gdf, category, geomap_traveltime_to_HO.travel_time_ranges)
+        colors = geomap_traveltime_to_HO.colors[:len(rings) - 1] + ['red']
+        layers.append(TileLayer(f'traveltime_{category}', rings, colors))
+
+        rings = distance_rings(gdf, category, geomap_distance_to_HO.buffer_distances)
+        layers.append(TileLayer(f'distance_{category}', rings, geomap_distance_to_HO.colors))
+
+        points = gdf[gdf['SOORT HO'] == category]
+        color = geomap_traveltime_to_HO.category_colors[category]['facecolor']
+        layers.append(TileLayer(f'points_{category}', points, [color] * len(points), markersize=20))
+    return layers
+
+
+# Function to write a minimal Leaflet viewer for the tile layers
+def write_viewer(layers, min_zoom, max_zoom, output_dir):
+    names = json.dumps([layer.name for layer in layers])
+    html = f'''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Accessibility of higher education</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #map {{ height: 100%; margin: 0; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map('map').setView([52.2, 5.3], 8);
+var overlays = {{}};
+{names}.forEach(function (name) {{
+    overlays[name] = L.tileLayer(name + '/{{z}}/{{x}}/{{y}}.png', {{minZoom: {min_zoom}, maxNativeZoom: {max_zoom}, opacity: 0.8}});
+}});
+overlays[{json.dumps(layers[0].name)}].addTo(map);
+L.control.layers(null, overlays).addTo(map);
+</script>
+</body>
+</html>
+'''
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+# Function to export every layer as an XYZ tile pyramid, rewriting only tiles whose content changed
+def export_tiles(min_zoom=6, max_zoom=11, output_dir=TILES_DIR, processes=None):
+    layers = build_layers()
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    jobs = []
+    for layer in layers:
+        for z in range(min_zoom, max_zoom + 1):
+            for _, x, y in tiles_for_bounds(layer.bounds, z):
+                previous_hash = manifest.get(layer.name, {}).get(f'{z}/{x}/{y}')
+                jobs.append((layer.name, z, x, y, previous_hash, output_dir))
+
+    new_manifest = {layer.name: {} for layer in layers}
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(layers,)) as executor:
+        results = executor.map(render_tile, *zip(*jobs), chunksize=16)
+        for job, (key, content_hash) in zip(jobs, results):
+            if content_hash is not None:
+                new_manifest[job[0]][key] = content_hash
+                rendered += content_hash != job[4]
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(new_manifest, f)
+    write_viewer(layers, min_zoom, max_zoom, output_dir)
+    print(f"{rendered} of {len(jobs)} tiles rewritten in {output_dir}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the accessibility bands as an XYZ tile pyramid.')
+    parser.add_argument('--min-zoom', type=int, default=6)
+    parser.add_argument('--max-zoom', type=int, default=11)
+    parser.add_argument('--output-dir', default=TILES_DIR)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    export_tiles(args.min_zoom, args.max_zoom, args.output_dir, args.processes)
+    print(f"Serve the tiles with: python -m http.server --directory {args.output_dir}")
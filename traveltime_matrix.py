@@ -0,0 +1,178 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from basemap_store import MUNICIPALITY_COLUMN, load_layer, region_layer
+from institution_loader import load_institutions
+from instrumentation import count, report_at_exit, stage
+from isochrone_fetcher import DEFAULT_BASE_URL, IsochroneFetcher
+
+# Nearest travel time per origin and category, written by this script
+OUTPUT_PATH = os.path.join('Data', 'traveltime_matrix.csv')
+
+# Limits of one matrix request on the public OpenRouteService API: sources x destinations, and the number
+# of locations in the request (sources and destinations together)
+MAX_ROUTES = 3500
+MAX_LOCATIONS = None
+
+
+# Fetcher for the matrix endpoint, with the same request budget, retries and per-thread sessions
+class MatrixFetcher(IsochroneFetcher):
+    name = 'matrix'
+
+    def request(self, job):
+        return self.post(f"/v2/matrix/{job['profile']}/json", job)
+
+    def describe(self, job):
+        return f"{len(job['sources'])} origins x {len(job['destinations'])} destinations"
+
+
+# Function to choose how many origins and destinations go into one request: as many destinations as
+# allowed, then as many origins as fit, so a few dozen requests cover thousands of pairs. Both are at least
+# 1, so they can be used as steps even when there are no origins or destinations. A request needs at least
+# one origin and one destination, so max_locations must be at least 2.
+def chunk_sizes(n_origins, n_destinations, max_routes=MAX_ROUTES, max_locations=MAX_LOCATIONS):
+    if max_routes < 1 or (max_locations is not None and max_locations < 2):
+        raise ValueError(f"A matrix request needs at least 1 route and 2 locations, not max_routes={max_routes} "
+                         f"and max_locations={max_locations}")
+    destinations = max(1, min(n_destinations, max_routes))
+    if max_locations is not None:
+        destinations = max(1, min(destinations, max_locations - 1))
+    origins = max(1, min(n_origins, max_routes // destinations))
+    if max_locations is not None:
+        origins = max(1, min(origins, max_locations - destinations))
+    return origins, destinations
+
+
+# Function to build the matrix requests for lon/lat arrays of origins and destinations. Returns the jobs
+# and, for every job, the slices of the origins and destinations it covers.
+def matrix_jobs(origins, destinations, profile='driving-car', max_routes=MAX_ROUTES, max_locations=MAX_LOCATIONS):
+    origin_size, destination_size = chunk_sizes(len(origins), len(destinations), max_routes, max_locations)
+    jobs, blocks = [], []
+    for origin_start in range(0, len(origins), origin_size):
+        origin_block = slice(origin_start, min(origin_start + origin_size, len(origins)))
+        for destination_start in range(0, len(destinations), destination_size):
+            destination_block = slice(destination_start, min(destination_start + destination_size, len(destinations)))
+            locations = np.concatenate([origins[origin_block], destinations[destination_block]]).tolist()
+            n_origins = origin_block.stop - origin_block.start
+            jobs.append({
+                'locations': locations,
+                'profile': profile,
+                'sources': list(range(n_origins)),
+                'destinations': list(range(n_origins, len(locations))),
+                'metrics': ['duration']
+            })
+            blocks.append((origin_block, destination_block))
+    return jobs, blocks
+
+
+# Function to request the full origin x destination duration matrix (s). Unreachable pairs and pairs of
+# failed requests are NaN.
+def duration_matrix(fetcher, origins, destinations, profile='driving-car', max_routes=MAX_ROUTES,
+                    max_locations=MAX_LOCATIONS):
+    origins = np.asarray(origins, dtype=float)
+    destinations = np.asarray(destinations, dtype=float)
+    jobs, blocks = matrix_jobs(origins, destinations, profile, max_routes, max_locations)
+    durations = np.full((len(origins), len(destinations)), np.nan)
+    for job_index, response in fetcher.fetch_all(jobs):
+        if response is None:
+            continue
+        origin_block, destination_block = blocks[job_index]
+        # The API reports unreachable pairs as null
+        durations[origin_block, destination_block] = np.array(response['durations'], dtype=float)
+    return durations, len(jobs)
+
+
+# Function to reduce the duration matrix to the nearest destination per origin and category. Returns per
+# category the shortest travel time (s) and the position of the destination that has it.
+def nearest_by_category(durations, categories):
+    categories = pd.Categorical(categories)
+    result = {}
+    for code, category in enumerate(categories.categories):
+        columns = np.flatnonzero(categories.codes == code)
+        block = np.nan_to_num(durations[:, columns], nan=np.inf)
+        nearest = block.argmin(axis=1)
+        times = block[np.arange(len(block)), nearest]
+        reachable = np.isfinite(times)
+        result[category] = (np.where(reachable, times, np.nan), np.where(reachable, columns[nearest], -1))
+    return result
+
+
+# Function to use one point inside every region as origin: by default every municipality, or the regions of
+# another column of the base map such as NAME_1 for the provinces
+def region_origins(region_column=MUNICIPALITY_COLUMN):
+    regions = load_layer(region_layer(region_column), columns=(region_column,)).dissolve(by=region_column)
+    points = regions.representative_point().to_crs(epsg=4326)
+    return pd.DataFrame({'origin': regions.index, 'longitude': points.x.to_numpy(), 'latitude': points.y.to_numpy()})
+
+
+# Function to read origins from a CSV with an id column and WGS 84 coordinates, for example the centres of
+# the municipalities (GEMEENTENUMMER) or COROP regions (COROPGEBIED CODE)
+def file_origins(path, id_column, lon_column='longitude', lat_column='latitude'):
+    origins = pd.read_csv(path, usecols=[id_column, lon_column, lat_column]).dropna(subset=[lon_column, lat_column])
+    return pd.DataFrame({'origin': origins[id_column].to_numpy(), 'longitude': origins[lon_column].to_numpy(),
+                         'latitude': origins[lat_column].to_numpy()})
+
+
+# Function to compute the nearest travel time table: one row per origin with, per category, the travel
+# time in minutes to the nearest institution and the name of that institution
+def nearest_traveltime_table(fetcher, origins, institutions, profile='driving-car', max_routes=MAX_ROUTES,
+                             max_locations=MAX_LOCATIONS):
+    with stage('fetch'):
+        durations, requests = duration_matrix(fetcher, origins[['longitude', 'latitude']].to_numpy(),
+                                              institutions[['longitude', 'latitude']].to_numpy(), profile,
+                                              max_routes, max_locations)
+    with stage('reduce'):
+        table = origins.reset_index(drop=True)
+        names = institutions['INSTELLINGSNAAM'].to_numpy()
+        for category, (times, nearest) in nearest_by_category(durations, institutions['SOORT HO']).items():
+            table[f'traveltime {category}'] = np.round(times / 60, 1)
+            table[f'INSTELLINGSNAAM {category}'] = np.where(nearest >= 0, names[nearest], None)
+    return table, requests
+
+
+if __name__ == '__main__':
+    report_at_exit('traveltime_matrix')
+
+    parser = argparse.ArgumentParser(description='Compute the travel time from every origin to the nearest '
+                                                 'institution of each category with matrix requests.')
+    parser.add_argument('--origins', help='CSV with origin ids and coordinates; by default one point per region '
+                                          'of --region-column')
+    parser.add_argument('--region-column', default=MUNICIPALITY_COLUMN,
+                        help='Regions to use as origins without --origins: the municipalities by default, or a '
+                             'column of the base map such as NAME_1 for the provinces')
+    parser.add_argument('--id-column', default='GEMEENTENUMMER')
+    parser.add_argument('--lon-column', default='longitude')
+    parser.add_argument('--lat-column', default='latitude')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--profile', default='driving-car')
+    parser.add_argument('--max-routes', type=int, default=MAX_ROUTES, help='Routes per request allowed by the service')
+    parser.add_argument('--max-locations', type=int, default=MAX_LOCATIONS,
+                        help='Locations per request allowed by the service')
+    parser.add_argument('--requests-per-minute', type=int, default=40)
+    parser.add_argument('--max-workers', type=int, default=4)
+    args = parser.parse_args()
+    if args.max_routes < 1 or (args.max_locations is not None and args.max_locations < 2):
+        parser.error('a matrix request needs --max-routes of at least 1 and --max-locations of at least 2')
+
+    with stage('load'):
+        if args.origins:
+            origins = file_origins(args.origins, args.id_column, args.lon_column, args.lat_column)
+        else:
+            origins = region_origins(args.region_column)
+        institutions = load_institutions(('SOORT HO', 'INSTELLINGSNAAM', 'latitude', 'longitude'), crs=4326)
+
+    # OpenRouteService endpoint; set OPENROUTE_BASE_URL to a stub_ors_server.py address to run offline
+    fetcher = MatrixFetcher(os.getenv('OPENROUTE_API_KEY'), base_url=os.getenv('OPENROUTE_BASE_URL', DEFAULT_BASE_URL),
+                            requests_per_minute=args.requests_per_minute, max_workers=args.max_workers)
+    table, requests = nearest_traveltime_table(fetcher, origins, institutions, args.profile, args.max_routes,
+                                               args.max_locations)
+    count('matrix_api_calls', fetcher.request_count)
+
+    with stage('save'):
+        table.to_csv(args.output, index=False)
+    pairs = len(origins) * len(institutions)
+    print(f"{pairs} origin x institution pairs in {requests} matrix requests "
+          f"({fetcher.request_count} including retries), written to {args.output}")